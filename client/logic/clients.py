@@ -1,5 +1,6 @@
-import zmq, json, os, logging, socket, time
-from typing import Any, Dict, Optional
+import zmq, getpass, hashlib, json, os, logging, random, socket, struct, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timezone
 
 
@@ -9,19 +10,42 @@ __all__ = ["FileClient"]
 HOST_ENV_KEY = "HOST"
 PORT_ENV_KEY = "PORT"
 MCAST_ADDR_ENV_KEY = "MCAST_ADDR"
+SESSION_TOKEN_ENV_KEY = "SESSION_TOKEN"
+REPLICAS_ENV_KEY = "REPLICAS"
 DEFAULT_BROADCAST_PORT = 10002
 WAIT_CHECK = 5
+BUFFER_SIZE = 65536
+STREAM_TIMEOUT = 60
+
+# Frames of uploads and downloads: payload length and SHA-256, a zero length ends them
+FRAME_HEADER = struct.Struct("!I32s")
+END_FRAME = FRAME_HEADER.pack(0, bytes(32))
+STREAM_READY = {"message": "Ready"}
+READY_MESSAGE = json.dumps(STREAM_READY).encode("utf-8")
 
 # Default values
 PON_CALL = 5
 
+# Reads any replica may serve once it has caught up with the session token
+READ_COMMANDS = ("list", "get_user_id")
+
 _commands = {
     # Create, Update, Delete, Get, GetAll
-    "add": {
-        "command_name": "Create",
-        "function": "add",
+    "upload": {
+        "command_name": "Upload",
+        "function": "upload",
         "dataset": ["file", "tags"],
     },
+    "get_file": {
+        "command_name": "Get",
+        "function": "get_file",
+        "dataset": ["file_id"],
+    },
+    "fetch": {
+        "command_name": "Fetch",
+        "function": "fetch",
+        "dataset": ["chunks"],
+    },
     "delete": {
         "command_name": "Delete",
         "function": "delete",
@@ -30,7 +54,7 @@ _commands = {
     "list": {
         "command_name": "GetAll",
         "function": "list_files",
-        "dataset": ["tag_query"],
+        "dataset": ["tag_query", "page_size", "cursor", "session_token"],
     },
     "add_tags": {
         "command_name": "Create",
@@ -45,7 +69,12 @@ _commands = {
     "get_user_id": {
         "command_name": "Get",
         "function": "get_user_id",
-        "dataset": ["user_name"],
+        "dataset": ["user_name", "session_token"],
+    },
+    "stats": {
+        "command_name": "Get",
+        "function": "stats",
+        "dataset": [],
     },
     PON_CALL: {
         "command_name": "Chord",
@@ -61,15 +90,18 @@ class FileClient:
         self.port = port
         self.user_id = None
         self.server_ip = self._get_server_ip()
+        self.session_token = os.getenv(SESSION_TOKEN_ENV_KEY) or None
+        self.replicas = [ip for ip in os.getenv(REPLICAS_ENV_KEY, "").split(",") if ip]
 
     def get_user_id(self) -> int:
         logging.info("Getting user id...")
-        response = int(self._send_multipart_message("get_user_id", {}))
+        data = {"user_name": getpass.getuser()}
+        response = int(self.send_message("get_user_id", data))
         logging.info("User id: %s", response)
         return response
 
     def get_file_info(self, file_path: str) -> dict:
-        """Get file information."""
+        """Get file information, the content is streamed apart by upload_file."""
         absolute_path = os.path.abspath(file_path)
         logging.info("Getting file info: %s...", absolute_path)
 
@@ -81,7 +113,6 @@ class FileClient:
         name = os.path.basename(absolute_path)
         creation_time = os.path.getctime(absolute_path)
         update_time = os.path.getmtime(absolute_path)
-        content = open(absolute_path, "rb").read()
 
         file_info = {
             "name": os.path.splitext(name)[0],
@@ -94,17 +125,192 @@ class FileClient:
             "update_date": datetime.fromtimestamp(
                 update_time, tz=timezone.utc
             ).strftime("%Y-%m-%d %H:%M:%S"),
-            "content": content.decode("utf-8"),
         }
 
         logging.info("File info: %s", json.dumps(file_info))
         return file_info
 
+    def upload_file(self, file_path: str, tags: List[str]) -> Dict[str, Any]:
+        """Send the metadata of a file, then stream its content in checksummed frames.
+
+        The file is read one block at a time, so any size uploads in constant memory.
+        """
+        file_info = self.get_file_info(file_path)
+        data = {"file": file_info, "tags": tags}
+        message = json.dumps({"header": _commands["upload"], "data": data})
+        server_ip, port = self.server_ip, self.port
+
+        logging.info(f"Uploading {file_path} to {server_ip}:{port}")
+        try:
+            with socket.create_connection((server_ip, port), STREAM_TIMEOUT) as sock:
+                sock.sendall(message.encode("utf-8"))
+                ready = receive_ready(sock)
+                if ready != STREAM_READY:
+                    return ready
+                try:
+                    self._send_frames(sock, os.path.abspath(file_path))
+                except OSError as e:
+                    # The server stops reading on a failed frame, its answer says why
+                    logging.error(f"Upload interrupted: {e}")
+                response = json.loads(receive_message(sock).decode("utf-8"))
+        except (OSError, ValueError) as e:
+            logging.error(f"Error uploading to {server_ip}:{port}: {e}")
+            return {"error": str(e)}
+
+        if isinstance(response, dict) and "session_token" in response:
+            self._set_session(response["session_token"], response.get("replicas", []))
+        return response
+
+    def _send_frames(self, sock: socket.socket, file_path: str) -> None:
+        with open(file_path, "rb") as file:
+            while block := file.read(BUFFER_SIZE):
+                digest = hashlib.sha256(block).digest()
+                sock.sendall(FRAME_HEADER.pack(len(block), digest) + block)
+        sock.sendall(END_FRAME)
+
+    def download(
+        self,
+        file_id: int,
+        path: Optional[str] = None,
+        offset: int = 0,
+        length: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Write a file, or a byte range of it, fetching its chunks from several nodes at once.
+
+        Each node streams its share of the chunks and every part is written at its
+        place, so the file is reassembled in order without holding it in memory.
+        """
+        manifest = self.send_message("get_file", {"file_id": file_id})
+        if not isinstance(manifest, dict) or "chunks" not in manifest:
+            raise RuntimeError(f"Error getting file {file_id}: {manifest}")
+        file = manifest["file"]
+        path = path or f"{file['name']}.{file['file_type']}"
+        end = file["size"] if length is None else min(file["size"], offset + length)
+
+        ranges, position = [], 0
+        for digest, size, holders in manifest["chunks"]:
+            start, stop = max(offset, position), min(end, position + size)
+            if start < stop:
+                ranges.append(
+                    {
+                        "hash": digest,
+                        "size": size,
+                        "offset": start - position,
+                        "length": stop - start,
+                        "position": start - offset,
+                        "holders": holders,
+                    }
+                )
+            position += size
+
+        logging.info(f"Downloading {len(ranges)} chunks of file {file_id} to {path}")
+        with open(path, "wb") as output:
+            output.truncate(max(end - offset, 0))
+            while ranges:
+                ranges = self._fetch_striped(output.fileno(), ranges)
+        return file
+
+    def _fetch_striped(self, fd: int, ranges: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fetch the ranges spread over their holders, return the ones to retry elsewhere."""
+        shares: Dict[str, List[Dict[str, Any]]] = {}
+        load: Dict[str, int] = {}
+        for item in ranges:
+            if not item["holders"]:
+                raise RuntimeError(f"No node could send chunk {item['hash']}")
+            ip = min(item["holders"], key=lambda ip: load.get(ip, 0))
+            load[ip] = load.get(ip, 0) + item["length"]
+            shares.setdefault(ip, []).append(item)
+
+        with ThreadPoolExecutor(len(shares)) as pool:
+            results = pool.map(lambda share: self._fetch_share(fd, *share), shares.items())
+            return [item for missing in results for item in missing]
+
+    def _fetch_share(
+        self, fd: int, server_ip: str, items: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Fetch ranges from one node in a single stream, return the ones it did not send."""
+        data = {"chunks": [[item["hash"], item["offset"], item["length"]] for item in items]}
+        message = json.dumps({"header": _commands["fetch"], "data": data})
+        fetched, accepted = 0, False
+        try:
+            with socket.create_connection((server_ip, self.port), STREAM_TIMEOUT) as sock:
+                sock.sendall(message.encode("utf-8"))
+                response = receive_ready(sock)
+                accepted = response == STREAM_READY
+                while accepted:
+                    payload = receive_frame(sock)
+                    if payload is None:
+                        response = json.loads(receive_message(sock).decode("utf-8"))
+                        break
+                    if fetched == len(items):
+                        raise ValueError("More chunks sent than asked")
+                    _check_range(items[fetched], payload)
+                    os.pwrite(fd, payload, items[fetched]["position"])
+                    fetched += 1
+                if fetched < len(items):
+                    logging.warning(f"{server_ip} stopped at chunk {fetched}: {response}")
+        except (OSError, ValueError) as e:
+            logging.error(f"Error fetching chunks from {server_ip}: {e}")
+            if not accepted:
+                # Unreachable, none of its chunks are asked to it again
+                for item in items:
+                    item["holders"] = [ip for ip in item["holders"] if ip != server_ip]
+                return items
+
+        missing = items[fetched:]
+        if missing:
+            failed = missing[0]
+            failed["holders"] = [ip for ip in failed["holders"] if ip != server_ip]
+        return missing
+
     def send_message(self, command: str, data: Dict[str, Optional[str]]):
-        if self.user_id is None:
-            self.user_id = self.get_user_id()
         header = _commands[command]
-        return self._socket_call(header, data)
+        if command in READ_COMMANDS:
+            return self._read(header, data)
+        response = self._socket_call(self.server_ip, header, data)
+        if isinstance(response, dict) and "session_token" in response:
+            self._set_session(response["session_token"], response.get("replicas", []))
+        return response
+
+    def _read(self, header: Dict[str, Any], data: Dict[str, Any]):
+        """Send a read to any node holding the data, the primary if the replica fails.
+
+        Only replicas get the session token, the primary serves its own rows.
+        """
+        server_ip = random.choice([self.server_ip, *self.replicas])
+        if server_ip == self.server_ip:
+            return self._socket_call(server_ip, header, {**data, "session_token": None})
+        response = self._socket_call(
+            server_ip, header, {**data, "session_token": self.session_token}
+        )
+        if isinstance(response, str) or (isinstance(response, dict) and "error" in response):
+            logging.info(f"Replica {server_ip} could not serve the read: {response}")
+            response = self._socket_call(self.server_ip, header, {**data, "session_token": None})
+        return response
+
+    def _set_session(self, session_token: str, replicas: List[str]) -> None:
+        """Keep the token and replicas of the last write for the reads that follow."""
+        self.session_token, self.replicas = session_token, replicas
+        update_env_file(
+            {SESSION_TOKEN_ENV_KEY: session_token, REPLICAS_ENV_KEY: ",".join(replicas)}
+        )
+
+    def list_pages(
+        self,
+        tag_query: List[str],
+        page_size: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Iterator[Tuple[List[str], Optional[str]]]:
+        """Yield the pages of files matching the tag query with the cursor of the next one."""
+        while True:
+            data = {"tag_query": tag_query, "page_size": page_size, "cursor": cursor}
+            response = self.send_message("list", data)
+            if not isinstance(response, dict) or "files" not in response:
+                raise RuntimeError(f"Error listing files: {response}")
+            cursor = response.get("cursor")
+            yield response["files"], cursor
+            if not cursor:
+                break
 
     def _socket_call(
         self, server_ip, header: str, data: Dict[str, Any]
@@ -118,8 +324,8 @@ class FileClient:
         try:
             sock.connect((server_ip, port))
             sock.sendall(message.encode("utf-8"))
-            response = sock.recv(1024)
-            logging.info(f"Received response from {server_ip}:{port}: {response}")
+            response = receive_message(sock)
+            logging.info(f"Received response from {server_ip}:{port}")
             return json.loads(response.decode("utf-8"))
         except ConnectionRefusedError:
             logging.error(f"Connection refused by {server_ip}:{port}")
@@ -142,7 +348,10 @@ class FileClient:
         server_ip = os.getenv(HOST_ENV_KEY, None)
         if not server_ip or not self._is_server_alive(server_ip):
             server_ip = self._send_multicast_request()
-            update_env_file(server_ip)
+            # The token and replicas of the last write are those of the old primary
+            values = {HOST_ENV_KEY: server_ip, SESSION_TOKEN_ENV_KEY: "", REPLICAS_ENV_KEY: ""}
+            update_env_file(values)
+            os.environ.update(values)
         return server_ip
 
     def _is_server_alive(self, server_ip: str) -> bool:
@@ -186,19 +395,86 @@ class FileClient:
         return response.get("message") == "Pong"
 
 
-def update_env_file(server_ip: str) -> None:
-    """Update the .env file with the new server IP."""
+def receive_message(sock: socket.socket, buffer_size: int = BUFFER_SIZE) -> bytes:
+    """Read from the socket until a whole JSON message or the end of the stream."""
+    chunks: List[bytes] = []
+    while True:
+        chunk = sock.recv(buffer_size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        try:
+            json.loads(b"".join(chunks))
+            break
+        except ValueError:
+            continue
+    return b"".join(chunks)
+
+
+def receive_ready(sock: socket.socket) -> Any:
+    """Return the answer to a streamed request, the ready message or the error it failed with.
+
+    Frames may follow the acceptance at once, so no byte past it is read.
+    """
+    received = b""
+    while len(received) < len(READY_MESSAGE):
+        chunk = sock.recv(len(READY_MESSAGE) - len(received))
+        if not chunk:
+            break
+        received += chunk
+    if received == READY_MESSAGE:
+        return STREAM_READY
+    return json.loads(received + receive_message(sock))
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view, received = memoryview(buffer), 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Stream closed before its last frame")
+        received += count
+    return bytes(buffer)
+
+
+def receive_frame(sock: socket.socket) -> Optional[bytes]:
+    """Return the payload of the next frame checked against its checksum, None at the end."""
+    size, digest = FRAME_HEADER.unpack(_receive_exactly(sock, FRAME_HEADER.size))
+    if not size:
+        return None
+    payload = _receive_exactly(sock, size)
+    if hashlib.sha256(payload).digest() != digest:
+        raise ValueError("Frame failed its checksum")
+    return payload
+
+
+def _check_range(item: Dict[str, Any], payload: bytes) -> None:
+    """Check a fetched range has its length and, for a whole chunk, the chunk hash."""
+    if len(payload) != item["length"]:
+        raise ValueError(f"Chunk {item['hash']} range has {len(payload)} bytes")
+    whole = item["length"] == item["size"]
+    if whole and hashlib.sha256(payload).hexdigest() != item["hash"]:
+        raise ValueError(f"Chunk {item['hash']} does not match its hash")
+
+
+def update_env_file(values: Dict[str, str]) -> None:
+    """Update the .env file with the given values, appending the missing keys."""
     env_file_path = os.path.join(os.path.dirname(__file__), "..", ".env")
     with open(env_file_path, "r") as file:
         lines = file.readlines()
 
+    pending = dict(values)
     with open(env_file_path, "w") as file:
         for line in lines:
-            if line.startswith(f"{HOST_ENV_KEY}="):
-                file.write(f"{HOST_ENV_KEY}={server_ip}\n")
+            key = line.split("=", 1)[0]
+            if key in pending:
+                file.write(f"{key}={pending.pop(key)}\n")
             else:
                 file.write(line)
-    logging.info(f"Updated .env file with new server IP: {server_ip}")
+        for key, value in pending.items():
+            file.write(f"{key}={value}\n")
+    logging.info(f"Updated .env file with: {', '.join(values)}")
 
 
 def header_data(command_name: str, function: str, dataset: Dict[str, Any]) -> str:
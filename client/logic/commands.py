@@ -5,10 +5,12 @@ from .clients import FileClient
 
 __all__ = [
     "add",
+    "get",
     "delete",
     "list",
     "add_tags",
     "delete_tags",
+    "stats",
     "set_config",
     "check_default",
 ]
@@ -77,24 +79,79 @@ def add(files: List[str], tags: List[str]) -> None:
     """Copy one or more files to the system and register them with the tags contained in TAG_LIST."""
     for file in files:
         try:
-            file_data = _client.get_file_info(file)
-            _send_data("add", file=file_data, tags=tags)
+            logging.info(_client.upload_file(file, tags))
         except Exception as e:
             logging.error(f"Error processing file {file}: {e}")
 
 
 @cli.command()
-@click.argument("tag_query", nargs=-1, type=str)
+@click.option(
+    "--output",
+    "-o",
+    type=str,
+    default=None,
+    help="Path to write the file to, its name in the current folder by default.",
+)
+@click.option("--offset", type=int, default=0, help="First byte to download.")
+@click.option(
+    "--length",
+    "-l",
+    type=int,
+    default=None,
+    help="Bytes to download from the offset, up to the end by default.",
+)
+@click.argument("file_id", type=int)
+def get(file_id: int, output: Optional[str], offset: int, length: Optional[int]) -> None:
+    """Download the file with FILE_ID, as shown by list, from several nodes at once."""
+    try:
+        logging.info("Executing command: get")
+        logging.info(_client.download(file_id, output, offset, length))
+    except Exception as e:
+        logging.error(e)
+
+
+@cli.command()
+@click.argument("tag_query", nargs=-1, type=str, required=True)
 def delete(tag_query: List[str]) -> None:
-    """Delete all files that match the TAG_QUERY."""
+    """Delete all files that match the TAG_QUERY.
+
+    Tags in TAG_QUERY combine with AND, OR, NOT and parentheses, bare tags are joined with OR.
+    Tags named AND, OR or NOT, or with spaces or parentheses, go in double quotes.
+    """
     _send_data("delete", tag_query=tag_query)
 
 
 @cli.command()
+@click.option(
+    "--page-size",
+    "-p",
+    type=int,
+    default=None,
+    help="Files requested per page, pages are printed as they arrive.",
+)
+@click.option(
+    "--cursor",
+    "-c",
+    type=str,
+    default=None,
+    help="Cursor printed by an interrupted listing to resume it.",
+)
 @click.argument("tag_query", nargs=-1, type=str)
-def list(tag_query: List[str]) -> None:
-    """List the name and tags of all files that match the TAG_QUERY."""
-    _send_data("list", tag_query=tag_query)
+def list(tag_query: List[str], page_size: Optional[int], cursor: Optional[str]) -> None:
+    """List the name and tags of all files that match the TAG_QUERY.
+
+    Tags in TAG_QUERY combine with AND, OR, NOT and parentheses, bare tags are joined with OR.
+    Tags named AND, OR or NOT, or with spaces or parentheses, go in double quotes.
+    """
+    try:
+        logging.info("Executing command: list")
+        for page, cursor in _client.list_pages(tag_query, page_size, cursor):
+            for file in page:
+                click.echo(file)
+            if cursor:
+                logging.info("Next page cursor: %s", cursor)
+    except Exception as e:
+        logging.error(e)
 
 
 @cli.command()
@@ -104,7 +161,7 @@ def list(tag_query: List[str]) -> None:
     type=str,
     multiple=True,
     required=True,
-    help="Tag query to add new tags.",
+    help="Tag query to add new tags, e.g. \"a AND (b OR NOT c)\".",
 )
 @click.argument("tags", nargs=-1, type=str)
 def add_tags(tag_query: str, tags: List[str]) -> None:
@@ -119,9 +176,15 @@ def add_tags(tag_query: str, tags: List[str]) -> None:
     type=str,
     multiple=True,
     required=True,
-    help="Tag query to delete.",
+    help="Tag query to delete, e.g. \"a AND (b OR NOT c)\".",
 )
 @click.argument("tags", nargs=-1, type=str)
 def delete_tags(tag_query: str, tags: List[str]) -> None:
     """Delete the tags contained in TAG_LIST from all files that match the TAG_QUERY."""
     _send_data("delete_tags", tag_query=tag_query, tags=tags)
+
+
+@cli.command()
+def stats() -> None:
+    """Show the hit ratio of the server caches and the size of its indexes."""
+    _send_data("stats")
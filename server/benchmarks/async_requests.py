@@ -0,0 +1,69 @@
+# Benchmark de peticiones concurrentes desde un bucle asyncio: servicios sincronos en hilos contra servicios async
+# Uso: python -m benchmarks.async_requests [cantidad de ficheros] (desde la carpeta server)
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio, logging, statistics, sys, tempfile, time
+
+from data import *
+from logic.services import AsyncFileService, FileService
+
+from .tag_index import populate
+
+IN_FLIGHT = 1000
+THREADS = 32
+PAGE_SIZE = 20
+QUERIES = [["tag1 OR tag3"], ["tag0 AND NOT tag2"], ["tag7"], ["tag2 AND tag5"]]
+
+
+async def run(request) -> tuple:
+    """Start every request at once and return the throughput and the latencies in ms."""
+    latencies = []
+
+    async def timed(index: int) -> None:
+        start = time.perf_counter()
+        await request(QUERIES[index % len(QUERIES)], index)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(IN_FLIGHT)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return IN_FLIGHT / elapsed, statistics.median(latencies), latencies[-len(latencies) // 100]
+
+
+async def main(db_url: str) -> None:
+    files = FileService(get_repository(File, db_url))
+    pool = ThreadPoolExecutor(THREADS)
+
+    async def threaded(tag_query: list, after_id: int):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            pool, files.get_listing_page, tag_query, PAGE_SIZE, after_id
+        )
+
+    async_files = AsyncFileService(get_async_repository(File, db_url))
+
+    async def native(tag_query: list, after_id: int):
+        return await async_files.get_listing_page(tag_query, PAGE_SIZE, after_id)
+
+    try:
+        for query in QUERIES:
+            sync_ids = [f.id for f in files.get_listing_page(query, PAGE_SIZE, 7)]
+            async_ids = [f.id for f in await native(query, 7)]
+            assert sync_ids == async_ids
+        print(f"{'mode':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, request in (("threads", threaded), ("async", native)):
+            throughput, p50, p99 = await run(request)
+            print(f"{name:>8} {throughput:>8.0f} {p50:>8.1f} {p99:>8.1f}")
+    finally:
+        pool.shutdown()
+        await dispose_async_engines()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    db_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    populate(db_url, files)
+    print(f"Store with {files} files, {IN_FLIGHT} requests in flight\n")
+    asyncio.run(main(db_url))
@@ -0,0 +1,61 @@
+# Benchmark del etiquetado masivo: transacciones por par fichero-etiqueta contra sentencias por lote
+# Uso: python -m benchmarks.bulk_tagging [cantidad de ficheros] (desde la carpeta server)
+from sqlalchemy import func, insert, select
+from datetime import datetime, timezone
+
+import sys, tempfile, time
+
+from data import *
+from logic.dtos import TagInputDto
+from logic.services import TagService
+
+TAGS = ["red", "green", "blue"]
+PAIR_SAMPLE = 2000
+
+
+def populate(db_url: str, files: int) -> None:
+    now = datetime.now(timezone.utc)
+    dates = {"creation_date": now, "update_date": now}
+    migrate(db_url)
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "bench", **dates}])
+        conn.execute(
+            insert(File),
+            [
+                {"id": i, "name": f"file{i}", "file_type": "txt", "size": i, "user_id": 1, **dates}
+                for i in range(1, files + 1)
+            ],
+        )
+
+
+def links(db_url: str) -> int:
+    with get_engine(db_url).connect() as conn:
+        return conn.execute(select(func.count()).select_from(file_tags)).scalar()
+
+
+def per_pair(service: TagService, file_ids: list) -> None:
+    for file_id in file_ids:
+        for name in TAGS:
+            tag = service.get(TagInputDto(name, None, None))
+            if tag is None:
+                tag = service.create(TagInputDto(name))
+            service.add_tag(file_id, tag.id)
+
+
+def measure(name: str, files: int, tag) -> None:
+    db_url = f"sqlite:///{tempfile.mkdtemp()}/{name}.db"
+    populate(db_url, files)
+    service = TagService(Repository(Tag, db_url))
+    start = time.perf_counter()
+    tag(service)
+    elapsed = time.perf_counter() - start
+    count = links(db_url)
+    print(f"{name:>10}: {elapsed:8.2f} s for {count} links ({count / elapsed:,.0f} links/s)")
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"Tagging {files} files with {len(TAGS)} tags (per pair on {PAIR_SAMPLE} files)")
+    measure("per pair", PAIR_SAMPLE, lambda s: per_pair(s, list(range(1, PAIR_SAMPLE + 1))))
+    measure("id batches", files, lambda s: s.add_tags_to_files(list(range(1, files + 1)), TAGS))
+    measure("query", files, lambda s: s.add_tags_to_files(select(File.id), TAGS))
@@ -0,0 +1,53 @@
+# Benchmark del almacen de trozos: deduplicacion y velocidad de ingesta con trozos fijos o definidos por contenido
+# Uso: python -m benchmarks.chunk_store [cantidad de ficheros base] (desde la carpeta server)
+import logging, random, sys, tempfile, time
+
+from data.const import CHUNK_SIZE
+from logic.chunk_store import CHUNKING_MODES, ChunkStore
+
+FILE_SIZE = 1 << 20
+VERSIONS = 3
+COPIES = 2
+EDITS = 4
+
+
+def corpus(files: int) -> list:
+    """Files with edited versions (inserted and overwritten bytes) and identical copies."""
+    rnd = random.Random(42)
+    result = []
+    for _ in range(files):
+        content = rnd.randbytes(FILE_SIZE)
+        result.extend([content] * COPIES)
+        for _ in range(VERSIONS):
+            content = bytearray(content)
+            for _ in range(EDITS):
+                offset = rnd.randrange(len(content))
+                if rnd.random() < 0.5:
+                    content[offset:offset] = rnd.randbytes(rnd.randrange(1, 64))
+                else:
+                    content[offset : offset + 32] = rnd.randbytes(32)
+            content = bytes(content)
+            result.append(content)
+    return result
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    contents = corpus(files)
+    total = sum(map(len, contents)) / (1 << 20)
+    print(f"{len(contents)} files, {total:.0f} MB, chunks of {CHUNK_SIZE // 1024} KB\n")
+
+    print(f"{'chunking':>8} {'chunks':>7} {'stored MB':>10} {'dedup':>6} {'MB/s':>7}")
+    for chunking in CHUNKING_MODES:
+        store = ChunkStore(tempfile.mkdtemp(), CHUNK_SIZE, chunking)
+        start = time.perf_counter()
+        for content in contents:
+            store.write(content)
+        elapsed = time.perf_counter() - start
+        stats = store.stats()
+        stored = stats["stored_bytes"] / (1 << 20)
+        print(
+            f"{chunking:>8} {stats['chunks']:>7} {stored:>10.1f} "
+            f"{stats['dedup_ratio']:>6.2f} {total / elapsed:>7.1f}"
+        )
@@ -0,0 +1,95 @@
+# Benchmark de la compresion por tipo de contenido: espacio ahorrado y CPU gastada por codec
+# Uso: python -m benchmarks.compression [tamano en MB] (desde la carpeta server)
+import json, os, random, sys, time, zlib
+
+from data.const import CHUNK_SIZE
+from logic.compression import AUTO_CODEC, CODECS, NO_CODEC, Compressor, pack_payload
+
+WORDS = "file tag node chunk ring store query owner replica stream index cache".split()
+
+
+def text(size: int) -> bytes:
+    """Log lines, compressible as most text is."""
+    rng = random.Random(1)
+    lines, total = [], 0
+    while total < size:
+        line = f"{total:>10} INFO {' '.join(rng.choices(WORDS, k=8))} id={rng.getrandbits(32)}\n"
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def packed(size: int) -> bytes:
+    """Content of an already compressed format, as images or archives."""
+    return zlib.compress(os.urandom(size // 2) + text(size), 9)[:size]
+
+
+def codec_row(compressor: Compressor, codec: str, chunks: list) -> tuple:
+    size = sum(map(len, chunks))
+    start, cpu = time.perf_counter(), time.process_time()
+    stored = [compressor.compress(codec, chunk) for chunk in chunks]
+    compress, compress_cpu = time.perf_counter() - start, time.process_time() - cpu
+    start = time.perf_counter()
+    for chunk in stored:
+        compressor.decompress(codec, chunk)
+    decompress = time.perf_counter() - start
+    stored_size = sum(map(len, stored))
+    mb = size / (1 << 20)
+    return (
+        size / stored_size,
+        (size - stored_size) / (1 << 20),
+        mb / compress if compress else 0.0,
+        mb / decompress if decompress else 0.0,
+        compress_cpu,
+    )
+
+
+def replication_payload(rows: int) -> dict:
+    """Rows as nodes send them to their replicas."""
+    rng = random.Random(2)
+    files = [
+        {
+            "id": i,
+            "name": f"report-{i}",
+            "file_type": rng.choice(["txt", "pdf", "png"]),
+            "size": rng.randrange(1 << 24),
+            "user_id": 1,
+            "creation_date": "2026-01-01T00:00:00",
+            "update_date": "2026-01-01T00:00:00",
+            "deleted": False,
+            "owner": "",
+        }
+        for i in range(rows)
+    ]
+    return {"files": files, "tags": [], "file_tags": []}
+
+
+if __name__ == "__main__":
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 16) << 20
+    inputs = {"text": text(size), "random": os.urandom(size), "packed": packed(size)}
+    types = {"text": "log", "random": "bin", "packed": "zip"}
+    compressor, auto = Compressor(NO_CODEC), Compressor(AUTO_CODEC)
+    print(f"{size >> 20} MB of each content in chunks of {CHUNK_SIZE // 1024} KB\n")
+
+    print(
+        f"{'content':>8} {'codec':>6} {'ratio':>7} {'saved MB':>9} {'comp MB/s':>10} "
+        f"{'decomp MB/s':>12} {'CPU s':>7}"
+    )
+    for name, content in inputs.items():
+        chunks = [content[i : i + CHUNK_SIZE] for i in range(0, size, CHUNK_SIZE)]
+        for codec in CODECS[1:]:
+            ratio, saved, comp, decomp, cpu = codec_row(compressor, codec, chunks)
+            print(
+                f"{name:>8} {codec:>6} {ratio:>6.2f}x {saved:>9.1f} {comp:>10.0f} "
+                f"{decomp:>12.0f} {cpu:>7.2f}"
+            )
+
+    print(f"\n{'content':>8} {'by type':>8} {'by sample':>10}")
+    for name, content in inputs.items():
+        print(f"{name:>8} {auto.choose(types[name], content):>8} {auto.choose(None, content):>10}")
+
+    print(f"\n{'rows':>6} {'JSON KB':>8} {'wire KB':>8}")
+    for rows in (10, 1000, 10000):
+        payload = replication_payload(rows)
+        raw, wire = len(json.dumps(payload)), len(json.dumps(pack_payload(payload)))
+        print(f"{rows:>6} {raw / 1024:>8.1f} {wire / 1024:>8.1f}")
@@ -0,0 +1,54 @@
+# Benchmark de la cache de contenido: lecturas de ficheros populares desde memoria o desde disco
+# Uso: python -m benchmarks.content_cache [tamano en MB] [lecturas] (desde la carpeta server)
+import os, random, sys, tempfile, time
+
+from benchmarks.compression import text
+from data.const import CHUNK_SIZE
+from logic.chunk_store import ChunkStore
+
+FILE_SIZE = 1 << 20
+# Budgets of the cache as a share of the content
+BUDGETS = (0.0, 0.1, 0.25, 0.5)
+ZIPF_EXPONENT = 1.1
+
+
+def store(root: str, budget: int) -> ChunkStore:
+    return ChunkStore(root, CHUNK_SIZE, compression="auto", cache_size=budget)
+
+
+def run(chunks: ChunkStore, files: list, reads: list) -> tuple:
+    """Read whole files in the order given, return the files read per second."""
+    start = time.perf_counter()
+    for index in reads:
+        chunks.read_all(files[index])
+    elapsed = time.perf_counter() - start
+    return len(reads) / elapsed, chunks.cache.stats()
+
+
+if __name__ == "__main__":
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 64) << 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    root = tempfile.mkdtemp()
+    writer, lines = store(root, 0), text(size)
+    files = []
+    for number in range(size // FILE_SIZE):
+        # Half text kept compressed, half random kept as it is
+        start = number * FILE_SIZE
+        content = lines[start : start + FILE_SIZE] if number % 2 else os.urandom(FILE_SIZE)
+        files.append([digest for digest, _ in writer.write(content, "zlib")])
+    rng = random.Random(3)
+    weights = [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(files))]
+    reads = rng.choices(range(len(files)), weights, k=count)
+    print(f"{len(files)} files of {FILE_SIZE >> 20} MB, {count} reads by Zipf popularity\n")
+
+    print(
+        f"{'budget MB':>10} {'files/s':>8} {'hit ratio':>10} {'resident MB':>12} "
+        f"{'evictions':>10}"
+    )
+    for share in BUDGETS:
+        budget = int(size * share)
+        rate, stats = run(store(root, budget), files, reads)
+        print(
+            f"{budget >> 20:>10} {rate:>8.0f} {stats['hit_ratio']:>10.2f} "
+            f"{stats['resident'] / (1 << 20):>12.1f} {stats['evictions']:>10}"
+        )
@@ -0,0 +1,65 @@
+# Benchmark de la codificacion por borrado: espacio ocupado y velocidad frente a copias completas
+# Uso: python -m benchmarks.erasure_coding [tamano en MB] (desde la carpeta server)
+import os, sys, time
+
+from data.const import CHUNK_SIZE, DEFAULT_REPLICATION_FACTOR
+from logic.erasure import ReedSolomon
+
+CODES = ("4+2", "6+3", "10+4")
+
+
+def throughput(size: int, work) -> float:
+    start = time.perf_counter()
+    work()
+    return size / (1 << 20) / (time.perf_counter() - start)
+
+
+def replication(chunks: list, factor: int) -> tuple:
+    """Full copies: every other copy is written whole, any one of them is read."""
+    copies = []
+    size = sum(map(len, chunks))
+    encode = throughput(
+        size, lambda: copies.extend([bytes(bytearray(c)) for _ in range(factor)] for c in chunks)
+    )
+    decode = throughput(size, lambda: [bytes(bytearray(c[0])) for c in copies])
+    return float(factor), float(factor), factor - 1, encode, decode, decode
+
+
+def erasure(chunks: list, spec: str) -> tuple:
+    """Shards: decoded from the data shards, or degraded with m of them lost.
+
+    Hot chunks are also kept whole by the node that wrote or rebuilt them, cold ones only
+    as shards, so the storage is one copy more until they turn cold.
+    """
+    code = ReedSolomon.from_spec(spec)
+    size = sum(map(len, chunks))
+    encoded = []
+    encode = throughput(size, lambda: encoded.extend(map(code.encode, chunks)))
+    stored = sum(len(shard) for shards in encoded for shard in shards)
+
+    def decode(lost: range) -> None:
+        for chunk, shards in zip(chunks, encoded):
+            left = {i: shard for i, shard in enumerate(shards) if i not in lost}
+            code.decode(left, len(chunk))
+
+    intact = throughput(size, lambda: decode(range(0)))
+    degraded = throughput(size, lambda: decode(range(code.m)))
+    return stored / size + 1, stored / size, code.m, encode, intact, degraded
+
+
+if __name__ == "__main__":
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 64) << 20
+    chunks = [os.urandom(CHUNK_SIZE) for _ in range(size // CHUNK_SIZE)]
+    print(f"{size >> 20} MB in chunks of {CHUNK_SIZE // 1024} KB\n")
+
+    print(
+        f"{'scheme':>8} {'hot':>6} {'cold':>6} {'losses':>7} {'encode MB/s':>12} "
+        f"{'decode MB/s':>12} {'degraded MB/s':>14}"
+    )
+    rows = [(f"{DEFAULT_REPLICATION_FACTOR} copies", replication(chunks, DEFAULT_REPLICATION_FACTOR))]
+    rows += [(spec, erasure(chunks, spec)) for spec in CODES]
+    for name, (hot, cold, losses, encode, decode, degraded) in rows:
+        print(
+            f"{name:>8} {hot:>5.2f}x {cold:>5.2f}x {losses:>7} {encode:>12.0f} "
+            f"{decode:>12.0f} {degraded:>14.0f}"
+        )
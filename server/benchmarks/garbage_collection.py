@@ -0,0 +1,86 @@
+# Benchmark del recolector de basura: consultas con filas borradas acumuladas y tras purgarlas
+# Uso: python -m benchmarks.garbage_collection [ficheros] [% borrado] (desde la carpeta server)
+from datetime import datetime
+from sqlalchemy import insert, update
+
+import logging, sys, tempfile, time
+
+from data import *
+from dist.chord_service import ChordService
+from logic.configurable import Configurable
+from logic.services import FileService
+
+from .tag_index import populate, sql_query
+
+QUERIES = [["tag1"], ["tag1 OR tag3"], ["tag0 AND tag2"]]
+REPEATS = 10
+PAGE_SIZE = 100
+
+
+class LoneNode:
+    """A ring of one node whose changes every replica acknowledged."""
+
+    id = 0
+    ip = "127.0.0.1"
+
+    def ring(self) -> list:
+        return [self]
+
+
+def measure(db_url: str, files: FileService) -> tuple:
+    """Return the ms of the tag counts and of listing the first page."""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for query in QUERIES:
+            sql_query(db_url, query)
+    counts = (time.perf_counter() - start) / REPEATS * 1000
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for query in QUERIES:
+            files.get_listing_page(query, PAGE_SIZE)
+    pages = (time.perf_counter() - start) / REPEATS * 1000
+    return counts, pages
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    share = (float(sys.argv[2]) if len(sys.argv) > 2 else 90) / 100
+    folder = tempfile.mkdtemp()
+    db_url = f"sqlite:///{folder}/bench.db"
+    populate(db_url, count)
+    old = datetime(2000, 1, 1)
+    dates = {"creation_date": old, "update_date": old}
+    with get_engine(db_url).begin() as conn:
+        conn.execute(
+            insert(FileSource),
+            [
+                {"file_id": i, "chunk_size": i, "url": f"f{i}", **dates}
+                for i in range(1, count + 1)
+            ],
+        )
+        # Every few files live, the rest deleted long ago
+        live = max(int(1 / (1 - share)), 1) if share < 1 else count + 1
+        conn.execute(
+            update(File).where(File.id % live != 0).values(deleted=True, update_date=old)
+        )
+    service = FileService(get_repository(File, db_url))
+    config = Configurable({DB_URL_KEY: db_url, DB_BASE_URL_KEY: f"sqlite:///{folder}/"})
+    collector = ChordService(LoneNode(), config)
+    collector._replicated = True
+    print(f"{count} files, {share:.0%} of them deleted\n")
+
+    print(f"{'rows':>8} {'count ms':>9} {'page ms':>8}")
+    counts, pages = measure(db_url, service)
+    print(f"{'deleted':>8} {counts:>9.1f} {pages:>8.1f}")
+    # Unpaced, to measure the purge itself rather than GC_RATE
+    collector._throttle = lambda _: None
+    start = time.perf_counter()
+    purged, _, _ = collector.purge_tombstones()
+    elapsed = time.perf_counter() - start
+    counts, pages = measure(db_url, service)
+    print(f"{'purged':>8} {counts:>9.1f} {pages:>8.1f}")
+
+    rows = sum(purged.values())
+    print(f"\nPurged {rows} rows in {elapsed:.1f}s, {rows / elapsed:.0f} rows/s unpaced")
+    print(f"Paced at {GC_RATE} rows/s a pass takes {rows / GC_RATE:.0f}s: {purged}")
@@ -0,0 +1,87 @@
+# Benchmark del group commit: ficheros escritos por segundo en el perfil durable, concurrentes
+# Uso: python -m benchmarks.group_commit [ficheros] [hilos] (desde la carpeta server)
+from datetime import datetime
+
+import logging, os, statistics, sys, tempfile, threading, time
+
+from data import *
+from logic.business_services import ServerService
+from logic.configurable import Configurable
+from logic.dtos import FileInputDto
+
+FILE_SIZE = 4096
+
+
+def service(grouped: bool) -> ServerService:
+    """A server on a new durable store, its writes grouped or committed one by one."""
+    folder = tempfile.mkdtemp()
+    db_url = f"sqlite:///{folder}/bench.db"
+    get_engine(db_url, "durable")
+    migrate(db_url)
+    config = {DB_URL_KEY: db_url, CONTENT_PATH_KEY: folder, STORAGE_PROFILE_KEY: "durable"}
+    server = ServerService(Configurable(config))
+    if not grouped:
+        # Each write commits on its own and the content is synced by each caller
+        server.Committer = None
+        for repository in (server.Files, server.Tags, server.FileSources, server.Users):
+            repository.repository.committer = None
+        write_file = server.Chunks._write_file
+
+        def synced_write(path: str, *parts) -> None:
+            write_file(path, *parts)
+            GroupCommitter._fsync(path)
+            GroupCommitter._fsync(os.path.dirname(path))
+
+        server.Chunks._write_file = synced_write
+    return server
+
+
+def run(server: ServerService, count: int, threads: int) -> tuple:
+    """Upload files from concurrent threads, return files/s and latencies in ms."""
+    user_id = server.get_user_id("bench")
+    now = datetime.now().replace(microsecond=0)
+    latencies, lock = [], threading.Lock()
+
+    def upload(worker: int) -> None:
+        for number in range(worker, count, threads):
+            content = os.urandom(FILE_SIZE // 2).hex()
+            file = FileInputDto(
+                content,
+                name=f"file-{number}",
+                file_type="txt",
+                size=len(content),
+                user_id=user_id,
+                creation_date=now,
+                update_date=now,
+            )
+            start = time.perf_counter()
+            server.create_update_file(file, [f"tag{number % 10}"])
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=upload, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return count / elapsed, statistics.mean(latencies), p99
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"{count} files of {FILE_SIZE // 1024} KB from {threads} threads, durable profile\n")
+
+    print(f"{'commits':>8} {'files/s':>8} {'mean ms':>8} {'p99 ms':>8} {'writes/group':>13}")
+    for grouped in (False, True):
+        server = service(grouped)
+        rate, mean, p99 = run(server, count, threads)
+        stats = server.stats()["group_commit"]
+        average = stats["average"] if stats else 1.0
+        name = "grouped" if grouped else "single"
+        print(f"{name:>8} {rate:>8.0f} {mean:>8.1f} {p99:>8.1f} {average:>13.1f}")
@@ -0,0 +1,56 @@
+# Benchmark de listados concurrentes identicos con y sin la cache de resultados versionada
+# Uso: python -m benchmarks.list_cache [cantidad de ficheros] (desde la carpeta server)
+from concurrent.futures import ThreadPoolExecutor
+
+import logging, sys, tempfile, time
+
+from data import *
+from logic.business_services import ServerService
+from logic.configurable import Configurable
+from logic.pagination import decode_cursor
+
+from .tag_index import populate
+
+CLIENTS = 16
+REQUESTS = 20
+PAGE_SIZE = 100
+QUERY = ["(tag1 OR tag3) AND NOT tag0"]
+
+
+def uncached(service: ServerService) -> None:
+    service._files_page(QUERY, PAGE_SIZE, decode_cursor(QUERY, None))
+
+
+def cached(service: ServerService) -> None:
+    service.get_files_page(QUERY, PAGE_SIZE, None)
+
+
+def run(function, service: ServerService) -> float:
+    def client(_) -> None:
+        for _ in range(REQUESTS):
+            function(service)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        list(pool.map(client, range(CLIENTS)))
+    return CLIENTS * REQUESTS / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    folder = tempfile.mkdtemp()
+    db_url = f"sqlite:///{folder}/bench.db"
+    populate(db_url, files)
+    print(f"Store with {files} files, {CLIENTS} clients x {REQUESTS} requests\n")
+
+    for engine in ("sql", "bitmap"):
+        config = {DB_URL_KEY: db_url, CONTENT_PATH_KEY: folder, QUERY_ENGINE_KEY: engine}
+        service = ServerService(Configurable(config))
+        cached(service)
+        service.invalidate_caches()
+        before = run(uncached, service)
+        after = run(cached, service)
+        stats = service.stats()["list_cache"]
+        print(f"{engine:>7}: {before:>9.0f} req/s without cache, {after:>9.0f} with cache")
+        print(f"{'':>9}misses {stats['misses']}, collapsed {stats['collapsed']}\n")
@@ -0,0 +1,71 @@
+# Benchmark de consultas por listado: objetos ORM con etiquetas perezosas contra filas proyectadas
+# Uso: python -m benchmarks.listing_queries [cantidad de ficheros] (desde la carpeta server)
+from sqlalchemy import event, false
+
+import logging, sys, tempfile, time
+
+from data import *
+from logic.dtos import FileOutputDto
+from logic.services import FileService
+from logic.tag_query import compile_tag_query
+
+from .tag_index import populate
+
+PAGE_SIZES = [10, 100, 1000]
+REPEATS = 10
+QUERY = ["tag1 OR tag3"]
+
+
+class StatementCounter:
+    def __init__(self, db_url: str) -> None:
+        self.count = 0
+        event.listen(get_engine(db_url), "before_cursor_execute", self._count)
+
+    def _count(self, *_) -> None:
+        self.count += 1
+
+
+def orm_page(files: FileService, limit: int) -> list:
+    """Listing through ORM objects, reading the tags of each file lazily."""
+    query = (
+        files.repository.get_query()
+        .filter(File.deleted == false(), compile_tag_query(QUERY))
+        .order_by(File.id)
+        .limit(limit)
+    )
+    with files.repository.get_session() as session:
+        result = []
+        for file in files.repository.all(query, session):
+            dto = FileOutputDto._to_dto(file)
+            dto.tags = sorted(tag.name for tag in file.tags)
+            result.append(dto)
+        return result
+
+
+def projected_page(files: FileService, limit: int) -> list:
+    return files.get_listing_page(QUERY, limit)
+
+
+def measure(counter: StatementCounter, function, *args) -> tuple:
+    start, before = time.perf_counter(), counter.count
+    for _ in range(REPEATS):
+        result = function(*args)
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+    return result, (counter.count - before) // REPEATS, elapsed
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    db_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    populate(db_url, files)
+    service = FileService(get_repository(File, db_url))
+    counter = StatementCounter(db_url)
+    print(f"Store with {files} files, listing {QUERY[0]!r}\n")
+
+    print(f"{'page':>6} {'orm queries':>12} {'orm ms':>8} {'rows queries':>13} {'rows ms':>8}")
+    for limit in PAGE_SIZES:
+        orm, orm_queries, orm_ms = measure(counter, orm_page, service, limit)
+        rows, rows_queries, rows_ms = measure(counter, projected_page, service, limit)
+        assert [(f.id, f.tags) for f in orm] == [(f.id, f.tags) for f in rows]
+        print(f"{limit:>6} {orm_queries:>12} {orm_ms:>8.1f} {rows_queries:>13} {rows_ms:>8.1f}")
@@ -0,0 +1,72 @@
+# Benchmark de latencia de escritura segun el factor de replicacion y el quorum
+# Uso: python -m benchmarks.replication_quorum (desde la carpeta server)
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+
+import random, statistics, tempfile, time
+
+from data.const import *
+from logic.configurable import Configurable
+from dist.chord_service import ChordService
+
+RING_SIZE = 7
+WRITES = 50
+BASE_LATENCY = 0.002
+JITTER = 0.008
+
+
+class LocalReplica:
+    """Replica of a local ring whose acknowledgement takes a random delay."""
+
+    def __init__(self, id: int):
+        self.id = id
+        self.ip = f"127.0.0.{id}"
+
+    def set_replication(self, key: str, data: Dict[str, Any], lsn: Optional[int] = None) -> bool:
+        time.sleep(BASE_LATENCY + random.random() * JITTER)
+        return True
+
+
+class LocalNode:
+    """Primary of a local ring that hands out its ring neighbours as replicas."""
+
+    def __init__(self, ring: List[LocalReplica]):
+        self.ip = "127.0.0.1"
+        self.ring = ring
+
+    def get_replication(self, key: str, ls_time: Optional[datetime]) -> Dict[str, Any]:
+        return {"files": [{"id": 1}]}
+
+    def get_replications(self, factor: int) -> List[Tuple[LocalReplica, str]]:
+        return [(node, f"replica_{node.id}.db") for node in self.ring[: factor - 1]]
+
+
+def run(factor: int, quorum: int) -> List[float]:
+    config = Configurable(
+        {
+            DB_BASE_URL_KEY: f"sqlite:///{tempfile.mkdtemp()}/",
+            DB_URL_KEY: "sqlite://",
+            REPLICATION_FACTOR_KEY: factor,
+            WRITE_QUORUM_KEY: quorum,
+        }
+    )
+    ring = [LocalReplica(i) for i in range(2, RING_SIZE + 2)]
+    service = ChordService(LocalNode(ring), config)
+    latencies = []
+    for _ in range(WRITES):
+        start = time.perf_counter()
+        service.replication(datetime.now(), QUORUM.METADATA)
+        latencies.append((time.perf_counter() - start) * 1000)
+    for pusher in service._pushers.values():
+        pusher.shutdown(wait=True)
+    return latencies
+
+
+if __name__ == "__main__":
+    print(f"{'N':>3} {'W':>3} {'p50 ms':>9} {'p95 ms':>9}")
+    for factor in (1, 3, 5):
+        for quorum in range(1, factor + 1):
+            latencies = sorted(run(factor, quorum))
+            p50 = statistics.median(latencies)
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{factor:>3} {quorum:>3} {p50:>9.2f} {p95:>9.2f}")
@@ -0,0 +1,135 @@
+# Benchmark de las consultas calientes antes y despues de los indices de la migracion 2
+# Uso: python -m benchmarks.schema_indexes [cantidad de ficheros] (desde la carpeta server)
+from sqlalchemy import Engine, false, insert, select
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import random, sys, tempfile, time
+
+from data import *
+
+TAGS = 1000
+USERS = 100
+TAGS_PER_FILE = 3
+DELETED_RATIO = 0.3
+REPEATS = 200
+
+
+def populate(engine: Engine, files: int) -> None:
+    now = datetime.now(timezone.utc)
+    dates = {"creation_date": now, "update_date": now}
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User), [{"id": i, "name": f"user{i}", **dates} for i in range(USERS)]
+        )
+        conn.execute(
+            insert(Tag), [{"id": i, "name": f"tag{i}", **dates} for i in range(TAGS)]
+        )
+        conn.execute(
+            insert(File),
+            [
+                {
+                    "id": i,
+                    "name": f"file{i}",
+                    "file_type": "txt",
+                    "size": i,
+                    "user_id": i % USERS,
+                    "deleted": random.random() < DELETED_RATIO,
+                    **dates,
+                }
+                for i in range(files)
+            ],
+        )
+        conn.execute(
+            insert(file_tags),
+            [
+                {"file_id": i, "tag_id": tag}
+                for i in range(files)
+                for tag in random.sample(range(TAGS), TAGS_PER_FILE)
+            ],
+        )
+        conn.execute(
+            insert(FileSource),
+            [
+                {"file_id": i, "chunk_size": 1024, "url": f"content/{i}", **dates}
+                for i in range(files)
+            ],
+        )
+
+
+def queries(files: int) -> Dict[str, Any]:
+    tag, user = random.randrange(TAGS), random.randrange(USERS)
+    file = random.randrange(user, files, USERS)
+    return {
+        "files by tag": select(File.id)
+        .join(file_tags, file_tags.c.file_id == File.id)
+        .where(file_tags.c.tag_id == tag, File.owner == LOCAL_OWNER, File.deleted == false()),
+        "tag by name": select(Tag.id).where(
+            Tag.owner == LOCAL_OWNER, Tag.name == f"tag{tag}", Tag.deleted == false()
+        ),
+        "file by key": select(File.id).where(
+            File.owner == LOCAL_OWNER,
+            File.user_id == user,
+            File.name == f"file{file}",
+            File.file_type == "txt",
+            File.deleted == false(),
+        ),
+        "live files page": select(File.id)
+        .where(File.owner == LOCAL_OWNER, File.deleted == false(), File.id > file)
+        .order_by(File.id)
+        .limit(100),
+        "user by name": select(User.id).where(
+            User.owner == LOCAL_OWNER, User.name == f"user{user}", User.deleted == false()
+        ),
+        "sources of file": select(FileSource.id).where(FileSource.file_id == file),
+    }
+
+
+def measure(engine: Engine, files: int) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    with engine.connect() as conn:
+        for _ in range(REPEATS):
+            for name, query in queries(files).items():
+                start = time.perf_counter()
+                conn.execute(query).all()
+                totals[name] = totals.get(name, 0) + time.perf_counter() - start
+    return {name: total / REPEATS * 1000 for name, total in totals.items()}
+
+
+def plans(engine: Engine, files: int) -> Dict[str, str]:
+    result = {}
+    with engine.connect() as conn:
+        for name, query in queries(files).items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+            result[name] = "; ".join(row[-1] for row in rows)
+    return result
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    db_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    migrate(db_url)
+    engine = get_engine(db_url)
+    with engine.begin() as conn:
+        for index in HOT_PATH_INDEXES:
+            index.drop(conn)
+    populate(engine, files)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    print(f"Store with {files} files, {TAGS} tags and {USERS} users")
+
+    before = measure(engine, files)
+    before_plans = plans(engine, files)
+    with engine.begin() as conn:
+        for index in HOT_PATH_INDEXES:
+            index.create(conn)
+        conn.exec_driver_sql("ANALYZE")
+    after = measure(engine, files)
+    after_plans = plans(engine, files)
+
+    print(f"{'query':>16} {'before ms':>10} {'after ms':>10}")
+    for name in before:
+        print(f"{name:>16} {before[name]:>10.3f} {after[name]:>10.3f}")
+    for name in before:
+        print(f"\n{name}\n  before: {before_plans[name]}\n  after:  {after_plans[name]}")
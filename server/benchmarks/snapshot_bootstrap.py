@@ -0,0 +1,85 @@
+# Benchmark del tiempo hasta el primer servicio de un nodo nuevo: snapshot contra filas
+# Uso: python -m benchmarks.snapshot_bootstrap [cantidad de ficheros] (desde la carpeta server)
+from sqlalchemy import func, insert, select
+from datetime import datetime, timezone
+from typing import Callable
+
+import base64, json, os, sys, tempfile, time
+
+from data import *
+from logic.configurable import Configurable
+from dist.chord_service import ChordService
+from dist.utils import owner_key
+
+TAGS = 100
+OWNER = owner_key(1)
+
+
+def populate(db_url: str, files: int) -> None:
+    now = datetime.now(timezone.utc)
+    dates = {"creation_date": now, "update_date": now}
+    engine = get_engine(db_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "bench", **dates}])
+        conn.execute(
+            insert(Tag), [{"id": i, "name": f"tag{i}", **dates} for i in range(TAGS)]
+        )
+        conn.execute(
+            insert(File),
+            [
+                {"id": i, "name": f"file{i}", "file_type": "txt", "size": i, "user_id": 1, **dates}
+                for i in range(files)
+            ],
+        )
+        conn.execute(
+            insert(file_tags),
+            [{"file_id": i, "tag_id": i % TAGS} for i in range(files)],
+        )
+
+
+def first_serve(db_url: str) -> int:
+    with get_engine(db_url).connect() as conn:
+        return conn.execute(select(func.count()).select_from(File)).scalar()
+
+
+def row_bootstrap(service: ChordService, donor: str, joiner: str) -> None:
+    data = json.loads(json.dumps(service.get_all_records(donor)))
+    service.set_all_records(joiner, OWNER, data)
+
+
+def snapshot_bootstrap(service: ChordService, donor: str, joiner: str) -> None:
+    snapshot = service.create_snapshot(donor)
+    fd, path = tempfile.mkstemp(suffix=".db", prefix=SNAPSHOT_PREFIX)
+    offset, eof = 0, False
+    with os.fdopen(fd, "wb") as file:
+        while not eof:
+            chunk, eof = service.read_snapshot(snapshot["snapshot"], offset)
+            chunk = base64.b64decode(base64.b64encode(chunk))
+            file.write(chunk)
+            offset += len(chunk)
+    service.load_snapshot(joiner, OWNER, path)
+    timestamp = datetime.fromisoformat(snapshot["timestamp"])
+    data = json.loads(json.dumps(service.get_all_records(donor, LOCAL_OWNER, timestamp)))
+    service.set_all_records(joiner, OWNER, data)
+
+
+def measure(name: str, bootstrap: Callable, service: ChordService, donor: str) -> None:
+    joiner = service.get_db_url(f"{name}.db")
+    start = time.perf_counter()
+    bootstrap(service, donor, joiner)
+    files = first_serve(joiner)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>9}: {elapsed:8.2f} s to first serve ({files} files)")
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    base_url = f"sqlite:///{tempfile.mkdtemp()}/"
+    config = Configurable({DB_BASE_URL_KEY: base_url, DB_URL_KEY: base_url + "donor.db"})
+    service = ChordService(None, config)
+    donor = service.get_db_url()
+    populate(donor, files)
+    print(f"Donor store with {files} files and {TAGS} tags")
+    measure("rows", row_bootstrap, service, donor)
+    measure("snapshot", snapshot_bootstrap, service, donor)
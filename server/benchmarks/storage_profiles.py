@@ -0,0 +1,87 @@
+# Benchmark de transacciones de escritura y latencia de lectura concurrente por perfil
+# Uso: python -m benchmarks.storage_profiles [segundos por perfil] (desde la carpeta server)
+from sqlalchemy import Engine, create_engine, func, insert, select
+from datetime import datetime, timezone
+from typing import List
+
+import statistics, sys, tempfile, threading, time
+
+from data import *
+
+READERS = 4
+SEED_FILES = 10000
+
+
+def populate(engine: Engine) -> None:
+    now = datetime.now(timezone.utc)
+    dates = {"creation_date": now, "update_date": now}
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "bench", **dates}])
+        conn.execute(
+            insert(File),
+            [
+                {"name": f"seed{i}", "file_type": "txt", "size": i, "user_id": 1, **dates}
+                for i in range(SEED_FILES)
+            ],
+        )
+
+
+def writer(engine: Engine, stop: threading.Event, counter: List[int]) -> None:
+    now = datetime.now(timezone.utc)
+    while not stop.is_set():
+        values = {
+            "name": f"file{counter[0]}",
+            "file_type": "txt",
+            "size": counter[0],
+            "user_id": 1,
+            "creation_date": now,
+            "update_date": now,
+        }
+        with engine.begin() as conn:
+            conn.execute(insert(File).values(**values))
+        counter[0] += 1
+
+
+def reader(engine: Engine, stop: threading.Event, latencies: List[float]) -> None:
+    query = select(func.count()).select_from(File).where(File.size > SEED_FILES // 2)
+    while not stop.is_set():
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(query).scalar()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def run(profile: str, seconds: float) -> None:
+    db_url = f"sqlite:///{tempfile.mkdtemp()}/{profile}.db"
+    if profile in STORAGE_PROFILES:
+        engine = get_engine(db_url, profile)
+    else:
+        # Pragmas of SQLite by default: rollback journal with full syncs
+        engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    populate(engine)
+
+    stop, counter, latencies = threading.Event(), [0], []
+    threads = [threading.Thread(target=writer, args=(engine, stop, counter))]
+    threads += [
+        threading.Thread(target=reader, args=(engine, stop, latencies))
+        for _ in range(READERS)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{profile:>9} {counter[0] / seconds:>10.0f} {p50:>9.2f} {p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'profile':>9} {'writes/s':>10} {'read p50':>9} {'read p95':>9}")
+    for profile in ("default", *STORAGE_PROFILES):
+        run(profile, seconds)
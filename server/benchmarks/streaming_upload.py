@@ -0,0 +1,109 @@
+# Benchmark de subida de ficheros grandes: contenido en el JSON contra tramas binarias en streaming
+# Uso: python -m benchmarks.streaming_upload [tamano maximo en MB] (desde la carpeta server)
+import hashlib, json, logging, os, random, socket, sys, tempfile, threading, time
+import tracemalloc
+
+from data import *
+from logic import controlers
+from logic.configurable import Configurable
+from logic.business_services import ServerService
+from servers.server import FRAME_HEADER, STREAM_READY, Server
+from servers.server import receive_message, receive_ready
+
+BLOCK_SIZE = 1 << 20
+# The JSON path holds several copies of the content, larger files do not fit in memory
+JSON_MAX_SIZE = 256 << 20
+PORT = 18555
+# Random bytes mapped to printable ASCII, valid UTF-8 for the JSON path
+PRINTABLE = bytes(32 + byte % 95 for byte in range(256))
+DATES = {"creation_date": "2026-01-01 00:00:00", "update_date": "2026-01-01 00:00:00"}
+
+
+def make_file(folder: str, size: int, name: str) -> str:
+    """Write a file of random text, each one different so no chunk is deduplicated."""
+    rnd = random.Random(f"{name}{size}")
+    path = os.path.join(folder, f"{name}{size}.txt")
+    with open(path, "wb") as file:
+        for _ in range(0, size, BLOCK_SIZE):
+            file.write(rnd.randbytes(BLOCK_SIZE).translate(PRINTABLE))
+    return path
+
+
+def file_info(path: str, user_id: int) -> dict:
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    return {"name": name, "file_type": "txt", "size": size, "user_id": user_id, **DATES}
+
+
+def call(message: dict) -> dict:
+    with socket.create_connection(("127.0.0.1", PORT)) as sock:
+        sock.sendall(json.dumps(message).encode("utf-8"))
+        return json.loads(receive_message(sock))
+
+
+def upload_json(path: str, user_id: int) -> None:
+    """Send the content inside the request, as the clients did before streaming."""
+    with open(path, "rb") as file:
+        content = file.read().decode("utf-8")
+    header = {"command_name": "Create", "function": "add", "dataset": ["file", "tags"]}
+    data = {"file": {**file_info(path, user_id), "content": content}, "tags": ["json"]}
+    call({"header": header, "data": data})
+
+
+def upload_stream(path: str, user_id: int) -> None:
+    """Send the metadata, then the content in checksummed frames once accepted."""
+    header = {"command_name": "Upload", "function": "upload", "dataset": ["file", "tags"]}
+    data = {"file": file_info(path, user_id), "tags": ["stream"]}
+    with socket.create_connection(("127.0.0.1", PORT)) as sock:
+        sock.sendall(json.dumps({"header": header, "data": data}).encode("utf-8"))
+        assert receive_ready(sock) == STREAM_READY
+        with open(path, "rb") as file:
+            while block := file.read(BUFFER_SIZE):
+                digest = hashlib.sha256(block).digest()
+                sock.sendall(FRAME_HEADER.pack(len(block), digest) + block)
+        sock.sendall(FRAME_HEADER.pack(0, bytes(32)))
+        response = receive_message(sock)
+    assert "error" not in json.loads(response), response
+
+
+def measure(upload, path: str, user_id: int) -> tuple:
+    """Return the throughput in MB/s and the peak of traced memory in MB."""
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    upload(path, user_id)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path) / (1 << 20)
+    return size / elapsed, tracemalloc.get_traced_memory()[1] / (1 << 20)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    max_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) << 20
+    folder = tempfile.mkdtemp()
+    config = Configurable(
+        {
+            HOST_KEY: "127.0.0.1",
+            PORT_KEY: PORT,
+            DB_URL_KEY: f"sqlite:///{folder}/bench.db",
+            CONTENT_PATH_KEY: folder,
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    service = ServerService(config)
+    controlers.set_server_service(service)
+    threading.Thread(target=Server(config).run, daemon=True).start()
+    user_id = service.get_user_id("bench")
+
+    print(f"{'MB':>6} {'mode':>7} {'MB/s':>7} {'peak MB':>8}")
+    tracemalloc.start()
+    size = 64 << 20
+    while size <= max_size:
+        modes = [("stream", upload_stream)]
+        if size <= JSON_MAX_SIZE:
+            modes.insert(0, ("json", upload_json))
+        for name, upload in modes:
+            path = make_file(folder, size, name)
+            throughput, peak = measure(upload, path, user_id)
+            print(f"{size >> 20:>6} {name:>7} {throughput:>7.1f} {peak:>8.1f}")
+            os.remove(path)
+        size *= 4
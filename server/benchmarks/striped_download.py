@@ -0,0 +1,132 @@
+# Benchmark de descarga de un fichero grande con trozos repartidos en el anillo segun la cantidad de nodos
+# Uso: python -m benchmarks.striped_download [tamano en MB] [MB/s por nodo] (desde la carpeta server)
+from concurrent.futures import ThreadPoolExecutor
+
+import json, logging, multiprocessing, os, socket, sys, tempfile, time
+
+from data import *
+from dist import chord_controlers
+from dist.chord_reference import ChordReference
+from dist.utils import chunk_key, ring_successors
+from logic import controlers
+from logic.chunk_store import ChunkStore
+from logic.configurable import Configurable
+from logic.business_services import ServerService
+from servers.server import STREAM_READY, Server
+from servers.server import receive_frame, receive_message, receive_ready
+
+NODES = (1, 2, 4, 8)
+FACTOR = 2
+BASE_PORT = 18600
+FETCH = {"command_name": "Fetch", "function": "fetch", "dataset": ["chunks"]}
+
+
+def node_config(port: int, folder: str = "") -> Configurable:
+    return Configurable(
+        {
+            HOST_KEY: "127.0.0.1",
+            PORT_KEY: port,
+            NODE_PORT_KEY: port,
+            DB_URL_KEY: f"sqlite:///{folder}/node.db",
+            CONTENT_PATH_KEY: folder,
+        }
+    )
+
+
+def serve(port: int, rate: float, ready) -> None:
+    """Run a storage node whose reads are limited to a bandwidth, as a disk or a link."""
+    logging.disable(logging.INFO)
+    folder = tempfile.mkdtemp()
+    config = node_config(port, folder)
+    migrate(config[DB_URL_KEY])
+    service = ServerService(config)
+    locate = service.Chunks.locate
+
+    def limited(digest: str, offset: int = 0, length=None) -> tuple:
+        result = locate(digest, offset, length)
+        if result:
+            time.sleep(result[2] / rate)
+        return result
+
+    service.Chunks.locate = limited
+    controlers.set_server_service(service)
+    chord_controlers._server_service = service
+    server = Server(config)
+    ready.set()
+    server.run()
+
+
+def fetch_share(fd: int, port: int, items: list) -> None:
+    """Fetch the chunks of one node in a single stream and write each at its place."""
+    data = {"chunks": [[digest, 0, None] for digest, _ in items]}
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(json.dumps({"header": FETCH, "data": data}).encode("utf-8"))
+        assert receive_ready(sock) == STREAM_READY
+        for _, position in items:
+            os.pwrite(fd, receive_frame(sock), position)
+        assert receive_frame(sock) is None
+        receive_message(sock)
+
+
+def download(path: str, chunks: list, holders: dict) -> None:
+    """Spread the chunks over their holders by bytes assigned, every node at once."""
+    shares, load, position = {}, {}, 0
+    for digest, size in chunks:
+        port = min(holders[digest], key=lambda port: load.get(port, 0))
+        load[port] = load.get(port, 0) + size
+        shares.setdefault(port, []).append((digest, position))
+        position += size
+    with open(path, "wb") as file:
+        file.truncate(position)
+        with ThreadPoolExecutor(len(shares)) as pool:
+            list(pool.map(lambda share: fetch_share(file.fileno(), *share), shares.items()))
+
+
+def run(nodes: int, chunks: list, source: ChunkStore, rate: float) -> float:
+    """Place the chunks in a ring of nodes and return the download throughput in MB/s."""
+    ports = [BASE_PORT + 10 * nodes + i for i in range(nodes)]
+    events = [multiprocessing.Event() for _ in ports]
+    processes = [
+        multiprocessing.Process(target=serve, args=(port, rate, event), daemon=True)
+        for port, event in zip(ports, events)
+    ]
+    for process in processes:
+        process.start()
+    for event in events:
+        event.wait()
+
+    ring = sorted((ChordReference(node_config(port)) for port in ports), key=lambda n: n.id)
+    ids = [node.id for node in ring]
+    holders, placed = {}, {}
+    for digest, _ in chunks:
+        nodes_of = [ring[i] for i in ring_successors(chunk_key(digest), ids, FACTOR)]
+        holders[digest] = [node.data_port for node in nodes_of]
+        for node in nodes_of:
+            placed.setdefault(node.data_port, (node, []))[1].append(digest)
+    for node, digests in placed.values():
+        codecs = [source.find(digest)[1] for digest in digests]
+        assert node.store_chunks(codecs, (source.read_stored(d)[1] for d in digests))
+
+    path = os.path.join(tempfile.mkdtemp(), "download")
+    start = time.perf_counter()
+    download(path, chunks, holders)
+    elapsed = time.perf_counter() - start
+    assert source.read_all(digest for digest, _ in chunks) == open(path, "rb").read()
+    os.remove(path)
+    for process in processes:
+        process.terminate()
+    return sum(size for _, size in chunks) / (1 << 20) / elapsed
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 256) << 20
+    rate = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) * (1 << 20)
+    source = ChunkStore(tempfile.mkdtemp())
+    chunks = source.write(os.urandom(size))
+    print(f"File of {size >> 20} MB in {len(chunks)} chunks, {FACTOR} copies of each")
+    print(f"Nodes serving at most {rate / (1 << 20):.0f} MB/s each\n")
+
+    print(f"{'nodes':>6} {'MB/s':>8}")
+    for nodes in NODES:
+        print(f"{nodes:>6} {run(nodes, chunks, source, rate):>8.1f}")
@@ -0,0 +1,89 @@
+# Benchmark de consultas de etiquetas: indice de bitmaps en memoria contra el plan SQL
+# Uso: python -m benchmarks.tag_index [cantidad de ficheros] (desde la carpeta server)
+from sqlalchemy import false, func, insert, select
+from datetime import datetime, timezone
+
+import os, random, sys, tempfile, time
+
+from data import *
+from logic.tag_index import TagIndex
+from logic.tag_query import compile_tag_query
+
+TAGS = 2000
+TAGS_PER_FILE = 4
+REPEATS = 20
+QUERIES = [
+    ["tag0"],
+    ["tag0 AND tag1"],
+    ["tag5 OR tag900 OR tag1999"],
+    ["tag0 AND NOT tag2"],
+    ["(tag1 OR tag3) AND NOT (tag0 AND tag2)"],
+]
+
+
+def populate(db_url: str, files: int) -> None:
+    now = datetime.now(timezone.utc)
+    dates = {"creation_date": now, "update_date": now}
+    # Zipf-like popularity: a few tags cover most files and most tags are rare
+    weights = [1 / (rank + 1) for rank in range(TAGS)]
+    migrate(db_url)
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "bench", **dates}])
+        conn.execute(
+            insert(Tag), [{"id": i + 1, "name": f"tag{i}", **dates} for i in range(TAGS)]
+        )
+        for start in range(1, files + 1, 100000):
+            ids = range(start, min(start + 100000, files + 1))
+            conn.execute(
+                insert(File),
+                [
+                    {"id": i, "name": f"f{i}", "file_type": "txt", "size": i, "user_id": 1, **dates}
+                    for i in ids
+                ],
+            )
+            conn.execute(
+                insert(file_tags),
+                [
+                    {"file_id": i, "tag_id": tag + 1}
+                    for i in ids
+                    for tag in set(random.choices(range(TAGS), weights, k=TAGS_PER_FILE))
+                ],
+            )
+
+
+def sql_query(db_url: str, tag_query: list) -> int:
+    query = select(func.count()).where(
+        File.owner == LOCAL_OWNER, File.deleted == false(), compile_tag_query(tag_query)
+    )
+    with get_engine(db_url).connect() as conn:
+        return conn.execute(query).scalar()
+
+
+def timed(function, *args) -> tuple:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / REPEATS * 1e6
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    path = f"{tempfile.mkdtemp()}/bench.db"
+    db_url = f"sqlite:///{path}"
+    populate(db_url, files)
+
+    index = TagIndex(db_url)
+    start = time.perf_counter()
+    index.load()
+    load = time.perf_counter() - start
+    stats = index.stats()
+    print(f"Store with {files} files, {TAGS} tags and {stats['links']} links")
+    print(f"Database file: {os.path.getsize(path) / 2**20:.1f} MiB")
+    print(f"Index: {stats['memory'] / 2**20:.1f} MiB, loaded in {load:.2f} s\n")
+
+    print(f"{'query':>40} {'matches':>9} {'sql us':>10} {'bitmap us':>10}")
+    for tag_query in QUERIES:
+        count, sql = timed(sql_query, db_url, tag_query)
+        bitmap, memory = timed(index.query, tag_query)
+        assert count == len(bitmap)
+        print(f"{tag_query[0]:>40} {count:>9} {sql:>10.0f} {memory:>10.0f}")
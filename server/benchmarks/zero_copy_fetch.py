@@ -0,0 +1,82 @@
+# Benchmark de lectura de contenido: trozos leidos y copiados en Python contra enviados con sendfile
+# Uso: python -m benchmarks.zero_copy_fetch [tamano en MB] (desde la carpeta server)
+import json, logging, os, socket, sys, tempfile, threading, time
+
+from data import *
+from logic import controlers
+from logic.handlers import Fetch
+from logic.configurable import Configurable
+from logic.business_services import ServerService
+from servers.server import FRAME_HEADER, STREAM_READY, FrameStream, Server
+from servers.server import receive_message, receive_ready
+
+PORT = 18575
+ROUNDS = 3
+# Ranges that skip the first and last bytes of every chunk, always read to be hashed
+RANGE_MARGIN = 100
+
+
+@Fetch({"chunks": list})
+def fetch_copy(chunks: list, stream: FrameStream) -> str:
+    """The read path before sendfile: every range read into memory and hashed."""
+    for digest, offset, length in chunks:
+        stream.send(controlers._server_service.Chunks.read_range(digest, offset, length))
+    return f"{len(chunks)} chunks sent"
+
+
+def receive(sock: socket.socket, buffer: memoryview) -> int:
+    """Drain the frames without checking them, return the payload bytes received."""
+    total = 0
+    while True:
+        header = sock.recv(FRAME_HEADER.size, socket.MSG_WAITALL)
+        size, _ = FRAME_HEADER.unpack(header)
+        if not size:
+            return total
+        while size:
+            count = sock.recv_into(buffer[: min(size, len(buffer))])
+            size -= count
+            total += count
+
+
+def fetch(function: str, ranges: list) -> float:
+    """Return the MB/s of fetching the ranges from the node."""
+    header = {"command_name": "Fetch", "function": function, "dataset": ["chunks"]}
+    buffer = memoryview(bytearray(1 << 20))
+    start = time.perf_counter()
+    with socket.create_connection(("127.0.0.1", PORT)) as sock:
+        sock.sendall(json.dumps({"header": header, "data": {"chunks": ranges}}).encode())
+        assert receive_ready(sock) == STREAM_READY
+        total = receive(sock, buffer)
+        receive_message(sock)
+    return total / (1 << 20) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 512) << 20
+    folder = tempfile.mkdtemp()
+    config = Configurable(
+        {
+            HOST_KEY: "127.0.0.1",
+            PORT_KEY: PORT,
+            DB_URL_KEY: f"sqlite:///{folder}/bench.db",
+            CONTENT_PATH_KEY: folder,
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    service = ServerService(config)
+    controlers.set_server_service(service)
+    threading.Thread(target=Server(config).run, daemon=True).start()
+
+    chunks = []
+    for _ in range(0, size, 1 << 24):
+        chunks.extend(service.Chunks.write(os.urandom(1 << 24)))
+    whole = [[digest, 0, None] for digest, _ in chunks]
+    parts = [[digest, RANGE_MARGIN, length - 2 * RANGE_MARGIN] for digest, length in chunks]
+    print(f"{size >> 20} MB in {len(chunks)} chunks, best of {ROUNDS} rounds\n")
+
+    print(f"{'ranges':>7} {'copy MB/s':>10} {'fetch MB/s':>11}")
+    for name, ranges in (("whole", whole), ("partial", parts)):
+        copy = max(fetch("fetch_copy", ranges) for _ in range(ROUNDS))
+        zero = max(fetch("fetch", ranges) for _ in range(ROUNDS))
+        print(f"{name:>7} {copy:>10.0f} {zero:>11.0f}")
@@ -1,10 +1,10 @@
 # Configura la URL de conexión a tu base de datos
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, MetaData
 
-import os
+import os, sys
 
 from data.const import *
+from data.migrations import MIGRATIONS, migrate
 
 load_dotenv()
 
@@ -13,10 +13,7 @@ base_url = os.getenv(DB_BASE_URL_ENV_KEY, DEFAULT_DB_BASE_URL)
 db_name = os.getenv(DB_NAME_ENV_KEY, DEFAULT_DB_NAME)
 DB_URL = base_url + db_name
 
-# Crear el motor de la base de datos
-engine = create_engine(DB_URL)
-
-# Crear todas las tablas (asumiendo que ya tienes modelos definidos)
-metadata = MetaData()
-metadata.create_all(engine)
-print("Base de datos y tablas creadas exitosamente.")
+# Crear las tablas y aplicar las migraciones pendientes (opcionalmente hasta una version)
+target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+version = migrate(DB_URL, target)
+print(f"Base de datos en la version {version} de {len(MIGRATIONS)}.")
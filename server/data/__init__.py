@@ -1,3 +1,7 @@
 from .models import *
+from .engine import *
+from .migrations import *
+from .group_commit import *
 from .repository import *
+from .async_repository import *
 from .const import *
@@ -0,0 +1,162 @@
+from sqlalchemy import Executable, Row, Select, Table, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Type
+
+import inspect, logging
+
+from .engine import get_async_engine
+from .const import LOCAL_OWNER
+from .repository import ModelType, ModelTypeDTO
+
+__all__ = ["AsyncRepository", "get_async_repository"]
+
+
+class AsyncRepository(Generic[ModelType]):
+    """Repository with the API of Repository whose database operations are coroutines.
+
+    Queries are Core selects of the model, since AsyncSession has no legacy Query.
+    Objects stay loaded after commit, so they can be read without further IO.
+    """
+
+    def __init__(
+        self, model: Type[ModelType], db_url: str, profile: Optional[str] = None
+    ) -> None:
+        """Initialize the repository with a model, database URL and storage profile."""
+        self.model = model
+        self.engine = get_async_engine(db_url, profile)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        logging.info(f"Async repository initialized for model: {model.__name__}")
+
+    def get_session(self) -> AsyncSession:
+        """Get a new session from the session factory."""
+        return self.session()
+
+    async def get(self, id: int) -> Optional[ModelType]:
+        """Retrieve an object of type ModelType by its ID."""
+        async with self.get_session() as session:
+            logging.info(f"Retrieving {self.model.__name__} with ID: {id}")
+            return await session.get(self.model, id)
+
+    async def get_all(self) -> List[ModelType]:
+        """Retrieve all objects of type ModelType."""
+        logging.info(f"Retrieving all {self.model.__name__} objects")
+        return await self.all(select(self.model))
+
+    def get_query(self, owner: Optional[str] = LOCAL_OWNER) -> Select:
+        """Retrieve a select of type ModelType scoped to the rows of an owner.
+
+        The local rows are used by default; None covers primary and replica rows.
+        """
+        query = select(self.model)
+        if owner is not None and hasattr(self.model, "owner"):
+            query = query.where(self.model.owner == owner)
+        return query
+
+    def insert(self, table: Optional[Table] = None):
+        """Return an insert of the store dialect, which supports ON CONFLICT clauses."""
+        table = self.model.__table__ if table is None else table
+        if self.engine.dialect.name == "postgresql":
+            return postgresql.insert(table)
+        return sqlite.insert(table)
+
+    async def all(
+        self, query: Select, session: Optional[AsyncSession] = None
+    ) -> List[ModelType]:
+        """Execute a given query and return all results."""
+        if session is None:
+            async with self.get_session() as session:
+                logging.info(f"Executing query for all {self.model.__name__} objects")
+                return list((await session.execute(query)).scalars().all())
+        return list((await session.execute(query)).scalars().all())
+
+    async def first(
+        self, query: Select, session: Optional[AsyncSession] = None
+    ) -> Optional[ModelType]:
+        """Execute a given query and return the first result."""
+        if session is None:
+            async with self.get_session() as session:
+                logging.info(f"Executing query for first {self.model.__name__} object")
+                return (await session.execute(query.limit(1))).scalars().first()
+        return (await session.execute(query.limit(1))).scalars().first()
+
+    async def rows(
+        self, statement: Executable, session: Optional[AsyncSession] = None
+    ) -> List[Row]:
+        """Execute a Core statement and return its rows, without loading ORM objects."""
+        if session is None:
+            async with self.get_session() as session:
+                return list((await session.execute(statement)).all())
+        return list((await session.execute(statement)).all())
+
+    async def create(
+        self,
+        obj: ModelType,
+        to_dto: Callable[[ModelType], ModelTypeDTO] = lambda _: None,
+    ) -> ModelTypeDTO:
+        """Add a new object of type ModelType to the database."""
+        async with self.get_session() as session:
+            logging.info(f"Creating new {self.model.__name__} object")
+            await self._modify_bd(obj, session, session.add)
+            return to_dto(obj)
+
+    async def create_all(self, objs: List[ModelType]) -> None:
+        """Add multiple new objects of type ModelType to the database."""
+        async with self.get_session() as session:
+            logging.info(f"Creating multiple {self.model.__name__} objects")
+            await self._modify_bd(objs, session, session.add_all)
+
+    async def update(self, obj: ModelType) -> None:
+        """Update an existing object of type ModelType in the database."""
+        async with self.get_session() as session:
+            logging.info(f"Updating {self.model.__name__} object with ID: {obj.id}")
+            await self._modify_bd(obj, session, session.merge)
+
+    async def delete(self, obj: ModelType) -> None:
+        """Delete an object of type ModelType from the database."""
+        async with self.get_session() as session:
+            logging.info(f"Deleting {self.model.__name__} object with ID: {obj.id}")
+            await self._modify_bd(obj, session, session.delete)
+
+    async def _modify_bd(self, obj: Any, session: AsyncSession, func: Callable) -> None:
+        try:
+            result = func(obj)
+            if inspect.isawaitable(result):
+                await result
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logging.error(f"Database error: {e}")
+            raise e
+
+    async def transaction(
+        self, operations: Callable[[AsyncSession], Awaitable[None]]
+    ) -> None:
+        """Execute multiple operations in a single transaction."""
+        async with self.get_session() as session:
+            try:
+                logging.info("Starting transaction")
+                await operations(session)
+                await session.commit()
+                logging.info("Transaction committed")
+            except SQLAlchemyError as e:
+                await session.rollback()
+                logging.error(f"Transaction error: {e}")
+                raise e
+
+    async def filter_by(self, **kwargs) -> List[ModelType]:
+        """Retrieve objects of type ModelType filtered by given criteria."""
+        logging.info(f"Filtering {self.model.__name__} objects by {kwargs}")
+        return await self.all(select(self.model).filter_by(**kwargs))
+
+    async def order_by(self, *criteria) -> List[ModelType]:
+        """Retrieve objects of type ModelType ordered by given criteria."""
+        logging.info(f"Ordering {self.model.__name__} objects by {criteria}")
+        return await self.all(select(self.model).order_by(*criteria))
+
+
+def get_async_repository(
+    model: Type[ModelType], db_url: str, profile: Optional[str] = None
+) -> AsyncRepository[ModelType]:
+    return AsyncRepository(model, db_url, profile)
@@ -13,6 +13,18 @@ DB_URL_KEY = "database_url"
 DB_BASE_URL_KEY = "db_base_url"
 DB_NAME_KEY = "db_name"
 CONTENT_PATH_KEY = "content_path"
+REPLICATION_FACTOR_KEY = "replication_factor"
+WRITE_QUORUM_KEY = "write_quorum"
+TAG_QUORUM_KEY = "tag_quorum"
+LIST_QUORUM_KEY = "list_quorum"
+HINTS_DB_NAME_KEY = "hints_db_name"
+BOOTSTRAP_MODE_KEY = "bootstrap_mode"
+STORAGE_PROFILE_KEY = "storage_profile"
+QUERY_ENGINE_KEY = "query_engine"
+CHUNKING_KEY = "chunking"
+ERASURE_CODING_KEY = "erasure_coding"
+COMPRESSION_KEY = "compression"
+GC_RETENTION_KEY = "gc_retention"
 
 # Environment variable keys
 PROTOCOL_ENV_KEY = "PROTOCOL"
@@ -23,6 +35,18 @@ MCAST_ADDR_ENV_KEY = "MCAST_ADDR"
 DB_BASE_URL_ENV_KEY = "DB_BASE_URL"
 DB_NAME_ENV_KEY = "DB_NAME"
 CONTENT_PATH_ENV_KEY = "CONTENT_PATH"
+REPLICATION_FACTOR_ENV_KEY = "REPLICATION_FACTOR"
+WRITE_QUORUM_ENV_KEY = "WRITE_QUORUM"
+TAG_QUORUM_ENV_KEY = "TAG_QUORUM"
+LIST_QUORUM_ENV_KEY = "LIST_QUORUM"
+HINTS_DB_NAME_ENV_KEY = "HINTS_DB_NAME"
+BOOTSTRAP_MODE_ENV_KEY = "BOOTSTRAP_MODE"
+STORAGE_PROFILE_ENV_KEY = "STORAGE_PROFILE"
+QUERY_ENGINE_ENV_KEY = "QUERY_ENGINE"
+CHUNKING_ENV_KEY = "CHUNKING"
+ERASURE_CODING_ENV_KEY = "ERASURE_CODING"
+COMPRESSION_ENV_KEY = "COMPRESSION"
+GC_RETENTION_ENV_KEY = "GC_RETENTION"
 
 
 # Default values
@@ -36,10 +60,50 @@ DEFAULT_MCAST_ADDR = "224.0.0.1"
 DEFAULT_DB_BASE_URL = "sqlite:///"
 DEFAULT_DB_NAME = "original.db"
 DEFAULT_CONTENT_PATH = "content"
+DEFAULT_REPLICATION_FACTOR = 3
+DEFAULT_WRITE_QUORUM = 2
+DEFAULT_TAG_QUORUM = 2
+DEFAULT_LIST_QUORUM = 1
+DEFAULT_HINTS_DB_NAME = "hints.db"
+DEFAULT_BOOTSTRAP_MODE = "snapshot"
+DEFAULT_STORAGE_PROFILE = "balanced"
+# Engine answering tag queries of listings: "bitmap" (in-memory index) or "sql"
+DEFAULT_QUERY_ENGINE = "bitmap"
+# Chunking of the stored content: "fixed" sizes or "cdc" (content-defined cut points),
+# which also deduplicates edited versions but ingests far slower
+DEFAULT_CHUNKING = "fixed"
+# Copies of the chunks on other nodes: "off" (full copies) or "k+m" Reed-Solomon shards,
+# any k of them rebuild a chunk, spread on k + m nodes of the ring
+DEFAULT_ERASURE_CODING = "off"
+# Compression of the stored chunks: "auto" (by file type and a sample of the content),
+# or always one codec: "none", "zlib", "lzma" or "zstd" (when zstandard is installed)
+DEFAULT_COMPRESSION = "auto"
+# Seconds soft-deleted rows and unreferenced chunks are kept before the collector removes them
+DEFAULT_GC_RETENTION = 86400
+
+# Owner of the rows written by this node, replica rows keep the owner node id
+LOCAL_OWNER = ""
 
 # Chord constants
 SHA_1 = 160
 BATCH_SIZE = 20
+BUFFER_SIZE = 65536
+QUERY_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 100
+TAG_CACHE_SIZE = 4096
+USER_CACHE_SIZE = 1024
+LIST_CACHE_SIZE = 256
+# Bytes of chunks read kept in memory by each node
+CONTENT_CACHE_SIZE = 64 << 20
+# Average size of the content chunks and the folder of the chunk store in the content path
+CHUNK_SIZE = 65536
+CHUNKS_DIR = "chunks"
+# Chunks encoded in shards at once when placing or repairing them
+SHARD_BATCH_SIZE = 256
+# Seconds a chunk stays whole next to its shards after it is written or rebuilt, then it
+# is cold and only its shards are kept
+ERASURE_COLD_AGE = 86400
+MAX_PAGE_SIZE = 1000
 WAIT_CHECK = 5
 START_MOD = 0.05
 BROADCAST_MOD = 0.25
@@ -47,6 +111,76 @@ STABLE_MOD = 2
 ELECTION_MOD = 0.1
 ELECTION_TIMEOUT = 10
 MAX_ITERATIONS = 3
+QUORUM_TIMEOUT = 10
+REPLICA_READ_TIMEOUT = 2
+HINT_BACKOFF_MAX = 120
+SNAPSHOT_CHUNK_SIZE = 262144
+SNAPSHOT_TTL = 600
+# Prefix of the snapshots received, only those in the temporary folder are loaded
+SNAPSHOT_PREFIX = "snapshot-"
+# Garbage collection: seconds between passes, rows and files removed per second at most,
+# and per batch, and seconds a write may take to reach the replica batches after its date
+GC_INTERVAL = 600
+GC_RATE = 500
+GC_BATCH_SIZE = 100
+GC_ACK_MARGIN = 10
+# Commands streaming binary frames after their request, served on their own thread
+STREAM_COMMANDS = ("Upload", "Fetch", "Store")
+STREAM_TIMEOUT = 60
+MAX_FRAME_SIZE = 1 << 24
+
+# Engine pool constants
+POOL_SIZE = 10
+POOL_MAX_OVERFLOW = 20
+POOL_TIMEOUT = 30
+POOL_RECYCLE = 1800
+# Storage profiles whose commits sync to disk, concurrent writes share their commits:
+# the writes of a group arrive within the window after the first, at most a batch of them
+GROUP_COMMIT_PROFILES = ("durable",)
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX_SIZE = 64
+# Async requests wait on the loop for a connection, many more than threads at once
+ASYNC_POOL_TIMEOUT = 300
+
+# SQLite pragmas per storage profile, fast may lose the last commits on power loss
+STORAGE_PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -8000,
+        "busy_timeout": 10000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -32000,
+        "busy_timeout": 5000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "mmap_size": 1073741824,
+        "cache_size": -64000,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+# Operation classes with their own replication quorum
+class QUORUM(Enum):
+    METADATA = 1
+    TAG = 2
+    LIST = 3
+
+
+QUORUM_KEYS = {
+    QUORUM.METADATA: WRITE_QUORUM_KEY,
+    QUORUM.TAG: TAG_QUORUM_KEY,
+    QUORUM.LIST: LIST_QUORUM_KEY,
+}
 
 
 # Commands for the Chord protocol
@@ -85,6 +219,14 @@ class CHORD_DATA(Enum):
     NOTIFY_CALL = 5
     GET_REPLICATION = 6
     SET_REPLICATION = 7
+    GET_SNAPSHOT = 8
+    # Was the snapshot load, reserved so that nodes of other builds number commands alike
+    RESERVED_SNAPSHOT_LOAD = 9
+    STORE_CHUNKS = 10
+    STORE_SHARDS = 11
+    LIST_SHARDS = 12
+    FETCH_SHARDS = 13
+    REFERENCED_CHUNKS = 14
 
 
 CHORD_DATA_COMMANDS = {
@@ -131,6 +273,36 @@ CHORD_DATA_COMMANDS = {
     CHORD_DATA.SET_REPLICATION: {
         "command_name": "Chord",
         "function": "update_replication",
-        "dataset": ["key", "data"],
+        "dataset": ["key", "data", "lsn"],
+    },
+    CHORD_DATA.GET_SNAPSHOT: {
+        "command_name": "Chord",
+        "function": "get_snapshot",
+        "dataset": ["snapshot", "offset"],
+    },
+    CHORD_DATA.STORE_CHUNKS: {
+        "command_name": "Store",
+        "function": "store_chunks",
+        "dataset": ["codecs"],
+    },
+    CHORD_DATA.STORE_SHARDS: {
+        "command_name": "Store",
+        "function": "store_shards",
+        "dataset": ["shards"],
+    },
+    CHORD_DATA.LIST_SHARDS: {
+        "command_name": "Chord",
+        "function": "list_shards",
+        "dataset": ["digests", "total"],
+    },
+    CHORD_DATA.FETCH_SHARDS: {
+        "command_name": "Fetch",
+        "function": "fetch_shards",
+        "dataset": ["shards"],
+    },
+    CHORD_DATA.REFERENCED_CHUNKS: {
+        "command_name": "Chord",
+        "function": "referenced_chunks",
+        "dataset": ["digests"],
     },
 }
@@ -0,0 +1,249 @@
+from sqlalchemy import Engine, MetaData, create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import logging, threading
+
+from .const import *
+from .models import Base
+
+__all__ = [
+    "get_engine",
+    "get_async_engine",
+    "get_storage_profile",
+    "get_metadata",
+    "clear_metadata",
+    "dispose_engines",
+    "dispose_async_engines",
+    "get_table_versions",
+    "bump_table_versions",
+]
+
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+_metadata: Dict[str, MetaData] = {}
+_profiles: Dict[str, str] = {}
+_versions: Dict[str, Dict[str, int]] = {}
+_lock = threading.RLock()
+
+# Version key bumped by writes whose tables are unknown, it invalidates every table
+ALL_TABLES = "*"
+WRITES_KEY = "written_tables"
+_DML = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Drivers of the async engines by backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _engine_options(db_url: str) -> Dict[str, Any]:
+    """Return the pool settings for the given database URL."""
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite":
+        return {
+            "pool_size": POOL_SIZE,
+            "max_overflow": POOL_MAX_OVERFLOW,
+            "pool_timeout": POOL_TIMEOUT,
+            "pool_recycle": POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+
+    options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+    if url.database in (None, "", ":memory:"):
+        options["poolclass"] = StaticPool
+    else:
+        options["pool_size"] = POOL_SIZE
+        options["max_overflow"] = POOL_MAX_OVERFLOW
+        options["pool_timeout"] = POOL_TIMEOUT
+    return options
+
+
+def _set_pragmas(engine: Engine, profile: str) -> None:
+    """Apply the pragmas of a storage profile to every new SQLite connection."""
+    pragmas = STORAGE_PROFILES[profile]
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, _) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _track_writes(engine: Engine, db_url: str) -> None:
+    """Bump the write version of the tables a connection changed when it commits."""
+
+    @event.listens_for(engine, "after_execute")
+    def on_execute(conn, statement, *_) -> None:
+        if isinstance(statement, TextClause):
+            statement = statement.text
+        if isinstance(statement, UpdateBase):
+            tables = {statement.table.name}
+        elif isinstance(statement, str) and statement.lstrip().upper().startswith(_DML):
+            tables = {ALL_TABLES}
+        else:
+            return
+        conn.info.setdefault(WRITES_KEY, set()).update(tables)
+
+    # The "commit" event runs before the DBAPI commit, a listing read in between would
+    # cache the old rows under the new version, so versions move once it returns
+    do_commit = engine.dialect.do_commit
+
+    def commit_and_bump(dbapi_connection) -> None:
+        do_commit(dbapi_connection)
+        tables = dbapi_connection.info.pop(WRITES_KEY, None)
+        if tables:
+            bump_table_versions(db_url, tables)
+
+    engine.dialect.do_commit = commit_and_bump
+
+    @event.listens_for(engine, "rollback")
+    def on_rollback(conn) -> None:
+        conn.info.pop(WRITES_KEY, None)
+
+
+def get_engine(db_url: str, profile: Optional[str] = None) -> Engine:
+    """Return the process-wide engine for a database URL, creating it once.
+
+    The storage profile only applies to SQLite and is fixed when the engine is created.
+    """
+    engine = _engines.get(db_url)
+    if engine is not None and profile in (None, _profiles.get(db_url)):
+        return engine
+
+    with _lock:
+        engine = _engines.get(db_url)
+        if engine is not None:
+            if profile not in (None, _profiles.get(db_url)):
+                logging.warning(
+                    f"Engine for {db_url} already uses profile: {_profiles.get(db_url)}"
+                )
+            return engine
+
+        profile = profile or DEFAULT_STORAGE_PROFILE
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
+        engine = create_engine(db_url, **_engine_options(db_url))
+        if engine.dialect.name == "sqlite":
+            _set_pragmas(engine, profile)
+        _track_writes(engine, db_url)
+        _engines[db_url] = engine
+        _profiles[db_url] = profile
+        logging.info(f"Engine created for: {db_url} with profile: {profile}")
+        return engine
+
+
+def _async_url(db_url: str) -> URL:
+    """Return the URL of a database with the async driver of its backend."""
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for backend: {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def get_async_engine(db_url: str, profile: Optional[str] = None) -> AsyncEngine:
+    """Return the process-wide async engine for a database URL, creating it once.
+
+    It shares the storage profile and the write versions of the sync engine of the URL.
+    """
+    engine = _async_engines.get(db_url)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _async_engines.get(db_url)
+        if engine is not None:
+            return engine
+
+        profile = profile or _profiles.get(db_url) or DEFAULT_STORAGE_PROFILE
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
+        options = _engine_options(db_url)
+        options.pop("connect_args", None)
+        if "pool_timeout" in options:
+            options["pool_timeout"] = ASYNC_POOL_TIMEOUT
+        if "pool_size" in options:
+            # aiosqlite opens a connection per checkout on its own pool
+            options["poolclass"] = AsyncAdaptedQueuePool
+        engine = create_async_engine(_async_url(db_url), **options)
+        if engine.dialect.name == "sqlite":
+            _set_pragmas(engine.sync_engine, profile)
+        _track_writes(engine.sync_engine, db_url)
+        _async_engines[db_url] = engine
+        logging.info(f"Async engine created for: {db_url} with profile: {profile}")
+        return engine
+
+
+def get_storage_profile(db_url: str) -> Optional[str]:
+    """Return the storage profile of the engine of a database URL, if created."""
+    return _profiles.get(db_url)
+
+
+def get_table_versions(db_url: str, tables: Iterable[str]) -> Tuple[int, ...]:
+    """Return the committed write versions of the tables of a database URL."""
+    versions = _versions.get(db_url, {})
+    return (versions.get(ALL_TABLES, 0),) + tuple(versions.get(t, 0) for t in tables)
+
+
+def bump_table_versions(db_url: str, tables: Optional[Iterable[str]] = None) -> None:
+    """Mark the tables of a database URL as changed, all of them if none are given."""
+    with _lock:
+        versions = _versions.setdefault(db_url, {})
+        for table in tables or (ALL_TABLES,):
+            versions[table] = versions.get(table, 0) + 1
+
+
+def get_metadata(db_url: str, refresh: bool = False) -> MetaData:
+    """Return the reflected model tables of a database URL, reflecting them only once."""
+    metadata = _metadata.get(db_url)
+    if metadata is not None and not refresh:
+        return metadata
+
+    with _lock:
+        metadata = _metadata.get(db_url)
+        if metadata is None or refresh:
+            metadata = MetaData()
+            metadata.reflect(
+                bind=get_engine(db_url),
+                only=lambda name, _: name in Base.metadata.tables,
+            )
+            _metadata[db_url] = metadata
+            logging.info(f"Metadata reflected for: {db_url}")
+        return metadata
+
+
+def clear_metadata(db_url: str) -> None:
+    """Forget the reflected schema of a database URL after a schema change."""
+    with _lock:
+        _metadata.pop(db_url, None)
+
+
+def dispose_engines() -> None:
+    """Dispose all the registered engines and their reflected schemas.
+
+    Write versions are kept so results cached before keep failing to match.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _metadata.clear()
+        _profiles.clear()
+
+
+async def dispose_async_engines() -> None:
+    """Dispose all the registered async engines, from the loop that used them.
+
+    aiosqlite runs each pooled connection on its own thread, which keeps the process alive.
+    """
+    with _lock:
+        engines = list(_async_engines.values())
+        _async_engines.clear()
+    for engine in engines:
+        await engine.dispose()
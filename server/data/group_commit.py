@@ -0,0 +1,223 @@
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import logging, os, queue, threading, time
+
+from .const import GROUP_COMMIT_MAX_SIZE, GROUP_COMMIT_PROFILES, GROUP_COMMIT_WINDOW
+from .engine import get_engine, get_storage_profile
+
+__all__ = ["GroupCommitter", "get_group_committer"]
+
+ResultType = TypeVar("ResultType")
+
+_committers: Dict[str, "GroupCommitter"] = {}
+_lock = threading.Lock()
+
+
+class _Write:
+    """A transaction or a set of content files waiting for the commit of its group."""
+
+    def __init__(
+        self, operation: Optional[Callable[[Session], Any]], paths: Tuple[str, ...] = ()
+    ) -> None:
+        self.operation = operation
+        self.paths = paths
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self) -> Any:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class GroupCommitter:
+    """Single writer of a database that commits concurrent write transactions together.
+
+    Writes arriving while a group commits, or within a window after the first, run in
+    one transaction, after the content files of the group are synced, so a durable
+    store pays one journal sync per group. Each caller returns once its group is
+    committed. Every write runs once, in a savepoint, a write that fails is rolled
+    back alone and the rest of the group commits.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        window: float = GROUP_COMMIT_WINDOW,
+        max_size: int = GROUP_COMMIT_MAX_SIZE,
+    ) -> None:
+        self.engine = engine
+        self.window = window
+        self.max_size = max_size
+        # Objects stay loaded after the commit, the callers read them on their threads
+        self._sessions = sessionmaker(bind=engine, expire_on_commit=False)
+        self._queue: "queue.Queue[_Write]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._counters = {"groups": 0, "writes": 0, "synced_files": 0, "failed": 0, "largest": 0}
+        # Session of the group being committed, writes issued by its writes join it
+        self._session: Optional[Session] = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="group-commit")
+        self._thread.start()
+
+    def commit(self, operation: Callable[[Session], ResultType]) -> ResultType:
+        """Run a write in the transaction of the next group, return its result once committed.
+
+        A write of a group that writes again runs inline, in a savepoint of the same group;
+        queueing it would wait for the writer that is running it.
+        """
+        if threading.current_thread() is self._thread and self._session is not None:
+            with self._session.begin_nested():
+                return operation(self._session)
+        write = _Write(operation)
+        self._queue.put(write)
+        return write.wait()
+
+    def sync(self, paths: Iterable[str]) -> None:
+        """Flush content files to disk with the next group, before its commit."""
+        if threading.current_thread() is self._thread:
+            paths = tuple(paths)
+            for path in paths:
+                self._fsync(path)
+            for folder in {os.path.dirname(path) for path in paths}:
+                self._fsync(folder)
+            return
+        write = _Write(None, tuple(paths))
+        if write.paths:
+            self._queue.put(write)
+            write.wait()
+
+    def _collect(self) -> List[_Write]:
+        """Wait for a write and gather the ones queued meanwhile or within the window."""
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_size:
+            try:
+                group.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                group.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    @staticmethod
+    def _fsync(path: str) -> None:
+        descriptor = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def _sync_files(self, writes: List[_Write]) -> int:
+        """Sync the files of the writes and their folders once each, return the files synced."""
+        folders, synced = set(), 0
+        for write in writes:
+            try:
+                for path in write.paths:
+                    self._fsync(path)
+                    folders.add(os.path.dirname(path))
+                    synced += 1
+            except OSError as e:
+                write.error = e
+        for folder in folders:
+            try:
+                self._fsync(folder)
+            except OSError as e:
+                logging.warning(f"Could not sync folder {folder}: {e}")
+        return synced
+
+    def _begin(self, session: Session) -> None:
+        """Open the transaction of a group before its savepoints.
+
+        pysqlite only begins transactions before DML, a first SAVEPOINT would open one
+        itself and its release would commit it, so SQLite stores begin explicitly.
+        """
+        connection = session.connection()
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("BEGIN")
+
+    def _commit(self, writes: List[_Write]) -> int:
+        """Run the writes in one transaction, each in a savepoint; return the failures."""
+        if not writes:
+            return 0
+        failed = 0
+        with self._sessions() as session:
+            self._session = session
+            try:
+                self._begin(session)
+                for write in writes:
+                    try:
+                        with session.begin_nested():
+                            write.result = write.operation(session)
+                    except Exception as e:
+                        # Only the changes of the failed write are rolled back
+                        logging.error(f"Write rolled back in its group: {e}")
+                        write.error = e
+                        failed += 1
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Group commit of {len(writes)} writes failed: {e}")
+                for write in writes:
+                    if write.error is None:
+                        write.error = e
+                        failed += 1
+            finally:
+                self._session = None
+        return failed
+
+    def _run(self) -> None:
+        while True:
+            group = self._collect()
+            try:
+                synced = self._sync_files([write for write in group if write.paths])
+                writes = [write for write in group if write.operation and write.error is None]
+                failed = self._commit(writes)
+            except BaseException as e:
+                logging.error(f"Group commit error: {e}")
+                for write in group:
+                    write.error = write.error or e
+                synced, failed = 0, len(group)
+            finally:
+                for write in group:
+                    write.done.set()
+            with self._stats_lock:
+                counters = self._counters
+                counters["groups"] += 1
+                counters["writes"] += len(group)
+                counters["synced_files"] += synced
+                counters["failed"] += failed
+                counters["largest"] = max(counters["largest"], len(group))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the groups committed, the writes and files in them and the failed writes."""
+        with self._stats_lock:
+            counters = dict(self._counters)
+        groups = counters["groups"]
+        counters["average"] = counters["writes"] / groups if groups else 0.0
+        return counters
+
+
+def get_group_committer(db_url: str) -> Optional[GroupCommitter]:
+    """Return the group committer of a database, None unless its profile syncs commits."""
+    if get_storage_profile(db_url) not in GROUP_COMMIT_PROFILES:
+        return None
+    engine = get_engine(db_url)
+    committer = _committers.get(db_url)
+    if committer is not None and committer.engine is engine:
+        return committer
+    with _lock:
+        committer = _committers.get(db_url)
+        if committer is None or committer.engine is not engine:
+            committer = _committers[db_url] = GroupCommitter(engine)
+            logging.info(f"Group commit enabled for: {db_url}")
+        return committer
@@ -0,0 +1,212 @@
+from sqlalchemy import Boolean, CheckConstraint, Column, Connection, DateTime, ForeignKey
+from sqlalchemy import Integer, MetaData, String, Table, UniqueConstraint
+from sqlalchemy import func, insert, inspect, select
+from typing import Callable, List, Tuple
+from datetime import datetime
+
+import logging
+
+from .const import LOCAL_OWNER
+from .models import *
+from .engine import get_engine, clear_metadata
+
+__all__ = ["MIGRATIONS", "migrate", "get_schema_version"]
+
+SCHEMA_VERSION_TABLE = "schema_version"
+
+version_metadata = MetaData()
+
+schema_version = Table(
+    SCHEMA_VERSION_TABLE,
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_date", DateTime, nullable=False),
+)
+
+Migration = Tuple[int, str, Callable[[Connection], None]]
+
+
+def _row_columns() -> List[Column]:
+    return [
+        Column("creation_date", DateTime, nullable=False),
+        Column("update_date", DateTime, nullable=False),
+        Column("deleted", Boolean, nullable=False),
+    ]
+
+
+# Schema of the first version, the later ones change it only through migrations
+baseline_metadata = MetaData()
+
+Table(
+    "users",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(30), nullable=False),
+    *_row_columns(),
+    CheckConstraint("update_date >= creation_date", name="check_update_date"),
+)
+Table(
+    "files",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(255), nullable=False),
+    Column("file_type", String(50), nullable=False),
+    Column("size", Integer, nullable=False),
+    *_row_columns(),
+    Column("user_id", ForeignKey("users.id"), nullable=False),
+    UniqueConstraint("name", "file_type", "user_id", name="uq_name_type_by_user"),
+)
+Table(
+    "file_sources",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("file_id", ForeignKey("files.id"), nullable=False),
+    Column("chunk_size", Integer, nullable=False),
+    Column("url", String(255), nullable=False),
+    *_row_columns(),
+)
+Table(
+    "tags",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(50), unique=True, nullable=False),
+    *_row_columns(),
+    CheckConstraint("update_date >= creation_date", name="check_update_date"),
+)
+Table(
+    "file_tags",
+    baseline_metadata,
+    Column("file_id", ForeignKey("files.id"), primary_key=True),
+    Column("tag_id", ForeignKey("tags.id"), primary_key=True),
+)
+
+# Tags of version 2, their names are unique per owner; built aside and renamed
+_tags_metadata = MetaData()
+_rebuilt_tags = Table(
+    "tags_rebuilt",
+    _tags_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(50), nullable=False),
+    *_row_columns(),
+    Column("owner", String(48), nullable=False, server_default=LOCAL_OWNER),
+    Column("origin_id", Integer, nullable=True),
+    CheckConstraint("update_date >= creation_date", name="check_update_date"),
+    UniqueConstraint("name", "owner", name="uq_name_by_owner"),
+    UniqueConstraint("owner", "origin_id", name="uq_tags_origin"),
+)
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _baseline(conn: Connection) -> None:
+    """Create the tables of the first schema that do not exist yet."""
+    baseline_metadata.create_all(conn)
+
+
+def _add_owner(conn: Connection, table: str, origin: bool = True) -> None:
+    """Add the owner column to a table, and the origin id unique per owner."""
+    columns = _columns(conn, table)
+    if "owner" not in columns:
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN owner VARCHAR(48) NOT NULL DEFAULT '{LOCAL_OWNER}'"
+        )
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_owner ON {table} (owner)")
+    if not origin:
+        return
+    if "origin_id" not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN origin_id INTEGER")
+    conn.exec_driver_sql(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_origin ON {table} (owner, origin_id)"
+    )
+
+
+def _rebuild_tags(conn: Connection) -> None:
+    """Rebuild the tags with the owner columns, a unique column can not be altered in place."""
+    names = ["id", "name", "creation_date", "update_date", "deleted"]
+    _rebuilt_tags.create(conn)
+    columns = ", ".join(names)
+    conn.exec_driver_sql(
+        f"INSERT INTO {_rebuilt_tags.name} ({columns}, owner) "
+        f"SELECT {columns}, '{LOCAL_OWNER}' FROM tags"
+    )
+    conn.exec_driver_sql("DROP TABLE tags")
+    conn.exec_driver_sql(f"ALTER TABLE {_rebuilt_tags.name} RENAME TO tags")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_tags_owner ON tags (owner)")
+
+
+def _replicated_rows(conn: Connection) -> None:
+    """Tag the rows with the node owning them and their id there, tag names per owner."""
+    for model in (User, File, FileSource):
+        _add_owner(conn, model.__tablename__)
+    _add_owner(conn, file_tags.name, origin=False)
+    if "owner" not in _columns(conn, Tag.__tablename__):
+        _rebuild_tags(conn)
+
+
+def _hot_path_indexes(conn: Connection) -> None:
+    """Create the indexes of the tag, lookup and live row queries."""
+    for index in HOT_PATH_INDEXES:
+        index.create(conn, checkfirst=True)
+
+
+def _chunked_sources(conn: Connection) -> None:
+    """Add the position and hash of the chunk to the file sources and index the hashes."""
+    table = FileSource.__tablename__
+    columns = _columns(conn, table)
+    if "chunk_index" not in columns:
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN chunk_index INTEGER NOT NULL DEFAULT 0"
+        )
+    if "chunk_hash" not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN chunk_hash VARCHAR(64)")
+    for index in CHUNK_INDEXES:
+        index.create(conn, checkfirst=True)
+
+
+def _chunk_codecs(conn: Connection) -> None:
+    """Add the codec the chunk is compressed with to the file sources."""
+    table = FileSource.__tablename__
+    columns = _columns(conn, table)
+    if "codec" not in columns:
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN codec VARCHAR(16) NOT NULL DEFAULT 'none'"
+        )
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "Baseline schema", _baseline),
+    (2, "Replicated rows", _replicated_rows),
+    (3, "Hot path indexes", _hot_path_indexes),
+    (4, "Chunked file sources", _chunked_sources),
+    (5, "Chunk codecs", _chunk_codecs),
+]
+
+
+def get_schema_version(conn: Connection) -> int:
+    """Return the last migration applied to a database, 0 if none."""
+    version_metadata.create_all(conn)
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def migrate(db_url: str, target: int | None = None) -> int:
+    """Apply the pending migrations of a database up to the target version."""
+    engine = get_engine(db_url)
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+        for version, description, upgrade in MIGRATIONS:
+            if version <= current or (target is not None and version > target):
+                continue
+            logging.info(f"Applying migration {version}: {description} to {db_url}")
+            upgrade(conn)
+            values = {
+                "version": version,
+                "description": description,
+                "applied_date": datetime.now(),
+            }
+            conn.execute(insert(schema_version).values(**values))
+            current = version
+    clear_metadata(db_url)
+    return current
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 from sqlalchemy import (
     Column,
     String,
@@ -8,27 +8,51 @@ from sqlalchemy import (
     Table,
     UniqueConstraint,
     CheckConstraint,
+    Index,
+    false,
 )
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
 from datetime import datetime, timezone
 
+from .const import LOCAL_OWNER
 
-__all__ = ["Base", "User", "File", "FileSource", "Tag", "file_tags"]
+
+__all__ = [
+    "Base",
+    "Replicated",
+    "User",
+    "File",
+    "FileSource",
+    "Tag",
+    "file_tags",
+    "HOT_PATH_INDEXES",
+    "CHUNK_INDEXES",
+]
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class Replicated:
+    """Columns that tag a row with the node owning it and its id on that node."""
+
+    owner: Mapped[str] = mapped_column(
+        String(48), default=LOCAL_OWNER, nullable=False, index=True
+    )
+    origin_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+
+
 file_tags = Table(
     "file_tags",
     Base.metadata,
     Column("file_id", ForeignKey("files.id"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id"), primary_key=True),
+    Column("owner", String(48), default=LOCAL_OWNER, nullable=False, index=True),
 )
 
 
-class User(Base):
+class User(Replicated, Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -48,13 +72,14 @@ class User(Base):
 
     __table_args__ = (
         CheckConstraint("update_date >= creation_date", name="check_update_date"),
+        UniqueConstraint("owner", "origin_id", name="uq_users_origin"),
     )
 
     def __repr__(self) -> str:
         return f"User(id={self.id!r}, name={self.name!r})"
 
 
-class File(Base):
+class File(Replicated, Base):
     __tablename__ = "files"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -91,19 +116,26 @@ class File(Base):
 
     __table_args__ = (
         UniqueConstraint("name", "file_type", "user_id", name="uq_name_type_by_user"),
+        UniqueConstraint("owner", "origin_id", name="uq_files_origin"),
     )
 
     def __repr__(self) -> str:
         return f"File(id={self.id!r}, name={self.name!r}, file_type={self.file_type!r}, size={self.size!r})"
 
 
-class FileSource(Base):
+class FileSource(Replicated, Base):
+    """A chunk of the content of a file, at its position among the chunks of the file."""
+
     __tablename__ = "file_sources"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     file_id: Mapped[int] = mapped_column(ForeignKey("files.id"))
     chunk_size: Mapped[int] = mapped_column(nullable=False)
     url: Mapped[str] = mapped_column(String(255), nullable=False)
+    chunk_index: Mapped[int] = mapped_column(default=0, nullable=False)
+    chunk_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # Codec the chunk is kept compressed with in the chunk store
+    codec: Mapped[str] = mapped_column(String(16), default="none", nullable=False)
 
     creation_date: Mapped[datetime] = mapped_column(
         default=datetime.now(timezone.utc), nullable=False
@@ -119,15 +151,19 @@ class FileSource(Base):
         single_parent=True,
     )
 
+    __table_args__ = (
+        UniqueConstraint("owner", "origin_id", name="uq_file_sources_origin"),
+    )
+
     def __repr__(self) -> str:
-        return f"FileSource(id={self.id!r}, file_id={self.file_id!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
+        return f"FileSource(id={self.id!r}, file_id={self.file_id!r}, chunk_index={self.chunk_index!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
 
 
-class Tag(Base):
+class Tag(Replicated, Base):
     __tablename__ = "tags"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String(50), nullable=False)
 
     creation_date: Mapped[datetime] = mapped_column(
         default=datetime.now(timezone.utc), nullable=False
@@ -144,7 +180,35 @@ class Tag(Base):
 
     __table_args__ = (
         CheckConstraint("update_date >= creation_date", name="check_update_date"),
+        UniqueConstraint("name", "owner", name="uq_name_by_owner"),
+        UniqueConstraint("owner", "origin_id", name="uq_tags_origin"),
     )
 
     def __repr__(self) -> str:
         return f"Tag(id={self.id!r}, name={self.name!r})"
+
+
+# Indexes of the hot query paths, live row indexes only cover rows not deleted
+HOT_PATH_INDEXES = [
+    Index("ix_file_tags_tag_file", file_tags.c.tag_id, file_tags.c.file_id),
+    Index("ix_file_sources_file", FileSource.file_id),
+    Index(
+        "ix_files_live",
+        File.owner,
+        File.id,
+        sqlite_where=File.deleted == false(),
+        postgresql_where=File.deleted == false(),
+    ),
+    Index(
+        "ix_users_live",
+        User.owner,
+        User.name,
+        sqlite_where=User.deleted == false(),
+        postgresql_where=User.deleted == false(),
+    ),
+]
+
+# Chunks are shared by content, the hash index finds every file using a chunk
+CHUNK_INDEXES = [
+    Index("ix_file_sources_hash", FileSource.chunk_hash),
+]
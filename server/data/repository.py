@@ -1,4 +1,5 @@
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, Executable, Row, Table
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, scoped_session, Session as SessionType, Query
 from typing import Callable, TypeVar, Generic, Type, List, Optional
@@ -6,25 +7,35 @@ from typing import Callable, TypeVar, Generic, Type, List, Optional
 import logging
 
 from .models import Base
+from .engine import get_engine
+from .group_commit import get_group_committer
+from .const import LOCAL_OWNER
 
 __all__ = ["Repository", "get_repository", "ModelType", "ModelTypeDTO"]
 
 ModelType = TypeVar("ModelType", bound=Base)
 ModelTypeDTO = TypeVar("ModelTypeDTO")
+ResultType = TypeVar("ResultType")
 
 
 class Repository(Generic[ModelType]):
     """Generic repository for performing database operations on models of type ModelType."""
 
-    def __init__(self, model: Type[ModelType], db_url: str) -> None:
-        """Initialize the repository with a model and database URL."""
+    def __init__(
+        self, model: Type[ModelType], db_url: str, profile: Optional[str] = None
+    ) -> None:
+        """Initialize the repository with a model, database URL and storage profile."""
         self.model = model
-        self.session = self._create_session_factory(db_url)
+        self.session = self._create_session_factory(db_url, profile)
+        # Writes share the commits of a single writer on profiles that sync each commit
+        self.committer = get_group_committer(db_url)
         logging.info(f"Repository initialized for model: {model.__name__}")
 
-    def _create_session_factory(self, db_url: str) -> scoped_session[SessionType]:
-        """Create a session factory for the database engine."""
-        engine: Engine = create_engine(db_url)
+    def _create_session_factory(
+        self, db_url: str, profile: Optional[str] = None
+    ) -> scoped_session[SessionType]:
+        """Create a session factory for the shared database engine."""
+        engine: Engine = get_engine(db_url, profile)
         session_factory: sessionmaker[SessionType] = sessionmaker(bind=engine)
         session: scoped_session[SessionType] = scoped_session(session_factory)
         return session
@@ -45,9 +56,23 @@ class Repository(Generic[ModelType]):
             logging.info(f"Retrieving all {self.model.__name__} objects")
             return session.query(self.model).all()
 
-    def get_query(self) -> Query[ModelType]:
-        """Retrieve a query of type ModelType."""
-        return self.get_session().query(self.model)
+    def get_query(self, owner: Optional[str] = LOCAL_OWNER) -> Query[ModelType]:
+        """Retrieve a query of type ModelType scoped to the rows of an owner.
+
+        The local rows are used by default; None covers primary and replica rows.
+        """
+        query = self.get_session().query(self.model)
+        if owner is not None and hasattr(self.model, "owner"):
+            query = query.filter(self.model.owner == owner)
+        return query
+
+    def insert(self, table: Optional[Table] = None):
+        """Return an insert of the store dialect, which supports ON CONFLICT clauses."""
+        table = self.model.__table__ if table is None else table
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        return sqlite.insert(table)
 
     def all(
         self, query: Query[ModelType], session: Optional[SessionType] = None
@@ -71,57 +96,65 @@ class Repository(Generic[ModelType]):
         else:
             return query.with_session(session).first()
 
+    def rows(
+        self, statement: Executable, session: Optional[SessionType] = None
+    ) -> List[Row]:
+        """Execute a Core statement and return its rows, without loading ORM objects."""
+        if session is None:
+            with self.get_session() as session:
+                return session.execute(statement).all()
+        return session.execute(statement).all()
+
     def create(
         self,
         obj: ModelType,
         to_dto: Callable[[ModelType], ModelTypeDTO] = lambda _: None,
     ) -> ModelTypeDTO:
         """Add a new object of type ModelType to the database."""
-        with self.get_session() as session:
-            logging.info(f"Creating new {self.model.__name__} object")
-            self._modify_bd(obj, session, session.add)
+        logging.info(f"Creating new {self.model.__name__} object")
+
+        def operation(session: SessionType) -> ModelTypeDTO:
+            session.add(obj)
+            session.flush()
             return to_dto(obj)
 
+        return self._write(operation)
+
     def create_all(self, objs: List[ModelType]) -> None:
         """Add multiple new objects of type ModelType to the database."""
-        with self.get_session() as session:
-            logging.info(f"Creating multiple {self.model.__name__} objects")
-            self._modify_bd(objs, session, session.add_all)
+        logging.info(f"Creating multiple {self.model.__name__} objects")
+        self._write(lambda session: session.add_all(objs))
 
     def update(self, obj: ModelType) -> None:
         """Update an existing object of type ModelType in the database."""
-        with self.get_session() as session:
-            logging.info(f"Updating {self.model.__name__} object with ID: {obj.id}")
-            self._modify_bd(obj, session, session.merge)
+        logging.info(f"Updating {self.model.__name__} object with ID: {obj.id}")
+        self._write(lambda session: session.merge(obj))
 
     def delete(self, obj: ModelType) -> None:
         """Delete an object of type ModelType from the database."""
-        with self.get_session() as session:
-            logging.info(f"Deleting {self.model.__name__} object with ID: {obj.id}")
-            self._modify_bd(obj, session, session.delete)
-
-    def _modify_bd(self, obj: ModelType, session: SessionType, func: Callable) -> None:
-        try:
-            func(obj)
-            session.commit()
-        except SQLAlchemyError as e:
-            session.rollback()
-            logging.error(f"Database error: {e}")
-            raise e
+        logging.info(f"Deleting {self.model.__name__} object with ID: {obj.id}")
+        self._write(lambda session: session.delete(obj))
 
-    def transaction(self, operations: Callable[[SessionType], None]) -> None:
-        """Execute multiple operations in a single transaction."""
+    def _write(self, operation: Callable[[SessionType], ResultType]) -> ResultType:
+        """Run a write and commit it, in the group of concurrent writes when the profile syncs."""
+        if self.committer is not None:
+            return self.committer.commit(operation)
         with self.get_session() as session:
             try:
-                logging.info("Starting transaction")
-                operations(session)
+                result = operation(session)
                 session.commit()
-                logging.info("Transaction committed")
+                return result
             except SQLAlchemyError as e:
                 session.rollback()
-                logging.error(f"Transaction error: {e}")
+                logging.error(f"Database error: {e}")
                 raise e
 
+    def transaction(self, operations: Callable[[SessionType], None]) -> None:
+        """Execute multiple operations in a single transaction."""
+        logging.info("Starting transaction")
+        self._write(operations)
+        logging.info("Transaction committed")
+
     def filter_by(self, **kwargs) -> List[ModelType]:
         """Retrieve objects of type ModelType filtered by given criteria."""
         with self.get_session() as session:
@@ -135,5 +168,7 @@ class Repository(Generic[ModelType]):
             return session.query(self.model).order_by(*criteria).all()
 
 
-def get_repository(model: Type[ModelType], db_url: str) -> Repository[ModelType]:
-    return Repository(model, db_url)
+def get_repository(
+    model: Type[ModelType], db_url: str, profile: Optional[str] = None
+) -> Repository[ModelType]:
+    return Repository(model, db_url, profile)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from datetime import datetime
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import threading, asyncio
 import time, logging
@@ -10,11 +10,12 @@ from sqlalchemy import Tuple
 
 from logic.configurable import Configurable
 from logic.handlers import *
+from logic.compression import unpack_payload
 from data.const import *
-from servers.server import Server
+from servers.server import FrameStream, Server
 
-from .chord_reference import ChordReference, replication
-from .utils import in_between
+from .chord_reference import ChordReference, replication, snapshot_replication
+from .utils import in_between, owner_key
 
 __all__ = ["ChordNode"]
 
@@ -31,6 +32,13 @@ class ChordNode(ChordReference, Server):
         self._successor: Optional[ChordReference] = self
         self._predecessor: Optional[ChordReference] = self
         self.finger_table: List[Optional[ChordReference]] = [self] * SHA_1
+        # Live nodes of the ring by id, kept by the stabilization for the placement to read
+        self._members: Dict[int, ChordReference] = {self.id: self}
+        self._members_lock = threading.Lock()
+        self._members_refreshed = False
+        self.lost_listeners: List[Callable[[ChordReference], None]] = []
+        # Called with the key and the path of the snapshots received, to load them
+        self.snapshot_loaders: List[Callable[[str, str], None]] = []
 
         Server.__init__(self, config)
         self._subscribe_read_port(self._config[NODE_PORT_KEY])
@@ -51,15 +59,28 @@ class ChordNode(ChordReference, Server):
     @sucs.setter
     def sucs(self, node: ChordReference):
         self._successor = node
-        replication(self, node, "sucs.db")
+        self._add_member(node)
+        self._bootstrap(node)
 
     @pred.setter
     def pred(self, node: ChordReference):
         self._predecessor = node
-        replication(self, node, "pred.db")
+        self._add_member(node)
+        self._bootstrap(node)
 
     # endregion
 
+    def _bootstrap(self, node: ChordReference) -> None:
+        """Copy the data of a new neighbour, from a snapshot when enabled."""
+        if node.id == self.id:
+            return
+
+        key = owner_key(node.id)
+        if self._config[BOOTSTRAP_MODE_KEY] == "snapshot":
+            snapshot_replication(self, node, key)
+        else:
+            replication(self, node, key)
+
     # region Server Methods
     def _is_node_request(self, addr: Tuple[str, int]) -> bool:
         """Check if the request is from a node based on the port."""
@@ -70,52 +91,137 @@ class ChordNode(ChordReference, Server):
     # endregion
 
     # region Server TCP
-    def _process_mesage(self, message: bytes, addr: Tuple[str, int]) -> None:
+    def _process_mesage(
+        self,
+        header_dict: Dict[str, Any],
+        data: Dict[str, Any],
+        addr: Tuple[str, int],
+        stream: Optional[FrameStream] = None,
+    ) -> None:
         is_node_req = self._is_node_request(addr)
         while not is_node_req and (self.in_election or not self.leader):
             logging.warning("Waiting for new leader...")
             time.sleep(WAIT_CHECK * START_MOD)
-        return Server._process_mesage(self, message, addr)
+        return Server._process_mesage(self, header_dict, data, addr, stream)
 
     def _solver_request(
         self,
         header: Tuple[str, str, List[str]],
         data: Dict[str, Any],
         addr: Tuple[str, int],
+        stream: Optional[FrameStream] = None,
     ) -> str:
         """Solve the request and return the result."""
         is_node_req = self._is_node_request(addr)
 
         if is_node_req:
             logging.info("Handling the request as a node...")
-            return Server._solver_request(self, header, data, addr)
+            return Server._solver_request(self, header, data, addr, stream)
         logging.info("Handling the request as leader...")
-        return self._handle_leader_request(header, data, addr)
+        return self._handle_leader_request(header, data, addr, stream)
 
     def _handle_leader_request(
         self,
         header: Tuple[str, str, List[str]],
         data: Dict[str, Any],
         addr: Tuple[str, int],
+        stream: Optional[FrameStream] = None,
     ) -> str:
         """Handle the request as the leader and aggregate responses from other nodes."""
-        header[1] = handle_chord_conversion(header[1])
-        return Server._solver_request(self, header, data, addr)
+        command_name, func_name, dataset = header
+        header = (f"Chord{command_name}", handle_chord_conversion(func_name), dataset)
+        return Server._solver_request(self, header, data, addr, stream)
 
     # endregion
 
     def get_replication(self, key: str, ls_time: Optional[datetime]) -> Dict[str, Any]:
         logging.info("Getting replication reference")
         header = parse_header(CHORD_DATA_COMMANDS[CHORD_DATA.GET_REPLICATION])
-        value = Server._solver_request(self, header, {"key": key, "ls_time": ls_time})
+        ls_time = ls_time.isoformat() if ls_time else None
+        data = {"key": key, "last_timestamp": ls_time}
+        value = Server._solver_request(self, header, data)
         logging.info(f"Getting replication complete")
-        return json.load(value) if value else None
+        return unpack_payload(json.loads(value).get("data")) if value else None
 
-    def set_replication(self, key: str, data: Dict[str, Any]) -> None:
+    def set_replication(
+        self, key: str, data: Dict[str, Any], lsn: Optional[int] = None
+    ) -> bool:
         logging.info("Setting replication reference")
         header = parse_header(CHORD_DATA_COMMANDS[CHORD_DATA.SET_REPLICATION])
-        Server._solver_request(self, header, {"key": key, "data": data})
+        data = {"key": key, "data": data, "lsn": lsn}
+        value = Server._solver_request(self, header, data)
         logging.info(f"Setting replication complete")
+        return "error" not in json.loads(value)
+
+    def get_snapshot(
+        self, snapshot: Optional[str] = None, offset: int = 0
+    ) -> Dict[str, Any]:
+        logging.info(f"Getting snapshot {snapshot or 'new'} at offset: {offset}")
+        header = parse_header(CHORD_DATA_COMMANDS[CHORD_DATA.GET_SNAPSHOT])
+        data = {"snapshot": snapshot, "offset": offset}
+        value = Server._solver_request(self, header, data)
+        logging.info(f"Getting snapshot complete")
+        return json.loads(value)
+
+    def set_snapshot(self, key: str, path: str) -> bool:
+        """Load a snapshot received by this node, locally as its path is a local file."""
+        logging.info(f"Loading snapshot into {key}")
+        try:
+            for loader in self.snapshot_loaders:
+                loader(key, path)
+        except Exception as e:
+            logging.error(f"Error loading snapshot: {e}")
+            return False
+        logging.info(f"Loading snapshot complete")
+        return True
+
+    # region Membership
+    def _add_member(self, node: Optional[ChordReference]) -> None:
+        if node:
+            with self._members_lock:
+                self._members[node.id] = node
+
+    def _remove_member(self, node: ChordReference) -> None:
+        if node.id != self.id:
+            with self._members_lock:
+                self._members.pop(node.id, None)
+
+    def refresh_ring(self) -> None:
+        """Rebuild the view of the ring from the known nodes, the neighbours and the fingers.
+
+        Each node is asked once for its successor, which also tells it is alive; the walk
+        goes on past a dead node through the nodes known beyond it.
+        """
+        with self._members_lock:
+            known = list(self._members.values())
+        known += [self._successor, self._predecessor, *self.finger_table]
+        members: Dict[int, ChordReference] = {self.id: self}
+        checked = {self.id}
+        pending = [node for node in known if node]
+        while pending:
+            node = pending.pop()
+            if node.id in checked:
+                continue
+            checked.add(node.id)
+            successor = node.sucs
+            if successor is None:
+                continue
+            members[node.id] = node
+            pending.append(successor)
+        with self._members_lock:
+            self._members = members
+            self._members_refreshed = True
+        logging.info(f"Ring view refreshed with {len(members)} nodes")
+
+    def ring(self) -> List[ChordReference]:
+        """Return the live nodes of the ring sorted by id, from the view of the stabilization."""
+        if not self._members_refreshed:
+            self.refresh_ring()
+        with self._members_lock:
+            nodes = list(self._members.values())
+        return sorted(nodes, key=lambda node: node.id)
+
+    # endregion
 
     # region Findings Methods
     def _get_other_sucs(self):
@@ -178,6 +284,10 @@ class ChordNode(ChordReference, Server):
 
         while True:
             time.sleep(WAIT_CHECK * STABLE_MOD)
+            try:
+                self.refresh_ring()
+            except Exception as e:
+                logging.error(f"Error refreshing the ring view: {e}")
             if self.sucs.id == self.id:
                 continue
 
@@ -187,6 +297,8 @@ class ChordNode(ChordReference, Server):
                 logging.info("Already stable")
                 continue
 
+            lost = self.sucs
+            self._remove_member(lost)
             node = self._get_other_sucs()
             if node:
                 logging.info(f"Changing successor to {node.ip}")
@@ -196,6 +308,9 @@ class ChordNode(ChordReference, Server):
                 logging.info("I am alone...")
                 self.sucs = self
                 self.pred = self
+
+            for listener in self.lost_listeners:
+                listener(lost)
             logging.info("Stability check complete")
 
     async def _fix_fingers(self, remain: int = 0) -> None:
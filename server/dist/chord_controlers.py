@@ -1,20 +1,23 @@
-from typing import List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any
 from datetime import datetime
 
-import logging
+import base64, logging
 
 from data.const import *
 from logic.dtos import *
 from logic.handlers import *
 from logic import controlers
+from logic.compression import WIRE, pack_payload, unpack_payload
 from logic.business_services import ServerService
+from servers.server import FrameStream
 
 from .chord import ChordNode
-from .chord_service import ChordService
+from .chord_service import ChordService, QuorumError
 from .chord_reference import ChordReference
 
 _chord_node: Optional[ChordNode] = None
 _chord_service: Optional[ChordService] = None
+_server_service: Optional[ServerService] = None
 
 
 @Chord({"property": str})
@@ -109,112 +112,334 @@ def pon_call(message: str) -> Dict[str, Any]:
     return {"message": "Pong"}
 
 
-@Chord({"key": Optional[str], "last_timestamp": Optional[datetime]})
+@Chord({"key": Optional[str], "last_timestamp": Optional[str]})
 def get_replication(
     key: Optional[str],
-    last_timestamp: Optional[datetime],
+    last_timestamp: Optional[str],
 ) -> Dict[str, List[Dict[str, Any]]]:
-    key = key or _chord_service._config[DB_NAME_KEY]
-    db_url = _chord_service._config[DB_BASE_URL_KEY] + key
-    _chord_service.change_engine(db_url)
-    result = _chord_service.get_all_records(last_timestamp)
+    owner = key or LOCAL_OWNER
+    if last_timestamp:
+        last_timestamp = datetime.fromisoformat(last_timestamp)
+    db_url = _chord_service.get_db_url()
+    result = _chord_service.get_all_records(db_url, owner, last_timestamp)
     return {
         "message": "Replication data retrieved",
-        "data": result,
+        "data": pack_payload(result),
     }
 
 
-@Chord({"key": str, "data": Dict[str, List[Dict[str, Any]]]})
-def update_replication(key: str, data: Dict[str, List[Dict[str, Any]]]):
+@Chord({"key": str, "data": dict, "lsn": Optional[int]})
+def update_replication(
+    key: str, data: Dict[str, List[Dict[str, Any]]], lsn: Optional[int] = None
+):
     logging.info(f"Updating replication data for key: {key}")
-    db_url = _chord_service._config[DB_BASE_URL_KEY] + key
-    _chord_service.change_engine(db_url)
-    _chord_service.set_all_records(data)
+    db_url = _chord_service.get_db_url()
+    _chord_service.set_all_records(db_url, key, unpack_payload(data))
+    _server_service.invalidate_caches()
+    if lsn:
+        _chord_service.mark_applied(key, lsn)
     return {"message": "Replication data updated"}
 
 
+@Chord({"snapshot": Optional[str], "offset": int})
+def get_snapshot(snapshot: Optional[str], offset: int):
+    if not snapshot:
+        logging.info("Creating snapshot")
+        result = _chord_service.create_snapshot(_chord_service.get_db_url())
+        return {"message": "Snapshot created", **result}
+
+    chunk, eof = _chord_service.read_snapshot(snapshot, offset)
+    return {
+        "message": "Snapshot chunk retrieved",
+        "chunk": base64.b64encode(WIRE.compress(WIRE.setting, chunk)).decode("ascii"),
+        "codec": WIRE.setting,
+        "eof": eof,
+    }
+
+
 @ChordCreate({"file": FileInputDto, "tags": list})
-def chord_add(file: FileInputDto, tags: List[str]) -> str:
+def chord_add(file: FileInputDto, tags: List[str]) -> Dict[str, Any]:
     try:
         logging.info(f"Chord adding file with tags: {tags}")
         last_timestamp = datetime.now()
         result = controlers.add(file, tags)
-        _chord_service.replication(last_timestamp)
-        return str(result)
+        return _replicated_write(str(result), last_timestamp, QUORUM.METADATA)
     except Exception as e:
         logging.error(f"Error chord adding file: {e}")
         return str(e)
 
 
+@ChordUpload({"file": FileInputDto, "tags": list})
+def chord_upload(
+    file: FileInputDto, tags: List[str], stream: Iterable[bytes]
+) -> Dict[str, Any]:
+    try:
+        logging.info(f"Chord uploading file with tags: {tags}")
+        last_timestamp = datetime.now()
+        result = controlers.upload(file, tags, stream)
+        return _replicated_write(str(result), last_timestamp, QUORUM.METADATA)
+    except Exception as e:
+        logging.error(f"Error chord uploading file: {e}")
+        return str(e)
+
+
 @ChordDelete({"tag_query": list})
-def chord_delete(tag_query: List[str]) -> str:
+def chord_delete(tag_query: List[str]) -> Dict[str, Any]:
     try:
         logging.info(f"Chord deleting files with tags: {tag_query}")
         last_timestamp = datetime.now()
         controlers.delete(tag_query)
-        _chord_service.replication(last_timestamp)
-        return "Files deleted"
+        return _replicated_write("Files deleted", last_timestamp, QUORUM.METADATA)
     except Exception as e:
         logging.error(f"Error chord deleting files: {e}")
         return str(e)
 
 
-@ChordGetAll({"tag_query": list})
-def chord_list_files(tag_query: List[str]) -> list[str]:
+@ChordGetAll(
+    {
+        "tag_query": list,
+        "page_size": Optional[int],
+        "cursor": Optional[str],
+        "session_token": Optional[str],
+    }
+)
+def chord_list_files(
+    tag_query: List[str],
+    page_size: Optional[int] = None,
+    cursor: Optional[str] = None,
+    session_token: Optional[str] = None,
+) -> Dict[str, Any]:
     try:
-        logging.info(f"Chord listing files with tags: {tag_query}")
+        logging.info(f"Chord listing files with tags: {tag_query} after cursor: {cursor}")
+        owner = _chord_service.read_owner(session_token)
+        if owner != LOCAL_OWNER:
+            logging.info(f"Serving the listing from the replica rows of: {owner}")
+            return controlers.list_page(tag_query, page_size, cursor, owner)
         last_timestamp = datetime.now()
-        files = controlers.list_files(tag_query)
-        _chord_service.replication(last_timestamp)
-        return [str(file) for file in files]
+        page = controlers.list_page(tag_query, page_size, cursor)
+        try:
+            _chord_service.replication(last_timestamp, QUORUM.LIST)
+        except QuorumError as e:
+            # The listing is read from this node, replicas catch up in the background
+            logging.warning(f"Listing served before its replication: {e}")
+        return page
     except Exception as e:
         logging.error(f"Error chord listing files: {e}")
         return str(e)
 
 
 @ChordCreate({"tag_query": list, "tags": list})
-def chord_add_tags(tag_query: List[str], tags: List[str]) -> str:
+def chord_add_tags(tag_query: List[str], tags: List[str]) -> Dict[str, Any]:
     try:
         logging.info(f"Chord adding tags: {tags} to files with tags: {tag_query}")
         last_timestamp = datetime.now()
         controlers.add_tags(tag_query, tags)
-        _chord_service.replication(last_timestamp)
-        return "Tags added"
+        return _replicated_write("Tags added", last_timestamp, QUORUM.TAG)
     except Exception as e:
         logging.error(f"Error chord adding tags: {e}")
         return str(e)
 
 
 @ChordDelete({"tag_query": list, "tags": list})
-def chord_delete_tags(tag_query: List[str], tags: List[str]) -> str:
+def chord_delete_tags(tag_query: List[str], tags: List[str]) -> Dict[str, Any]:
     try:
         logging.info(f"Chord deleting tags: {tags} from files with tags: {tag_query}")
         last_timestamp = datetime.now()
         controlers.delete_tags(tag_query, tags)
-        _chord_service.replication(last_timestamp)
-        return "Tags deleted"
+        return _replicated_write("Tags deleted", last_timestamp, QUORUM.TAG)
     except Exception as e:
         logging.error(f"Error chord deleting tags: {e}")
         return str(e)
 
 
-@ChordGet({"user_name": str})
-def chord_get_user_id(user_name: str) -> int:
+@ChordGet({"user_name": str, "session_token": Optional[str]})
+def chord_get_user_id(user_name: str, session_token: Optional[str] = None) -> int:
     try:
         logging.info(f"Chord getting user ID for user: {user_name}")
+        owner = _chord_service.read_owner(session_token)
+        if owner != LOCAL_OWNER:
+            # Replicas can not create the user, the owner node has to
+            result = _server_service.get_replica_user_id(user_name, owner)
+            if result is None:
+                raise ValueError(f"User {user_name} unknown to the replica")
+            return result
         last_timestamp = datetime.now()
         result = controlers.get_user_id(user_name)
-        _chord_service.replication(last_timestamp)
+        _chord_service.replication(last_timestamp, QUORUM.METADATA)
         return result
     except Exception as e:
         logging.error(f"Error chord getting user ID: {e}")
         return str(e)
 
 
+@ChordGet({"file_id": int})
+def chord_get_file(file_id: int) -> Dict[str, Any]:
+    try:
+        logging.info(f"Chord getting file with ID: {file_id}")
+        result = controlers.get_file(file_id)
+        if not isinstance(result, dict):
+            return result
+        holders = _chord_service.chunk_holders(digest for digest, _ in result["chunks"])
+        for chunk in result["chunks"]:
+            ips = [node.ip for node in holders[chunk[0]]]
+            # The node the file was written to keeps every chunk of it
+            chunk.append(ips if _chord_node.ip in ips else ips + [_chord_node.ip])
+        return result
+    except Exception as e:
+        logging.error(f"Error chord getting file: {e}")
+        return str(e)
+
+
+@ChordFetch({"chunks": list})
+def chord_fetch(chunks: List[List[Any]], stream: FrameStream) -> str:
+    logging.info(f"Chord fetching {len(chunks)} chunk ranges")
+    # Chunks only kept as shards on the ring are rebuilt here first
+    missing = [digest for digest, _, _ in chunks if not _server_service.Chunks.has(digest)]
+    if missing:
+        _chord_service.restore_chunks(list(dict.fromkeys(missing)))
+    return controlers.fetch(chunks, stream)
+
+
+@Store({"codecs": list})
+def store_chunks(codecs: List[str], stream: Iterable[bytes]) -> Dict[str, Any]:
+    try:
+        stored = 0
+        for chunk in stream:
+            if stored == len(codecs):
+                raise ValueError("More chunks sent than codecs named")
+            _server_service.Chunks.put_stored(codecs[stored], chunk)
+            stored += 1
+        logging.info(f"Stored {stored} placed chunks")
+        return {"message": "Chunks stored", "chunks": stored}
+    except Exception as e:
+        logging.error(f"Error storing chunks: {e}")
+        return str(e)
+
+
+def _check_shards(shards: List[List[Any]]) -> None:
+    """Reject shards whose index is not one of the erasure code of this node."""
+    total = _chord_service.erasure.total if _chord_service.erasure else 0
+    for _, index in shards:
+        if type(index) is not int or not 0 <= index < total:
+            raise ValueError(f"Invalid shard index: {index!r}")
+
+
+@Store({"shards": list})
+def store_shards(shards: List[List[Any]], stream: Iterable[bytes]) -> Dict[str, Any]:
+    try:
+        _check_shards(shards)
+        stored = 0
+        for shard in stream:
+            if stored == len(shards):
+                raise ValueError("More shards sent than named")
+            digest, index = shards[stored]
+            _server_service.Chunks.put_shard(digest, index, shard)
+            stored += 1
+        logging.info(f"Stored {stored} shards")
+        return {"message": "Shards stored", "shards": stored}
+    except Exception as e:
+        logging.error(f"Error storing shards: {e}")
+        return str(e)
+
+
+@Chord({"digests": list, "total": int})
+def list_shards(digests: List[str], total: int) -> Dict[str, Any]:
+    try:
+        logging.info(f"Listing the shards of {len(digests)} chunks")
+        if not _chord_service.erasure or total != _chord_service.erasure.total:
+            raise ValueError(f"Invalid shard count: {total}")
+        held = {digest: _server_service.Chunks.shard_indexes(digest, total) for digest in digests}
+        return {
+            "message": "Shards listed",
+            "shards": {digest: indexes for digest, indexes in held.items() if indexes},
+        }
+    except Exception as e:
+        logging.error(f"Error listing shards: {e}")
+        return str(e)
+
+
+@Chord({"digests": list})
+def referenced_chunks(digests: List[str]) -> Dict[str, Any]:
+    try:
+        logging.info(f"Checking the references of {len(digests)} chunks")
+        return {
+            "message": "Chunk references checked",
+            "digests": _chord_service.referenced_chunks(digests),
+        }
+    except Exception as e:
+        logging.error(f"Error checking chunk references: {e}")
+        return str(e)
+
+
+@Fetch({"shards": list})
+def fetch_shards(shards: List[List[Any]], stream: FrameStream) -> str:
+    try:
+        logging.info(f"Fetching {len(shards)} shards")
+        _check_shards(shards)
+        for digest, index in shards:
+            stream.send(_server_service.Chunks.read_shard(digest, index))
+        return f"{len(shards)} shards sent"
+    except Exception as e:
+        logging.error(f"Error fetching shards: {e}")
+        return str(e)
+
+
+@ChordGet({})
+def chord_stats() -> Dict[str, Any]:
+    try:
+        logging.info("Chord getting cache and index stats")
+        result = controlers.stats()
+        if isinstance(result, dict):
+            result["garbage_collection"] = _chord_service.gc_stats()
+        return result
+    except Exception as e:
+        logging.error(f"Error chord getting stats: {e}")
+        return str(e)
+
+
+def _write_response(message: str, lsn: int) -> Dict[str, Any]:
+    """Return the response of a write with the session token reads must catch up to."""
+    return {
+        "message": message,
+        "session_token": _chord_service.session_token(lsn),
+        "replicas": _chord_service.replicas,
+    }
+
+
+def _replicated_write(
+    message: str, last_timestamp: datetime, operation: QUORUM
+) -> Dict[str, Any]:
+    """Replicate a write and return its response, an error when its quorum is not reached.
+
+    The write stays on this node and its replicas keep receiving it, so the error still
+    carries the session token, with the write marked as not durable.
+    """
+    try:
+        lsn = _chord_service.replication(last_timestamp, operation)
+    except QuorumError as e:
+        return {**_write_response(message, e.lsn), "error": str(e), "durable": False}
+    return _write_response(message, lsn)
+
+
+def _load_snapshot(key: str, path: str) -> None:
+    """Load a snapshot this node received, never a path given by a peer."""
+    logging.info(f"Loading snapshot for key: {key}")
+    _chord_service.load_snapshot(_chord_service.get_db_url(), key, path)
+    _server_service.invalidate_caches()
+
+
 def set_chord_node(chord_node: ChordNode) -> None:
     """Set the configuration for the server."""
-    global _chord_node, _chord_service
+    global _chord_node, _chord_service, _server_service
     _chord_node = chord_node
     _chord_service = ChordService(_chord_node, _chord_node._config)
     _server_service = ServerService(_chord_node._config)
+    _chord_service.chunks = _server_service.Chunks
+    _chord_service.run()
     controlers.set_server_service(_server_service)
+    _server_service.chunk_listeners.append(
+        lambda digests: _chord_service.place_chunks(digests)
+    )
+    _chord_node.snapshot_loaders.append(_load_snapshot)
+    # Promoted replica rows become local rows the indexes have not seen
+    _chord_node.lost_listeners.append(lambda _: _server_service.refresh_indexes())
@@ -1,14 +1,18 @@
 from __future__ import annotations
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 
-import socket, json, logging
+import base64, os, socket, json, logging, tempfile
 
 from logic.configurable import Configurable
 from logic.handlers import *
+from logic.compression import NO_CODEC, WIRE, pack_payload, unpack_payload
 from data.const import *
 
-from .utils import hash_sha1_key
+from servers.server import END_FRAME, STREAM_READY
+from servers.server import receive_frame, receive_message, receive_ready, send_frame
+
+from .utils import hash_sha1_key, owner_key
 
 __all__ = ["ChordReference"]
 
@@ -102,16 +106,28 @@ class ChordReference:
 
     def _get_replication(self, key: str, ls_time: Optional[datetime]) -> Dict[str, Any]:
         logging.info("Getting replication reference")
-        data = {"key": key, "ls_time": ls_time}
+        ls_time = ls_time.isoformat() if ls_time else None
+        data = {"key": key, "last_timestamp": ls_time}
         response = self._send_chord_message(CHORD_DATA.GET_REPLICATION, data)
-        value = response.get("value")
+        value = unpack_payload(response.get("data"))
         logging.info(f"Getting replication complete")
         return value
 
-    def _set_replication(self, key: str, data: Dict[str, Any]) -> None:
+    def _set_replication(
+        self, key: str, data: Dict[str, Any], lsn: Optional[int] = None
+    ) -> bool:
         logging.info("Setting replication reference")
-        self._send_chord_message(CHORD_DATA.SET_REPLICATION, {key, data})
+        data = {"key": key, "data": pack_payload(data), "lsn": lsn}
+        response = self._send_chord_message(CHORD_DATA.SET_REPLICATION, data)
         logging.info(f"Setting replication complete")
+        return "error" not in response
+
+    def _get_snapshot(self, snapshot: Optional[str], offset: int) -> Dict[str, Any]:
+        logging.info(f"Getting snapshot {snapshot or 'new'} at offset: {offset}")
+        data = {"snapshot": snapshot, "offset": offset}
+        response = self._send_chord_message(CHORD_DATA.GET_SNAPSHOT, data)
+        logging.info(f"Getting snapshot complete")
+        return response
 
     # endregion
 
@@ -125,14 +141,90 @@ class ChordReference:
     def get_replication(self, key: str, ls_time: Optional[datetime]) -> Dict[str, Any]:
         return self._get_replication(key, ls_time)
 
-    def set_replication(self, key: str, data: Dict[str, Any]) -> None:
-        self._set_replication(key, data)
+    def set_replication(
+        self, key: str, data: Dict[str, Any], lsn: Optional[int] = None
+    ) -> bool:
+        return self._set_replication(key, data, lsn)
+
+    def get_snapshot(
+        self, snapshot: Optional[str] = None, offset: int = 0
+    ) -> Dict[str, Any]:
+        return self._get_snapshot(snapshot, offset)
 
     def join(self, node: Optional[ChordReference] = None) -> None:
         self._call_notify_methods("join", node)
 
-    def get_replications(self) -> List[Tuple[ChordReference, str]]:
-        return [(self.sucs, "sucs"), (self.pred, "pred")]
+    def store_chunks(self, codecs: List[str], chunks: Iterable[bytes]) -> bool:
+        """Stream chunks as stored with their codecs, the node keeps each one under its hash."""
+        logging.info(f"Storing chunks in {self.ip}")
+        header = CHORD_DATA_COMMANDS[CHORD_DATA.STORE_CHUNKS]
+        response = self._stream_call(header, chunks, {"codecs": codecs})
+        logging.info(f"Storing chunks complete with response: {response}")
+        return isinstance(response, dict) and "error" not in response
+
+    def store_shards(self, shards: List[Tuple[str, int, bytes]]) -> bool:
+        """Stream shards to the node, which keeps each one under its chunk hash and index."""
+        logging.info(f"Storing {len(shards)} shards in {self.ip}")
+        data = {"shards": [[digest, index] for digest, index, _ in shards]}
+        header = CHORD_DATA_COMMANDS[CHORD_DATA.STORE_SHARDS]
+        response = self._stream_call(header, (shard for _, _, shard in shards), data)
+        logging.info(f"Storing shards complete with response: {response}")
+        return isinstance(response, dict) and "error" not in response
+
+    def list_shards(self, digests: List[str], total: int) -> Dict[str, List[int]]:
+        """Return the indexes of the shards of the chunks the node keeps."""
+        data = {"digests": digests, "total": total}
+        response = self._send_chord_message(CHORD_DATA.LIST_SHARDS, data)
+        return response.get("shards", {}) if isinstance(response, dict) else {}
+
+    def referenced_chunks(self, digests: List[str]) -> Optional[List[str]]:
+        """Return the chunks the rows of the node use, None when it does not answer."""
+        response = self._send_chord_message(CHORD_DATA.REFERENCED_CHUNKS, {"digests": digests})
+        if not isinstance(response, dict) or "digests" not in response:
+            return None
+        return response["digests"]
+
+    def fetch_shards(self, shards: List[List[Any]]) -> List[bytes]:
+        """Return the [hash, index] shards from the node, in order, up to one it lacks."""
+        logging.info(f"Fetching {len(shards)} shards from {self.ip}")
+        header = CHORD_DATA_COMMANDS[CHORD_DATA.FETCH_SHARDS]
+        message = json.dumps({"header": header, "data": {"shards": shards}})
+        payloads: List[bytes] = []
+        try:
+            with socket.create_connection((self.ip, self.chord_port), STREAM_TIMEOUT) as sock:
+                sock.sendall(message.encode("utf-8"))
+                if receive_ready(sock) != STREAM_READY:
+                    return payloads
+                while (payload := receive_frame(sock)) is not None:
+                    payloads.append(payload)
+                receive_message(sock)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error fetching shards from {self.ip}:{self.chord_port}: {e}")
+        return payloads[: len(shards)]
+
+    def get_replications(
+        self, factor: int = DEFAULT_REPLICATION_FACTOR
+    ) -> List[Tuple[ChordReference, str]]:
+        """Return the factor - 1 replica nodes, alternating successors and predecessors.
+
+        The key is the owner tag the replicas store my rows with.
+        """
+        result: List[Tuple[ChordReference, str]] = []
+        seen = {self.id}
+        key = owner_key(self.id)
+        sucs, pred = self, self
+        while len(result) < factor - 1:
+            sucs, pred = sucs.sucs, pred.pred
+            added = False
+            for node in (sucs, pred):
+                if not node or node.id in seen or len(result) >= factor - 1:
+                    continue
+                result.append((node, key))
+                seen.add(node.id)
+                added = True
+            if not added:
+                break
+        return result
 
     # endregion
 
@@ -147,7 +239,7 @@ class ChordReference:
         try:
             sock.connect((self.ip, port))
             sock.sendall(message.encode("utf-8"))
-            response = sock.recv(1024)
+            response = receive_message(sock)
             logging.info(f"Received response from {self.ip}:{port}: {response}")
             return json.loads(response.decode("utf-8"))
         except ConnectionRefusedError:
@@ -164,6 +256,26 @@ class ChordReference:
         finally:
             sock.close()
 
+    def _stream_call(
+        self, header: str, frames: Iterable[bytes], data: Dict[str, Any] = {}
+    ) -> Any:
+        """Send a streamed request, then its frames once the node accepts it."""
+        message = json.dumps({"header": header, "data": data})
+        address = (self.ip, self.chord_port)
+        try:
+            with socket.create_connection(address, STREAM_TIMEOUT) as sock:
+                sock.sendall(message.encode("utf-8"))
+                response = receive_ready(sock)
+                if response != STREAM_READY:
+                    return response
+                for frame in frames:
+                    send_frame(sock, frame)
+                sock.sendall(END_FRAME)
+                return json.loads(receive_message(sock).decode("utf-8"))
+        except (OSError, ValueError) as e:
+            logging.error(f"Error streaming to {self.ip}:{self.chord_port}: {e}")
+            return {"error": str(e)}
+
     def _send_chord_message(
         self, chord_data: CHORD_DATA, data: Dict[str, Any] = {}
     ) -> Dict[str, Any]:
@@ -189,8 +301,45 @@ def replication(
     key_dest: Optional[str],
     key_orig: Optional[str] = None,
     last_timestamp: Optional[datetime] = None,
-) -> None:
+) -> bool:
     logging.info(f"Replication from {orig.ip} to {dest.ip}")
     data = orig.get_replication(key_orig, last_timestamp)
     if data:
-        dest.set_replication(key_dest, data)
+        return dest.set_replication(key_dest, data)
+    return True
+
+
+def snapshot_replication(
+    dest: ChordReference,
+    orig: ChordReference,
+    key_dest: Optional[str],
+    key_orig: Optional[str] = None,
+) -> bool:
+    """Copy a whole store from a snapshot and catch up with the changes made after it."""
+    logging.info(f"Snapshot replication from {orig.ip} to {dest.ip}")
+    snapshot = orig.get_snapshot()
+    if "snapshot" not in snapshot:
+        logging.warning(f"Snapshot unavailable in {orig.ip}, replicating rows")
+        return replication(dest, orig, key_dest, key_orig)
+
+    fd, path = tempfile.mkstemp(suffix=".db", prefix=SNAPSHOT_PREFIX)
+    offset, eof = 0, False
+    with os.fdopen(fd, "wb") as file:
+        while not eof:
+            response = orig.get_snapshot(snapshot["snapshot"], offset)
+            if "chunk" not in response:
+                break
+            packed = base64.b64decode(response["chunk"])
+            chunk = WIRE.decompress(response.get("codec", NO_CODEC), packed)
+            file.write(chunk)
+            offset += len(chunk)
+            eof = response["eof"]
+
+    if not eof:
+        os.remove(path)
+        logging.warning(f"Snapshot transfer from {orig.ip} failed, replicating rows")
+        return replication(dest, orig, key_dest, key_orig)
+
+    dest.set_snapshot(key_dest, path)
+    last_timestamp = datetime.fromisoformat(snapshot["timestamp"])
+    return replication(dest, orig, key_dest, key_orig, last_timestamp)
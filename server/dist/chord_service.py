@@ -1,94 +1,1205 @@
-from sqlalchemy import MetaData, create_engine, select
-from typing import Any, List, Dict, Optional
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from contextlib import closing
+from sqlalchemy import Connection, DateTime, MetaData, Table, and_, false, or_, text, true
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.sql import ColumnElement
+from typing import Any, Callable, Iterable, List, Dict, Optional, Set, Tuple
+from datetime import datetime, timedelta
 
+import hashlib, logging, os, sqlite3, tempfile, threading, time, uuid
 
+from data import File, FileSource, Tag, User, file_tags, get_engine, get_metadata, migrate
 from data.const import *
+from logic.chunk_store import ChunkStore
 from logic.configurable import Configurable
+from logic.compression import portable_codec
+from logic.erasure import ReedSolomon
 from dist.chord import ChordNode
-from dist.chord_reference import replication
+from dist.chord_reference import ChordReference
+from dist.hints import HintStore
+from dist.utils import (
+    chunk_key,
+    decode_session_token,
+    encode_session_token,
+    owner_key,
+    ring_successors,
+)
 
 
-__all__ = ["ChordService"]
+__all__ = ["ChordService", "QuorumError"]
+
+
+class QuorumError(Exception):
+    """A write committed locally that fewer replicas than its quorum acknowledged."""
+
+    def __init__(self, operation: QUORUM, lsn: int, acks: int, quorum: int) -> None:
+        super().__init__(f"{operation.name} quorum not reached: {acks}/{quorum} acks")
+        self.lsn = lsn
+        self.acks = acks
+        self.quorum = quorum
 
 
 class ChordService:
     def __init__(self, _chord_node: ChordNode, config: Optional[Configurable]):
         self._chord_node = _chord_node
         self._config = config or Configurable()
-        self.change_engine()
+        profile = self._config[STORAGE_PROFILE_KEY]
+        get_engine(self.get_db_url(), profile)
+        hints_url = self.get_db_url(self._config[HINTS_DB_NAME_KEY])
+        self._hints = HintStore(hints_url, profile)
+        self._hints_lock = threading.Lock()
+        self._snapshots: Dict[str, Tuple[str, float]] = {}
+        # Log sequence numbers of the local writes and the ones applied per owner
+        self._lsn = 0
+        self._lsn_lock = threading.Lock()
+        self._pushers: Dict[str, ThreadPoolExecutor] = {}
+        self._applied: Dict[str, int] = {}
+        self._applied_changed = threading.Condition()
+        self.replicas: List[str] = []
+        # Shards replace the full copies of the chunks on other nodes when it is set
+        self.erasure = ReedSolomon.from_spec(self._config[ERASURE_CODING_KEY])
+        self.chunks: Optional[ChunkStore] = None
+        self._repair_needed = threading.Event()
+        # Last LSN each replica acknowledged, known once a batch was pushed since start
+        self._acked: Dict[str, int] = {}
+        self._replicated = False
+        self._gc_lock = threading.Lock()
+        self._gc_counters: Dict[str, Any] = {
+            "runs": 0,
+            "chunks": 0,
+            "chunk_files": 0,
+            "chunk_bytes": 0,
+            "content_files": 0,
+            "content_bytes": 0,
+            "cold_chunks": 0,
+            "cold_bytes": 0,
+            "rows": {},
+            "last_run": None,
+            "last_seconds": 0.0,
+        }
+
+    def get_db_url(self, key: Optional[str] = None) -> str:
+        """Return the database URL of a store, the primary one by default."""
+        if not key:
+            return self._config[DB_URL_KEY]
+        return self._config[DB_BASE_URL_KEY] + key
 
-    def _get_metadata(self):
-        metadata = MetaData()
-        metadata.reflect(bind=self.engine)
+    def _get_metadata(self, db_url: str) -> MetaData:
+        """Return the cached schema of a store, migrating it if it is new."""
+        metadata = get_metadata(db_url)
+        if not metadata.tables:
+            migrate(db_url)
+            metadata = get_metadata(db_url, refresh=True)
         return metadata
 
-    def change_engine(self, database_url: Optional[str] = None):
-        database_url = database_url or self._config[DB_URL_KEY]
-        self.engine = create_engine(database_url)
+    @staticmethod
+    def _to_record(row: Any) -> Dict[str, Any]:
+        return {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row._mapping.items()
+        }
+
+    @staticmethod
+    def _from_record(
+        table: Table,
+        record: Dict[str, Any],
+        owner: str,
+        id_maps: Dict[str, Dict[int, int]],
+    ) -> Dict[str, Any]:
+        """Translate a record of the owner node into a row of the local store."""
+        result = {}
+        for key, value in record.items():
+            column = table.c.get(key)
+            if column is None:
+                continue
+            if isinstance(column.type, DateTime) and isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            for foreign_key in column.foreign_keys:
+                value = id_maps[foreign_key.column.table.name].get(value)
+            result[key] = value
+        if "origin_id" in table.c:
+            result["origin_id"] = result.pop("id", None)
+        if "owner" in table.c:
+            result["owner"] = owner
+        return result
+
+    @staticmethod
+    def _origin_ids(
+        conn: Connection, table: Table, owner: str, ids: Set[int]
+    ) -> Dict[int, int]:
+        """Map origin ids of an owner to the local ids of its replica rows."""
+        result: Dict[int, int] = {}
+        ids = list(ids)
+        for i in range(0, len(ids), QUERY_BATCH_SIZE):
+            query = select(table.c.origin_id, table.c.id).where(
+                table.c.owner == owner,
+                table.c.origin_id.in_(ids[i : i + QUERY_BATCH_SIZE]),
+            )
+            result.update(conn.execute(query).all())
+        return result
+
+    def _load_references(
+        self,
+        conn: Connection,
+        table: Table,
+        owner: str,
+        records: List[Dict[str, Any]],
+        id_maps: Dict[str, Dict[int, int]],
+    ) -> None:
+        """Load the local ids of the rows referenced by the records."""
+        for column in table.c:
+            for foreign_key in column.foreign_keys:
+                target = foreign_key.column.table
+                mapping = id_maps.setdefault(target.name, {})
+                ids = {record.get(column.name) for record in records}
+                missing = ids - mapping.keys() - {None}
+                if missing and "origin_id" in target.c:
+                    mapping.update(self._origin_ids(conn, target, owner, missing))
 
     def get_records_by_table(
         self,
-        table_name: str,
-        last_timestamp: datetime = None,
-        metadata: MetaData = None,
+        conn: Connection,
+        table: Table,
+        owner: str = LOCAL_OWNER,
+        last_timestamp: Optional[datetime] = None,
     ) -> List[Dict[str, Any]]:
-        metadata = metadata or MetaData()
-        table = metadata.tables.get(table_name)
-        if table:
-            query = select(table)
-            if last_timestamp:
-                query = query.where(table.c.last_modified >= last_timestamp)
-            with self.engine.connect() as conn:
-                records = conn.execute(query).fetchall()
-            return list(map(dict, records))
+        query = select(table)
+        if "owner" in table.c:
+            query = query.where(table.c.owner == owner)
+        if last_timestamp and "update_date" in table.c:
+            query = query.where(table.c.update_date >= last_timestamp)
+        elif last_timestamp and table.name == file_tags.name:
+            # Links travel with their files, a link change updates its file
+            files = table.metadata.tables[File.__tablename__]
+            changed = select(files.c.id).where(files.c.update_date >= last_timestamp)
+            query = query.where(table.c.file_id.in_(changed))
+        records = conn.execute(query).fetchall()
+        return list(map(self._to_record, records))
 
     def get_all_records(
-        self, last_timestamp: datetime = None
+        self,
+        db_url: str,
+        owner: str = LOCAL_OWNER,
+        last_timestamp: Optional[datetime] = None,
     ) -> Dict[str, List[Dict[str, Any]]]:
-        metadata = MetaData()
+        metadata = self._get_metadata(db_url)
         result = {}
-        for table_name in metadata.tables.keys():
-            records = self.get_records_by_table(table_name, last_timestamp, metadata)
-            result[table_name] = records
+        with get_engine(db_url).connect() as conn:
+            for table in metadata.sorted_tables:
+                records = self.get_records_by_table(conn, table, owner, last_timestamp)
+                result[table.name] = records
         return result
 
-    def set_record_by_table(
-        self,
-        table_name: str,
-        record: Dict[str, Any],
-        metadata: MetaData = None,
-    ) -> None:
-        metadata = metadata or MetaData()
-        table = metadata.tables.get(table_name)
-        if table:
-            with self.engine.connect() as conn:
-                query = select(table).where(table.c.id == record["id"])
-                if not conn.execute(query.exists()):
-                    conn.execute(table.insert(), record)
-                elif query.c.last_modified < record["last_modified"]:
-                    conn.execute(table.update(), record)
-
     def set_records_by_table(
         self,
-        table_name: str,
+        conn: Connection,
+        table: Table,
+        owner: str,
         records: List[Dict[str, Any]],
-        metadata: MetaData = None,
+        id_maps: Dict[str, Dict[int, int]],
+        files: Optional[List[int]] = None,
     ) -> None:
-        metadata = metadata or MetaData()
+        """Apply the records of a table of an owner node to its replica rows.
+
+        Links have no identity, the ones of the files of the batch, origin ids in files,
+        replace the links those files had; every link of the owner when files is None.
+        """
+        self._load_references(conn, table, owner, records, id_maps)
+
+        if "origin_id" not in table.c:
+            if files is None:
+                conn.execute(delete(table).where(table.c.owner == owner))
+            else:
+                mapping = id_maps.setdefault(File.__tablename__, {})
+                missing = set(files) - mapping.keys()
+                if missing:
+                    parents = table.metadata.tables[File.__tablename__]
+                    mapping.update(self._origin_ids(conn, parents, owner, missing))
+                ids = [mapping[file] for file in files if file in mapping]
+                for i in range(0, len(ids), QUERY_BATCH_SIZE):
+                    batch = ids[i : i + QUERY_BATCH_SIZE]
+                    conn.execute(
+                        delete(table).where(table.c.owner == owner, table.c.file_id.in_(batch))
+                    )
+            rows = [self._from_record(table, r, owner, id_maps) for r in records]
+            keys = [column.name for column in table.primary_key]
+            rows = [row for row in rows if all(row.get(k) is not None for k in keys)]
+            if rows:
+                conn.execute(insert(table), rows)
+            return
+
+        mapping = id_maps.setdefault(table.name, {})
+        ids = {record.get("id") for record in records}
+        mapping.update(self._origin_ids(conn, table, owner, ids - mapping.keys()))
         for record in records:
-            self.set_record_by_table(table_name, record, metadata)
+            values = self._from_record(table, record, owner, id_maps)
+            local_id = mapping.get(values["origin_id"])
+            if local_id is None:
+                result = conn.execute(insert(table).values(**values))
+                mapping[values["origin_id"]] = result.inserted_primary_key[0]
+                continue
+            query = update(table).where(table.c.id == local_id)
+            if "update_date" in table.c:
+                query = query.where(table.c.update_date < values["update_date"])
+            conn.execute(query.values(**values))
 
     def set_all_records(
         self,
+        db_url: str,
+        owner: str,
         tables_records: Dict[str, List[Dict[str, Any]]],
-        metadata: MetaData = None,
     ) -> None:
-        metadata = metadata or MetaData()
-        for table_name, records in tables_records.items():
-            self.set_records_by_table(table_name, records, metadata)
-
-    def replication(self, last_timestamp: Optional[datetime] = None):
-        replics = self._chord_node.get_replications()
-        for dest, name in replics:
-            replication(dest, self._chord_node, name, last_timestamp=last_timestamp)
+        metadata = self._get_metadata(db_url)
+        id_maps: Dict[str, Dict[int, int]] = {}
+        files = [record["id"] for record in tables_records.get(File.__tablename__) or ()]
+        with get_engine(db_url).begin() as conn:
+            for table in metadata.sorted_tables:
+                records = tables_records.get(table.name)
+                if records or (records is not None and "origin_id" not in table.c):
+                    self.set_records_by_table(conn, table, owner, records, id_maps, files)
+
+    def promote(self, owner: str) -> None:
+        """Take over the replica rows of a lost node by flipping them to local rows."""
+        logging.info(f"Promoting replica rows of owner: {owner}")
+        with self._applied_changed:
+            self._applied.pop(owner, None)
+        db_url = self.get_db_url()
+        metadata = self._get_metadata(db_url)
+        tags = metadata.tables[Tag.__tablename__]
+        links = metadata.tables[file_tags.name]
+        local = tags.alias("local")
+
+        query = (
+            select(tags.c.id, local.c.id)
+            .join(local, and_(local.c.name == tags.c.name, local.c.owner == LOCAL_OWNER))
+            .where(tags.c.owner == owner)
+        )
+        with get_engine(db_url).begin() as conn:
+            # Tag names are unique per owner, merge the ones the node already has
+            for replica_id, local_id in conn.execute(query).all():
+                conn.execute(
+                    update(links)
+                    .where(links.c.tag_id == replica_id)
+                    .values(tag_id=local_id)
+                )
+                conn.execute(delete(tags).where(tags.c.id == replica_id))
+            self._merge_users(conn, metadata, owner)
+
+            for table in metadata.sorted_tables:
+                if "owner" not in table.c:
+                    continue
+                values = {"owner": LOCAL_OWNER}
+                if "origin_id" in table.c:
+                    values["origin_id"] = None
+                conn.execute(update(table).where(table.c.owner == owner).values(**values))
+        logging.info(f"Replica rows of owner {owner} promoted")
+
+    def _merge_users(self, conn: Connection, metadata: MetaData, owner: str) -> None:
+        """Merge the replica users of an owner into the local users with their names.
+
+        Files of both with the same name and type keep the local row with the newest content.
+        """
+        users = metadata.tables[User.__tablename__]
+        files = metadata.tables[File.__tablename__]
+        local = users.alias("local")
+        query = (
+            select(users.c.id, local.c.id)
+            .join(local, and_(local.c.name == users.c.name, local.c.owner == LOCAL_OWNER))
+            .where(users.c.owner == owner)
+        )
+        other = files.alias("other")
+        for replica_id, local_id in conn.execute(query).all():
+            clashes = (
+                select(files.c.id, files.c.update_date, other.c.id, other.c.update_date)
+                .join(
+                    other,
+                    and_(
+                        other.c.user_id == local_id,
+                        other.c.name == files.c.name,
+                        other.c.file_type == files.c.file_type,
+                    ),
+                )
+                .where(files.c.user_id == replica_id)
+            )
+            for replica_file, replica_date, local_file, local_date in conn.execute(clashes).all():
+                newer = replica_date > local_date
+                self._merge_file(conn, metadata, replica_file, local_file, newer)
+            conn.execute(update(files).where(files.c.user_id == replica_id).values(user_id=local_id))
+            conn.execute(delete(users).where(users.c.id == replica_id))
+
+    @staticmethod
+    def _merge_file(
+        conn: Connection, metadata: MetaData, replica_id: int, local_id: int, newer: bool
+    ) -> None:
+        """Drop a replica file into the local one, taking its content when it is newer."""
+        files = metadata.tables[File.__tablename__]
+        sources = metadata.tables[FileSource.__tablename__]
+        links = metadata.tables[file_tags.name]
+        now = datetime.now()
+        if newer:
+            # The local row keeps its id, its replicas get the new content as an update
+            conn.execute(
+                update(sources)
+                .where(sources.c.file_id == local_id, sources.c.deleted == false())
+                .values(deleted=True, update_date=now)
+            )
+            conn.execute(
+                update(sources)
+                .where(sources.c.file_id == replica_id)
+                .values(file_id=local_id, update_date=now)
+            )
+            row = conn.execute(select(files).where(files.c.id == replica_id)).one()
+            conn.execute(
+                update(files)
+                .where(files.c.id == local_id)
+                .values(size=row.size, deleted=row.deleted, update_date=now)
+            )
+        # Tags of both copies stay on the local file
+        linked = select(links.c.tag_id).where(links.c.file_id == local_id)
+        conn.execute(
+            update(links)
+            .where(links.c.file_id == replica_id, links.c.tag_id.not_in(linked))
+            .values(file_id=local_id)
+        )
+        conn.execute(delete(links).where(links.c.file_id == replica_id))
+        conn.execute(delete(sources).where(sources.c.file_id == replica_id))
+        conn.execute(delete(files).where(files.c.id == replica_id))
+
+    def promote_node(self, node: ChordReference) -> None:
+        self.promote(owner_key(node.id))
+
+    def get_quorum(self, operation: QUORUM) -> int:
+        """Return the acknowledgements needed for an operation class, local copy included."""
+        factor = max(1, self._config[REPLICATION_FACTOR_KEY])
+        quorum = self._config[QUORUM_KEYS[operation]]
+        return max(1, min(quorum, factor))
+
+    def _pusher(self, target: str) -> ThreadPoolExecutor:
+        """Return the single worker that delivers the batches of a replica in LSN order."""
+        with self._lsn_lock:
+            pusher = self._pushers.get(target)
+            if pusher is None:
+                pusher = ThreadPoolExecutor(1, thread_name_prefix=f"replication-{target}")
+                self._pushers[target] = pusher
+            return pusher
+
+    def replication(
+        self,
+        last_timestamp: Optional[datetime] = None,
+        operation: QUORUM = QUORUM.METADATA,
+    ) -> int:
+        """Push the changes to the replicas and wait until the quorum acknowledges them.
+
+        The local write counts as the first acknowledgement; replicas that answer
+        after the quorum is reached keep being updated in the background.
+        Returns the LSN of the pushed batch, the current one if nothing changed.
+        Raises QuorumError when the quorum is not reached, the batch keeps being pushed.
+        """
+        quorum = self.get_quorum(operation)
+        replics = self._chord_node.get_replications(self._config[REPLICATION_FACTOR_KEY])
+        pushers = {dest.ip: self._pusher(dest.ip) for dest, _ in replics}
+        self.replicas = list(pushers)
+        self._replicated = True
+        # Batches take their LSN and queue in the same order, so replicas apply them in it
+        with self._lsn_lock:
+            data = self._chord_node.get_replication(None, last_timestamp)
+            if not data or not any(data.values()):
+                return self._lsn
+            self._lsn = lsn = max(self._lsn + 1, time.time_ns() // 1000)
+            futures = [
+                pushers[dest.ip].submit(self._push_replication, dest, name, data, lsn)
+                for dest, name in replics
+            ]
+
+        acks = 1
+        if acks >= quorum:
+            return lsn
+        try:
+            for future in as_completed(futures, timeout=QUORUM_TIMEOUT):
+                if not future.exception() and future.result():
+                    acks += 1
+                if acks >= quorum:
+                    logging.info(f"{operation.name} quorum reached with {acks} acks")
+                    return lsn
+        except TimeoutError:
+            logging.warning(f"Timeout waiting for {operation.name} quorum")
+        error = QuorumError(operation, lsn, acks, quorum)
+        logging.warning(str(error))
+        raise error
+
+    # region Chunk Placement
+    def chunk_holders(self, digests: Iterable[str]) -> Dict[str, List[ChordReference]]:
+        """Return the nodes each chunk is placed on: the successor of its hash and the next ones.
+
+        With erasure coding no other node keeps a chunk whole, only its shards.
+        """
+        if self.erasure:
+            return {digest: [] for digest in digests}
+        ring = self._chord_node.ring()
+        ids = [node.id for node in ring]
+        factor = max(1, self._config[REPLICATION_FACTOR_KEY])
+        return {
+            digest: [ring[i] for i in ring_successors(chunk_key(digest), ids, factor)]
+            for digest in dict.fromkeys(digests)
+        }
+
+    def place_chunks(self, digests: List[str]) -> int:
+        """Copy local chunks to the nodes they are placed on, to every node at once.
+
+        The chunks travel as stored unless their codec may be missing on the other nodes,
+        those are recompressed with the wire codec.
+        Returns the copies made, nodes that fail keep serving from the local copy.
+        """
+        if self.erasure:
+            return self.place_shards(digests)
+        targets: Dict[str, Tuple[ChordReference, List[str]]] = {}
+        for digest, nodes in self.chunk_holders(digests).items():
+            for node in nodes:
+                if node.id != self._chord_node.id:
+                    targets.setdefault(node.ip, (node, []))[1].append(digest)
+        if not targets:
+            return 0
+
+        def push(node: ChordReference, chunks: List[str]) -> int:
+            codecs = [portable_codec(self.chunks.find(digest)[1]) for digest in chunks]
+            stored = (self.chunks.read_portable(digest)[1] for digest in chunks)
+            if node.store_chunks(codecs, stored):
+                return len(chunks)
+            logging.warning(f"Could not place {len(chunks)} chunks in {node.ip}")
+            return 0
+
+        with ThreadPoolExecutor(len(targets)) as pool:
+            copies = sum(pool.map(lambda target: push(*target), targets.values()))
+        logging.info(f"Placed {copies} chunk copies in {len(targets)} nodes")
+        return copies
+
+    # endregion
+
+    # region Erasure Coding
+    def shard_holders(self, digests: Iterable[str]) -> Dict[str, List[ChordReference]]:
+        """Return the nodes the shards of each chunk go to, shard i to node i modulo their count.
+
+        Every shard is on its own node unless the ring has fewer nodes than shards.
+        """
+        ring = self._chord_node.ring()
+        ids = [node.id for node in ring]
+        return {
+            digest: [ring[i] for i in ring_successors(chunk_key(digest), ids, self.erasure.total)]
+            for digest in dict.fromkeys(digests)
+        }
+
+    def _is_local(self, node: ChordReference) -> bool:
+        return node.id == self._chord_node.id
+
+    def _store_shards(self, node: ChordReference, shards: List[Tuple[str, int, bytes]]) -> int:
+        """Store shards in a node, return how many were stored."""
+        if self._is_local(node):
+            for digest, index, shard in shards:
+                self.chunks.put_shard(digest, index, shard)
+            return len(shards)
+        if node.store_shards(shards):
+            return len(shards)
+        logging.warning(f"Could not store {len(shards)} shards in {node.ip}")
+        return 0
+
+    def _list_shards(self, node: ChordReference, digests: List[str]) -> Dict[str, List[int]]:
+        """Return the indexes of the shards of the chunks a node keeps."""
+        if not self._is_local(node):
+            return node.list_shards(digests, self.erasure.total)
+        held = {digest: self.chunks.shard_indexes(digest, self.erasure.total) for digest in digests}
+        return {digest: indexes for digest, indexes in held.items() if indexes}
+
+    def _fetch_shards(self, node: ChordReference, keys: List[List[Any]]) -> List[bytes]:
+        """Return the [hash, index] shards of a node in order, up to the first it can not give."""
+        if not self._is_local(node):
+            return node.fetch_shards(keys)
+        shards = []
+        for digest, index in keys:
+            try:
+                shards.append(self.chunks.read_shard(digest, index))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Local shard {index} of {digest} unreadable: {e}")
+                break
+        return shards
+
+    def _on_nodes(self, call: Callable[..., Any], work: Dict[int, Tuple[Any, ...]]) -> List[Any]:
+        """Run a call for every node at once, each with its arguments, node first."""
+        if not work:
+            return []
+        with ThreadPoolExecutor(len(work)) as pool:
+            return list(pool.map(lambda args: call(*args), work.values()))
+
+    def place_shards(self, digests: List[str]) -> int:
+        """Encode local chunks in shards and store each shard on its node, every node at once.
+
+        Returns the shards stored, the chunks are encoded a batch at a time.
+        """
+        stored = 0
+        digests = list(dict.fromkeys(digests))
+        for start in range(0, len(digests), SHARD_BATCH_SIZE):
+            targets: Dict[int, Tuple[ChordReference, List[Tuple[str, int, bytes]]]] = {}
+            holders = self.shard_holders(digests[start : start + SHARD_BATCH_SIZE])
+            for digest, nodes in holders.items():
+                chunk = self.chunks.read(digest, cached=False)
+                for index, shard in enumerate(self.erasure.encode(chunk)):
+                    node = nodes[index % len(nodes)]
+                    targets.setdefault(node.id, (node, []))[1].append((digest, index, shard))
+            stored += sum(self._on_nodes(self._store_shards, targets))
+        logging.info(f"Placed {stored} shards of {len(digests)} chunks")
+        return stored
+
+    def shed_cold_chunks(self) -> Tuple[int, int]:
+        """Drop the whole copies of cold chunks once all their shards are on the ring.
+
+        Chunks stay whole here after they are written or rebuilt, for ERASURE_COLD_AGE,
+        so hot content is read without decoding. Chunks missing shards are placed again
+        and kept whole until a later pass finds every shard. Returns the chunks and
+        bytes dropped.
+        """
+        if not self.erasure:
+            return 0, 0
+        written_before = time.time() - ERASURE_COLD_AGE
+        cold = []
+        for digest, path in self.chunks.whole_chunks():
+            try:
+                if os.stat(path).st_mtime < written_before:
+                    cold.append(digest)
+            except FileNotFoundError:
+                continue
+        dropped, freed = 0, 0
+        for start in range(0, len(cold), SHARD_BATCH_SIZE):
+            batch = cold[start : start + SHARD_BATCH_SIZE]
+            inventory = self._inventory(self.shard_holders(batch))
+            placed = [d for d in batch if len(inventory[d]) == self.erasure.total]
+            missing = [d for d in batch if len(inventory[d]) < self.erasure.total]
+            if missing:
+                self.place_shards(missing)
+            for digest in placed:
+                count, size = self.chunks.remove(digest, written_before, shards=False)
+                dropped += bool(count)
+                freed += size
+                self._throttle(count)
+        logging.info(f"Dropped the whole copies of {dropped} cold chunks, {freed} bytes")
+        return dropped, freed
+
+    def _inventory(
+        self, holders: Dict[str, List[ChordReference]]
+    ) -> Dict[str, Dict[int, List[ChordReference]]]:
+        """Ask the holders which shards of the chunks they keep, return the nodes of each shard."""
+        asked: Dict[int, Tuple[ChordReference, List[str]]] = {}
+        for digest, nodes in holders.items():
+            for node in nodes:
+                asked.setdefault(node.id, (node, []))[1].append(digest)
+        inventory: Dict[str, Dict[int, List[ChordReference]]] = {digest: {} for digest in holders}
+        answers = self._on_nodes(lambda node, ds: (node, self._list_shards(node, ds)), asked)
+        for node, held in answers:
+            for digest, indexes in held.items():
+                for index in indexes:
+                    inventory[digest].setdefault(index, []).append(node)
+        return inventory
+
+    def _gather_shards(
+        self, inventory: Dict[str, Dict[int, List[ChordReference]]]
+    ) -> Dict[str, Dict[int, bytes]]:
+        """Fetch k shards of each chunk from the nodes keeping them, data shards first.
+
+        A shard a node fails to send is asked to another node keeping it, or replaced
+        by another shard of the chunk, until the chunk has k or no shard is left to try.
+        """
+        gathered: Dict[str, Dict[int, bytes]] = {digest: {} for digest in inventory}
+
+        def fetch(node: ChordReference, keys: List[List[Any]]) -> Tuple[Any, ...]:
+            return node, keys, self._fetch_shards(node, keys)
+
+        while True:
+            plan: Dict[int, Tuple[ChordReference, List[List[Any]]]] = {}
+            for digest, held in inventory.items():
+                needed = self.erasure.k - len(gathered[digest])
+                for index in sorted(held.keys() - gathered[digest].keys())[: max(needed, 0)]:
+                    node = held[index][0]
+                    plan.setdefault(node.id, (node, []))[1].append([digest, index])
+            if not plan:
+                return gathered
+            for node, keys, shards in self._on_nodes(fetch, plan):
+                for (digest, index), shard in zip(keys, shards):
+                    gathered[digest][index] = shard
+                if len(shards) < len(keys):
+                    # The node stopped at this shard, the ones after it are asked again
+                    digest, index = keys[len(shards)]
+                    owners = inventory[digest][index]
+                    owners.remove(node)
+                    if not owners:
+                        del inventory[digest][index]
+
+    def _decode_chunk(self, digest: str, shards: Dict[int, bytes]) -> Optional[bytes]:
+        """Rebuild a chunk from k of its shards, None unless it matches its hash.
+
+        The data shards end in less than k bytes of zeros padding them, the hash tells
+        them apart from zeros the chunk itself ends with.
+        """
+        if len(shards) < self.erasure.k:
+            return None
+        padded = b"".join(self.erasure.data_shards(shards))
+        least = len(padded) - self.erasure.k + 1
+        first = max(len(padded.rstrip(b"\0")), least)
+        for size in [first] + [size for size in range(least, len(padded) + 1) if size != first]:
+            if hashlib.sha256(padded[:size]).hexdigest() == digest:
+                return padded[:size]
+        return None
+
+    def restore_chunks(self, digests: List[str]) -> int:
+        """Rebuild chunks missing here from the shards on the ring and keep them whole.
+
+        Returns the chunks restored, the ones without k readable shards are not.
+        """
+        if not self.erasure or not digests:
+            return 0
+        restored = 0
+        gathered = self._gather_shards(self._inventory(self.shard_holders(digests)))
+        for digest, shards in gathered.items():
+            chunk = self._decode_chunk(digest, shards)
+            if chunk is None:
+                logging.warning(f"Chunk {digest} not restored from {len(shards)} shards")
+                continue
+            self.chunks.put(chunk)
+            restored += 1
+        logging.info(f"Restored {restored} of {len(gathered)} chunks from shards")
+        return restored
+
+    def _repairs(
+        self, nodes: List[ChordReference], held: Dict[int, List[ChordReference]]
+    ) -> bool:
+        """Return if this node repairs a chunk: the first of its holders keeping a shard of it."""
+        keepers = {node.id for owners in held.values() for node in owners}
+        first = next((node for node in nodes if node.id in keepers), self._chord_node)
+        return self._is_local(first)
+
+    def repair_shards(self) -> int:
+        """Rebuild the shards of the chunks with local shards that are not on their node.
+
+        Shards of lost nodes, or of nodes that no longer hold them in the ring, are
+        rebuilt from k others on the node that now holds them. The first holder that
+        keeps a shard of a chunk repairs it, so the nodes do not repeat the work.
+        Returns the shards rebuilt.
+        """
+        local = list(self.chunks.shards())
+        me = self._chord_node
+        repaired = 0
+        for start in range(0, len(local), SHARD_BATCH_SIZE):
+            holders = self.shard_holders(local[start : start + SHARD_BATCH_SIZE])
+            asked = {
+                digest: nodes if any(map(self._is_local, nodes)) else nodes + [me]
+                for digest, nodes in holders.items()
+            }
+            inventory = self._inventory(asked)
+            broken: Dict[str, List[int]] = {}
+            for digest, nodes in holders.items():
+                held = inventory[digest]
+                if not self._repairs(nodes, held):
+                    continue
+                missing = [
+                    index
+                    for index in range(self.erasure.total)
+                    if nodes[index % len(nodes)].id not in {n.id for n in held.get(index, [])}
+                ]
+                if missing:
+                    broken[digest] = missing
+            if not broken:
+                continue
+
+            targets: Dict[int, Tuple[ChordReference, List[Tuple[str, int, bytes]]]] = {}
+            gathered = self._gather_shards({digest: inventory[digest] for digest in broken})
+            for digest, missing in broken.items():
+                if len(gathered[digest]) < self.erasure.k:
+                    logging.error(f"Chunk {digest} has {len(gathered[digest])} shards left")
+                    continue
+                rebuilt = self.erasure.repair(gathered[digest], missing)
+                for index, shard in rebuilt.items():
+                    node = holders[digest][index % len(holders[digest])]
+                    targets.setdefault(node.id, (node, []))[1].append((digest, index, shard))
+            repaired += sum(self._on_nodes(self._store_shards, targets))
+        logging.info(f"Repaired {repaired} shards of {len(local)} chunks")
+        return repaired
+
+    def _shard_repairer(self) -> None:
+        """Repair the shards after each loss of a node, losses during a repair run it again."""
+        while True:
+            self._repair_needed.wait()
+            self._repair_needed.clear()
+            try:
+                self.repair_shards()
+            except Exception as e:
+                logging.error(f"Error repairing shards: {e}")
+
+    # endregion
+
+    # region Session Reads
+    def mark_applied(self, owner: str, lsn: int) -> None:
+        """Record that the replica rows of an owner include its writes up to an LSN."""
+        with self._applied_changed:
+            self._applied[owner] = max(self._applied.get(owner, 0), lsn)
+            self._applied_changed.notify_all()
+
+    def wait_applied(self, owner: str, lsn: int, timeout: float) -> bool:
+        """Wait until the replica rows of an owner reach an LSN, False if they do not in time.
+
+        Owners never pushed since start are unknown, their rows may be stale at any LSN.
+        """
+        with self._applied_changed:
+            return self._applied_changed.wait_for(
+                lambda: self._applied.get(owner, -1) >= lsn, timeout
+            )
+
+    def _replicates(self, owner: str) -> bool:
+        """Return if this node keeps replica rows of an owner, pushed or stored."""
+        if owner in self._applied:
+            return True
+        with get_engine(self.get_db_url()).connect() as conn:
+            query = select(File.id).where(File.owner == owner).limit(1)
+            return conn.execute(query).first() is not None
+
+    def read_owner(self, session_token: Optional[str]) -> str:
+        """Return the owner of the rows that serve a read with a session token.
+
+        Reads of the local node, or without token, use the local rows; reads of another
+        node use its replica rows once they include the write of the token. Tokens of
+        nodes this one does not replicate are stale ones of a client that changed its
+        primary, which serves them from its local rows.
+        """
+        if not session_token:
+            return LOCAL_OWNER
+        owner, lsn = decode_session_token(session_token)
+        if owner == owner_key(self._chord_node.id) or not self._replicates(owner):
+            return LOCAL_OWNER
+        if not self.wait_applied(owner, lsn, REPLICA_READ_TIMEOUT):
+            raise ValueError(f"Replica behind session token: {session_token}")
+        return owner
+
+    def session_token(self, lsn: Optional[int] = None) -> str:
+        """Return the session token of a local write, the last one by default."""
+        return encode_session_token(owner_key(self._chord_node.id), lsn or self._lsn)
+
+    # endregion
+
+    # region Snapshots
+    def _clean_snapshots(self) -> None:
+        """Remove the snapshots that were not fully read in time."""
+        now = time.monotonic()
+        for snapshot, (path, created) in list(self._snapshots.items()):
+            if now - created > SNAPSHOT_TTL:
+                self._snapshots.pop(snapshot, None)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def create_snapshot(self, db_url: str) -> Dict[str, Any]:
+        """Take a consistent online copy of a store with the SQLite backup API."""
+        self._clean_snapshots()
+        engine = get_engine(db_url)
+        if engine.dialect.name != "sqlite":
+            raise ValueError("Snapshots are only supported on SQLite stores")
+
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        timestamp = datetime.now()
+        with engine.connect() as conn:
+            source = conn.connection.driver_connection
+            with closing(sqlite3.connect(path)) as target:
+                source.backup(target)
+
+        snapshot = uuid.uuid4().hex
+        self._snapshots[snapshot] = (path, time.monotonic())
+        logging.info(f"Snapshot {snapshot} created for {db_url}")
+        return {
+            "snapshot": snapshot,
+            "timestamp": timestamp.isoformat(),
+            "size": os.path.getsize(path),
+        }
+
+    def read_snapshot(self, snapshot: str, offset: int) -> Tuple[bytes, bool]:
+        """Read a chunk of a snapshot, removing it once the last chunk is read."""
+        if snapshot not in self._snapshots:
+            raise ValueError(f"Unknown snapshot: {snapshot}")
+        path, _ = self._snapshots[snapshot]
+        with open(path, "rb") as file:
+            file.seek(offset)
+            chunk = file.read(SNAPSHOT_CHUNK_SIZE)
+        eof = offset + len(chunk) >= os.path.getsize(path)
+        if eof:
+            self._snapshots.pop(snapshot, None)
+            os.remove(path)
+        return chunk, eof
+
+    def _snapshot_insert(self, table: Table) -> str:
+        """Build the statement copying the primary rows of a snapshot table as replicas."""
+        quote = get_engine(self.get_db_url()).dialect.identifier_preparer.quote
+        columns, values = [], []
+        for column in table.c:
+            name = quote(column.name)
+            if column.name == "id" and "origin_id" in table.c:
+                continue
+            elif column.name == "owner":
+                value = ":owner"
+            elif column.name == "origin_id":
+                value = "source.id"
+            elif column.foreign_keys:
+                target = quote(next(iter(column.foreign_keys)).column.table.name)
+                value = (
+                    f"(SELECT ref.id FROM main.{target} AS ref "
+                    f"WHERE ref.owner = :owner AND ref.origin_id = source.{name})"
+                )
+            else:
+                value = f"source.{name}"
+            columns.append(name)
+            values.append(value)
+
+        where = " WHERE source.owner = :source" if "owner" in table.c else ""
+        return (
+            f"INSERT INTO main.{quote(table.name)} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} FROM snapshot.{quote(table.name)} AS source"
+            f"{where}"
+        )
+
+    def load_snapshot(self, db_url: str, owner: str, path: str) -> None:
+        """Replace the replica rows of an owner with the primary rows of its snapshot."""
+        engine = get_engine(db_url)
+        if engine.dialect.name != "sqlite":
+            raise ValueError("Snapshots are only supported on SQLite stores")
+
+        folder, name = os.path.split(os.path.realpath(path))
+        if folder != os.path.realpath(tempfile.gettempdir()) or not (
+            name.startswith(SNAPSHOT_PREFIX) and name.endswith(".db")
+        ):
+            raise ValueError(f"Not a snapshot received by this node: {path}")
+
+        metadata = self._get_metadata(db_url)
+        params = {"owner": owner, "source": LOCAL_OWNER}
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS snapshot", (path,))
+            conn.commit()
+            try:
+                for table in reversed(metadata.sorted_tables):
+                    if "owner" in table.c:
+                        conn.execute(delete(table).where(table.c.owner == owner))
+                for table in metadata.sorted_tables:
+                    conn.execute(text(self._snapshot_insert(table)), params)
+                conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql("DETACH DATABASE snapshot")
+                conn.commit()
+        os.remove(path)
+        logging.info(f"Snapshot of owner {owner} loaded into {db_url}")
+
+    # endregion
+
+    # region Hinted Handoff
+    def _push_replication(
+        self, dest: ChordReference, key: str, data: Dict[str, Any], lsn: int
+    ) -> bool:
+        """Send a batch to a replica, keeping it as a hint if it does not arrive."""
+        with self._hints_lock:
+            if self._hints.has_hints(dest.ip):
+                self._hints.add(dest.ip, key, data, lsn)
+                return False
+
+        if dest.set_replication(key, data, lsn):
+            self._acknowledge(dest.ip, lsn)
+            return True
+
+        logging.warning(f"Replica {dest.ip} unreachable, keeping a hint")
+        with self._hints_lock:
+            self._hints.add(dest.ip, key, data, lsn)
+        return False
+
+    def _replay_hints(self, target: str) -> bool:
+        """Replay the pending batches of a target in write order."""
+        updated_config = self._config.copy_with_updates({HOST_KEY: target})
+        dest = ChordReference(updated_config)
+        if not dest.is_alive:
+            return False
+
+        logging.info(f"Replica {target} is back, replaying hints")
+        # Batches are sent without the lock, so a slow replica does not hold back the
+        # others; they are removed once delivered, new batches queue behind them meanwhile
+        while True:
+            with self._hints_lock:
+                pending = self._hints.get(target, BATCH_SIZE)
+            if not pending:
+                return True
+            for id, key, data, lsn in pending:
+                if not dest.set_replication(key, data, lsn):
+                    return False
+                with self._hints_lock:
+                    self._hints.remove(id)
+                if lsn:
+                    self._acknowledge(target, lsn)
+
+    def _hinted_handoff(self) -> None:
+        backoff: Dict[str, Tuple[float, float]] = {}
+
+        while True:
+            time.sleep(WAIT_CHECK)
+            now = time.monotonic()
+            for target in self._hints.targets():
+                next_try, delay = backoff.get(target, (now, WAIT_CHECK))
+                if now < next_try:
+                    continue
+                if self._replay_hints(target):
+                    logging.info(f"Hints for {target} delivered")
+                    backoff.pop(target, None)
+                else:
+                    delay = min(delay * 2, HINT_BACKOFF_MAX)
+                    backoff[target] = (now + delay, delay)
+                    logging.info(f"Hints for {target} pending, retry in {delay}s")
+
+    # endregion
+
+    # region Garbage Collection
+    def _acknowledge(self, target: str, lsn: int) -> None:
+        with self._lsn_lock:
+            self._acked[target] = max(self._acked.get(target, 0), lsn)
+
+    def acknowledged_until(self) -> Optional[datetime]:
+        """Return the time the local changes made before it reached every replica.
+
+        A replica receives the batches in LSN order, and the LSN of a batch is the time
+        it was read, so once it acknowledges one it has every change dated before it.
+        None while it is unknown: no batch pushed since start, or a replica without acks.
+        """
+        pending = self._hints.targets()
+        with self._lsn_lock:
+            if not self._replicated:
+                return None
+            acked = [self._acked.get(target, 0) for target in set(self.replicas).union(pending)]
+        if not acked:
+            return datetime.now()
+        if not min(acked):
+            return None
+        return datetime.fromtimestamp(min(acked) / 1_000_000) - timedelta(seconds=GC_ACK_MARGIN)
+
+    @staticmethod
+    def _throttle(count: int) -> None:
+        """Pace the removals to GC_RATE a second, the disk and database serve requests too."""
+        time.sleep(count / GC_RATE)
+
+    def referenced_chunks(self, digests: List[str]) -> List[str]:
+        """Return the chunks used by live files among the local and replica rows."""
+        db_url = self.get_db_url()
+        tables = self._get_metadata(db_url).tables
+        files, sources = tables[File.__tablename__], tables[FileSource.__tablename__]
+        result: List[str] = []
+        with get_engine(db_url).connect() as conn:
+            for start in range(0, len(digests), QUERY_BATCH_SIZE):
+                query = (
+                    select(sources.c.chunk_hash)
+                    .distinct()
+                    .join(files, files.c.id == sources.c.file_id)
+                    .where(
+                        sources.c.chunk_hash.in_(digests[start : start + QUERY_BATCH_SIZE]),
+                        sources.c.deleted == false(),
+                        files.c.deleted == false(),
+                    )
+                )
+                result.extend(conn.execute(query).scalars())
+        return result
+
+    def collect_chunks(self) -> Tuple[int, int, int]:
+        """Remove the chunks no live file on the ring uses, not written for the retention time.
+
+        Placed chunks and shards are used by files of other nodes, so every reachable node
+        is asked, and a batch one of them does not answer for is kept. Returns the chunks,
+        files and bytes removed.
+        """
+        written_before = time.time() - self._config[GC_RETENTION_KEY]
+        old: Dict[str, bool] = {}
+        for digest, path in self.chunks.stored_files():
+            try:
+                old[digest] = old.get(digest, True) and os.stat(path).st_mtime < written_before
+            except FileNotFoundError:
+                continue
+        digests = [digest for digest, untouched in old.items() if untouched]
+        others = [node for node in self._chord_node.ring() if not self._is_local(node)]
+        removed, files, freed = 0, 0, 0
+        for start in range(0, len(digests), QUERY_BATCH_SIZE):
+            batch = digests[start : start + QUERY_BATCH_SIZE]
+            used = set(self.referenced_chunks(batch))
+            asked = [digest for digest in batch if digest not in used]
+            work = {node.id: (node, asked) for node in others} if asked else {}
+            answers = self._on_nodes(lambda node, keys: node.referenced_chunks(keys), work)
+            if any(answer is None for answer in answers):
+                logging.warning(f"Keeping {len(asked)} chunks, a node did not check them")
+                continue
+            for answer in answers:
+                used.update(answer)
+            for digest in asked:
+                if digest in used:
+                    continue
+                count, size = self.chunks.remove(digest, written_before)
+                removed += bool(count)
+                files += count
+                freed += size
+                self._throttle(count)
+        logging.info(f"Removed {removed} unused chunks in {files} files, {freed} bytes")
+        return removed, files, freed
+
+    def _remove_content(self, db_url: str, cutoff: datetime) -> Tuple[int, int]:
+        """Remove the content files of local sources not chunked, dead and unused by others.
+
+        Returns the files and bytes removed, only files in the content path are touched.
+        """
+        tables = self._get_metadata(db_url).tables
+        files, sources = tables[File.__tablename__], tables[FileSource.__tablename__]
+        joined = sources.join(files, files.c.id == sources.c.file_id)
+        dead = (
+            select(sources.c.url)
+            .distinct()
+            .select_from(joined)
+            .where(
+                sources.c.owner == LOCAL_OWNER,
+                sources.c.chunk_hash.is_(None),
+                or_(
+                    and_(sources.c.deleted == true(), sources.c.update_date < cutoff),
+                    and_(files.c.deleted == true(), files.c.update_date < cutoff),
+                ),
+            )
+        )
+        live = select(sources.c.url).select_from(joined)
+        live = live.where(sources.c.deleted == false(), files.c.deleted == false())
+        with get_engine(db_url).connect() as conn:
+            dead_urls = list(conn.execute(dead).scalars())
+            urls = set(dead_urls)
+            for start in range(0, len(dead_urls), QUERY_BATCH_SIZE):
+                batch = dead_urls[start : start + QUERY_BATCH_SIZE]
+                urls.difference_update(conn.execute(live.where(sources.c.url.in_(batch))).scalars())
+
+        root = os.path.realpath(self._config[CONTENT_PATH_KEY])
+        removed, freed = 0, 0
+        for url in urls:
+            path = os.path.realpath(url)
+            if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+                continue
+            if self.chunks and path.startswith(os.path.realpath(self.chunks.root) + os.sep):
+                continue
+            size = os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+            freed += size
+            self._throttle(1)
+        return removed, freed
+
+    def _purge(
+        self,
+        db_url: str,
+        table: Table,
+        condition: ColumnElement,
+        children: List[Tuple[Table, Any]],
+        purged: Dict[str, int],
+    ) -> None:
+        """Delete the rows matching a condition in batches, with the rows referring to them."""
+        while True:
+            with get_engine(db_url).begin() as conn:
+                query = select(table.c.id).where(condition).limit(GC_BATCH_SIZE)
+                ids = list(conn.execute(query).scalars())
+                if not ids:
+                    return
+                removed = len(ids)
+                for child, column in children:
+                    result = conn.execute(delete(child).where(column.in_(ids)))
+                    purged[child.name] = purged.get(child.name, 0) + result.rowcount
+                    removed += result.rowcount
+                conn.execute(delete(table).where(table.c.id.in_(ids)))
+            purged[table.name] = purged.get(table.name, 0) + len(ids)
+            self._throttle(removed)
+
+    def purge_tombstones(self) -> Tuple[Dict[str, int], int, int]:
+        """Delete the soft-deleted rows older than the retention time.
+
+        Local rows also wait until every replica acknowledged their deletion, or a replica
+        that missed it would keep them alive; replica rows follow the retention alone.
+        Returns the rows purged per table and the content files and bytes removed.
+        """
+        retained = datetime.now() - timedelta(seconds=self._config[GC_RETENTION_KEY])
+        acknowledged = self.acknowledged_until()
+        db_url = self.get_db_url()
+        tables = self._get_metadata(db_url).tables
+        files, sources = tables[File.__tablename__], tables[FileSource.__tablename__]
+        tags, users = tables[Tag.__tablename__], tables[User.__tablename__]
+        links = tables[file_tags.name]
+
+        # Owners of the rows and the time their deletion has to predate
+        cutoffs = [(lambda table: table.c.owner != LOCAL_OWNER, retained)]
+        content = (0, 0)
+        if acknowledged:
+            cutoff = min(retained, acknowledged)
+            cutoffs.append((lambda table: table.c.owner == LOCAL_OWNER, cutoff))
+            content = self._remove_content(db_url, cutoff)
+        else:
+            logging.info("Local tombstones kept until every replica acknowledges a batch")
+
+        purged: Dict[str, int] = {}
+        for owned, cutoff in cutoffs:
+            def dead(table: Table) -> ColumnElement:
+                return and_(owned(table), table.c.deleted == true(), table.c.update_date < cutoff)
+
+            file_rows = [(links, links.c.file_id), (sources, sources.c.file_id)]
+            self._purge(db_url, files, dead(files), file_rows, purged)
+            self._purge(db_url, sources, dead(sources), [], purged)
+            self._purge(db_url, tags, dead(tags), [(links, links.c.tag_id)], purged)
+            unused = ~exists().where(files.c.user_id == users.c.id)
+            self._purge(db_url, users, and_(dead(users), unused), [], purged)
+        logging.info(f"Purged tombstones: {purged}")
+        return purged, *content
+
+    def collect_garbage(self) -> Dict[str, Any]:
+        """Run a pass of the collector, tombstones first, and return what it reclaimed."""
+        start = time.perf_counter()
+        purged, content_files, content_bytes = self.purge_tombstones()
+        chunks, chunk_files, chunk_bytes = self.collect_chunks() if self.chunks else (0, 0, 0)
+        cold_chunks, cold_bytes = self.shed_cold_chunks() if self.chunks else (0, 0)
+        elapsed = time.perf_counter() - start
+        reclaimed = {
+            "chunks": chunks,
+            "chunk_files": chunk_files,
+            "chunk_bytes": chunk_bytes,
+            "content_files": content_files,
+            "content_bytes": content_bytes,
+            "cold_chunks": cold_chunks,
+            "cold_bytes": cold_bytes,
+            "rows": purged,
+        }
+        with self._gc_lock:
+            counters = self._gc_counters
+            counters["runs"] += 1
+            for key, value in reclaimed.items():
+                if key != "rows":
+                    counters[key] += value
+            for table, count in purged.items():
+                counters["rows"][table] = counters["rows"].get(table, 0) + count
+            counters["last_run"] = datetime.now().isoformat()
+            counters["last_seconds"] = elapsed
+        logging.info(f"Garbage collected in {elapsed:.1f}s: {reclaimed}")
+        return reclaimed
+
+    def gc_stats(self) -> Dict[str, Any]:
+        """Return what the collector reclaimed since start."""
+        with self._gc_lock:
+            return {**self._gc_counters, "rows": dict(self._gc_counters["rows"])}
+
+    def _collector(self) -> None:
+        while True:
+            time.sleep(GC_INTERVAL)
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logging.error(f"Error collecting garbage: {e}")
+
+    # endregion
+
+    def run(self) -> None:
+        self._chord_node.lost_listeners.append(self.promote_node)
+        # Start threads
+        threading.Thread(target=self._hinted_handoff, daemon=True).start()
+        threading.Thread(target=self._collector, daemon=True).start()
+        if self.erasure:
+            self._chord_node.lost_listeners.append(lambda _: self._repair_needed.set())
+            threading.Thread(target=self._shard_repairer, daemon=True).start()
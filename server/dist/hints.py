@@ -0,0 +1,83 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, String, Table, Text
+from sqlalchemy import delete, func, insert, select
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+
+import json, logging
+
+from data import get_engine
+
+__all__ = ["HintStore"]
+
+hints_metadata = MetaData()
+
+hints = Table(
+    "hints",
+    hints_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("target", String(255), nullable=False, index=True),
+    Column("key", String(255), nullable=False),
+    Column("data", Text, nullable=False),
+    Column("creation_date", DateTime, nullable=False),
+    Column("lsn", BigInteger, nullable=True),
+)
+
+
+class HintStore:
+    """Durable queue of replication batches that could not reach their replica."""
+
+    def __init__(self, db_url: str, profile: Optional[str] = None) -> None:
+        self.engine = get_engine(db_url, profile)
+        hints_metadata.create_all(self.engine)
+
+    def add(
+        self, target: str, key: str, data: Dict[str, Any], lsn: Optional[int] = None
+    ) -> None:
+        """Store a replication batch for a target node with the LSN it reaches."""
+        logging.info(f"Storing hint for {target} with key: {key}")
+        values = {
+            "target": target,
+            "key": key,
+            "data": json.dumps(data),
+            "creation_date": datetime.now(),
+            "lsn": lsn,
+        }
+        with self.engine.begin() as conn:
+            conn.execute(insert(hints).values(**values))
+
+    def has_hints(self, target: str) -> bool:
+        """Check if a target node has pending batches."""
+        query = select(hints.c.id).where(hints.c.target == target).limit(1)
+        with self.engine.connect() as conn:
+            return conn.execute(query).first() is not None
+
+    def targets(self) -> List[str]:
+        """Return the target nodes with pending batches."""
+        query = select(hints.c.target).distinct()
+        with self.engine.connect() as conn:
+            return list(conn.execute(query).scalars())
+
+    def count(self) -> Dict[str, int]:
+        """Return the number of pending batches per target node."""
+        query = select(hints.c.target, func.count()).group_by(hints.c.target)
+        with self.engine.connect() as conn:
+            return dict(conn.execute(query).all())
+
+    def get(
+        self, target: str, limit: int
+    ) -> List[Tuple[int, str, Dict[str, Any], Optional[int]]]:
+        """Return the oldest pending batches of a target node in write order."""
+        query = (
+            select(hints.c.id, hints.c.key, hints.c.data, hints.c.lsn)
+            .where(hints.c.target == target)
+            .order_by(hints.c.id)
+            .limit(limit)
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        return [(id, key, json.loads(data), lsn) for id, key, data, lsn in rows]
+
+    def remove(self, id: int) -> None:
+        """Remove a batch once the target acknowledged it."""
+        with self.engine.begin() as conn:
+            conn.execute(delete(hints).where(hints.c.id == id))
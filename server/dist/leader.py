@@ -6,7 +6,7 @@ import selectors, socket, threading
 
 from logic.configurable import Configurable
 from .leader_reference import LeaderReference
-from servers.server import Server
+from servers.server import Server, receive_message
 from logic.handlers import *
 from data.const import *
 
@@ -95,7 +95,7 @@ class ChordLeader(LeaderReference, ChordNode, Server):
             if self.ip == addr[0] or self.ip == "127.0.0.1":
                 return
             logging.info(f"Received UDP message from {addr}")
-            result = self._process_mesage(message, ori_addr)
+            result = self._process_mesage(*self._parse_message(message), ori_addr)
             logging.info(f"Processed UDP result: {result}")
         except BlockingIOError as e:
             logging.warning(f"Resource temporarily unavailable: {addr} - {e}")
@@ -143,7 +143,7 @@ class ChordLeader(LeaderReference, ChordNode, Server):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             sock.connect((node.ip, port))
             sock.sendall(message.encode("utf-8"))
-            response = sock.recv(1024)
+            response = receive_message(sock)
         logging.info(f"Sent request to {node.ip}:{port}, received response")
         return response.decode("utf-8")
 
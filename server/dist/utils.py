@@ -1,6 +1,19 @@
-import hashlib
+from typing import List, Tuple
 
-__all__ = ["in_between", "bully", "hash_sha1_key"]
+import bisect, hashlib
+
+from data.const import SHA_1
+
+__all__ = [
+    "in_between",
+    "bully",
+    "hash_sha1_key",
+    "owner_key",
+    "encode_session_token",
+    "decode_session_token",
+    "chunk_key",
+    "ring_successors",
+]
 
 
 def in_between(k: int, start: int, end: int) -> bool:
@@ -18,3 +31,33 @@ def bully(id: int, other_id: int) -> bool:
 
 def hash_sha1_key(key: str) -> int:
     return int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16)
+
+
+def owner_key(id: int) -> str:
+    """Return the owner tag stored in the replica rows of a node."""
+    return f"{int(id):040x}"
+
+
+def encode_session_token(owner: str, lsn: int) -> str:
+    """Return the token of the last write of a client: the node owning it and its LSN."""
+    return f"{owner}:{lsn}"
+
+
+def decode_session_token(token: str) -> Tuple[str, int]:
+    """Return the owner and the LSN of a session token."""
+    try:
+        owner, lsn = token.split(":")
+        return owner, int(lsn)
+    except ValueError as e:
+        raise ValueError(f"Invalid session token: {token}") from e
+
+
+def chunk_key(digest: str) -> int:
+    """Return the ring key of a chunk, the leading bits of its SHA-256 in hex."""
+    return int(digest[: SHA_1 // 4], 16)
+
+
+def ring_successors(key: int, ids: List[int], count: int) -> List[int]:
+    """Return the positions in the sorted ring ids of the successor of a key and the next ones."""
+    start = bisect.bisect_left(ids, key)
+    return [(start + i) % len(ids) for i in range(min(count, len(ids)))]
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Union
+
+import sys
+
+__all__ = ["RoaringBitmap"]
+
+# Containers hold the low 16 bits of the values sharing the same high 16 bits
+ARRAY_LIMIT = 4096
+CONTAINER_BITS = 1 << 16
+BITSET_BYTES = CONTAINER_BITS // 8
+
+Container = Union[array, int]
+
+
+def _to_bitset(values: Iterable[int]) -> int:
+    bits = bytearray(BITSET_BYTES)
+    for value in values:
+        bits[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _iter_bits(bitset: int) -> Iterator[int]:
+    for index, byte in enumerate(bitset.to_bytes(BITSET_BYTES, "little")):
+        if byte:
+            base = index << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base | bit
+
+
+def _to_array(bitset: int) -> array:
+    return array("H", _iter_bits(bitset))
+
+
+def _optimize(values: Union[array, int, set], compact: bool = False) -> Container | None:
+    """Return the container for the values, None if there are none.
+
+    Bitsets only shrink to arrays when compacting, which is kept for stored bitmaps.
+    """
+    if isinstance(values, int):
+        if values == 0:
+            return None
+        if compact and values.bit_count() <= ARRAY_LIMIT:
+            return _to_array(values)
+        return values
+    if not values:
+        return None
+    if len(values) > ARRAY_LIMIT:
+        return _to_bitset(values)
+    return values if isinstance(values, array) else array("H", sorted(values))
+
+
+def _cardinality(container: Container) -> int:
+    return container.bit_count() if isinstance(container, int) else len(container)
+
+
+def _and(a: Container, b: Container, compact: bool = False) -> Container | None:
+    if isinstance(a, int) and isinstance(b, int):
+        return _optimize(a & b, compact)
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return _optimize(array("H", (v for v in a if b >> v & 1)))
+    return _optimize(set(a).intersection(b))
+
+
+def _or(a: Container, b: Container, compact: bool = False) -> Container | None:
+    if isinstance(a, int) or isinstance(b, int):
+        a = a if isinstance(a, int) else _to_bitset(a)
+        b = b if isinstance(b, int) else _to_bitset(b)
+        return _optimize(a | b, compact)
+    return _optimize(set(a).union(b))
+
+
+def _sub(a: Container, b: Container, compact: bool = False) -> Container | None:
+    if isinstance(a, int):
+        b = b if isinstance(b, int) else _to_bitset(b)
+        return _optimize(a & ~b, compact)
+    if isinstance(b, int):
+        return _optimize(array("H", (v for v in a if not b >> v & 1)))
+    return _optimize(set(a).difference(b))
+
+
+class RoaringBitmap:
+    """Compressed set of non-negative integers split into 2^16 value containers.
+
+    Sparse containers are sorted arrays and dense ones are bitsets stored as ints.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._containers: Dict[int, Container] = {}
+        self.update(values)
+
+    @classmethod
+    def _from_containers(cls, containers: Dict[int, Container]) -> RoaringBitmap:
+        bitmap = cls()
+        bitmap._containers = containers
+        return bitmap
+
+    def update(self, values: Iterable[int]) -> None:
+        """Add many values at once."""
+        groups: Dict[int, set] = {}
+        for value in values:
+            groups.setdefault(value >> 16, set()).add(value & 0xFFFF)
+        for key, group in groups.items():
+            current = self._containers.get(key)
+            group = _optimize(group)
+            self._containers[key] = group if current is None else _or(current, group, True)
+
+    def add(self, value: int) -> None:
+        self.update((value,))
+
+    def difference_update(self, values: Iterable[int]) -> None:
+        """Remove many values at once."""
+        other = values if isinstance(values, RoaringBitmap) else RoaringBitmap(values)
+        for key, container in other._containers.items():
+            current = self._containers.get(key)
+            if current is None:
+                continue
+            result = _sub(current, container, True)
+            if result is None:
+                del self._containers[key]
+            else:
+                self._containers[key] = result
+
+    def discard(self, value: int) -> None:
+        self.difference_update((value,))
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        return low in container
+
+    def __len__(self) -> int:
+        return sum(map(_cardinality, self._containers.values()))
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            if isinstance(container, int):
+                container = _iter_bits(container)
+            base = key << 16
+            for low in container:
+                yield base | low
+
+    def __and__(self, other: RoaringBitmap) -> RoaringBitmap:
+        result = {}
+        small, large = sorted((self, other), key=lambda b: len(b._containers))
+        for key, container in small._containers.items():
+            other_container = large._containers.get(key)
+            if other_container is not None:
+                merged = _and(container, other_container)
+                if merged is not None:
+                    result[key] = merged
+        return RoaringBitmap._from_containers(result)
+
+    def __or__(self, other: RoaringBitmap) -> RoaringBitmap:
+        result = dict(self._containers)
+        for key, container in other._containers.items():
+            current = result.get(key)
+            result[key] = container if current is None else _or(current, container)
+        return RoaringBitmap._from_containers(result)
+
+    def __sub__(self, other: RoaringBitmap) -> RoaringBitmap:
+        result = {}
+        for key, container in self._containers.items():
+            other_container = other._containers.get(key)
+            merged = container if other_container is None else _sub(container, other_container)
+            if merged is not None:
+                result[key] = merged
+        return RoaringBitmap._from_containers(result)
+
+    def to_list(self) -> List[int]:
+        return list(self)
+
+    def copy(self) -> RoaringBitmap:
+        return RoaringBitmap._from_containers(dict(self._containers))
+
+    def page(self, after: int, limit: int) -> List[int]:
+        """Return up to limit values greater than after, in order."""
+        result: List[int] = []
+        for key in sorted(k for k in self._containers if k >= after >> 16):
+            container = self._containers[key]
+            if isinstance(container, int):
+                if key == after >> 16:
+                    container &= ~((1 << ((after & 0xFFFF) + 1)) - 1)
+                container = _iter_bits(container)
+            base = key << 16
+            for low in container:
+                value = base | low
+                if value > after:
+                    result.append(value)
+                    if len(result) == limit:
+                        return result
+        return result
+
+    def memory_usage(self) -> int:
+        """Return the approximate bytes used by the containers."""
+        return sys.getsizeof(self._containers) + sum(
+            sys.getsizeof(container) for container in self._containers.values()
+        )
+
+    def __repr__(self) -> str:
+        return f"RoaringBitmap(len={len(self)}, containers={len(self._containers)})"
@@ -1,6 +1,6 @@
-from typing import List, Optional, Type
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
 
-import os
+import itertools, os
 
 from data import *
 from logic.configurable import Configurable
@@ -8,93 +8,246 @@ from logic.configurable import Configurable
 from .dtos import *
 from .services import *
 from .business_data import *
+from .pagination import encode_cursor, decode_cursor
+from .tag_query import normalize_tag_query, parse_tag_query, tag_names
+from .cache import ResultCache
+from .tag_index import TagIndex
+from .chunk_store import ChunkStore
+from .compression import WIRE
 
 __all__ = ["ServerService"]
 
+# Tables read by the listings, writes to any of them invalidate the cached pages
+LISTING_TABLES = (File.__tablename__, Tag.__tablename__, file_tags.name)
+
 
 class ServerService:
     def __init__(self, config: Optional[Configurable]):
         self._config = config or Configurable()
+        self.TagIndex: Optional[TagIndex] = None
+        if self._config[QUERY_ENGINE_KEY] == "bitmap":
+            self.TagIndex = TagIndex(self._config[DB_URL_KEY])
         get_service = self._instance_service
         self.Files: FileService = get_service(FileService, File)
         self.Users: UserService = get_service(UserService, User)
         self.Tags: TagService = get_service(TagService, Tag)
         self.FileSources: FileSourceService = get_service(FileSourceService, FileSource)
+        self.Files.index = self.Tags.index = self.TagIndex
+        # Shares the commits of the writes of the services on profiles that sync them
+        self.Committer = get_group_committer(self._config[DB_URL_KEY])
+        self.Listings: ResultCache[tuple, tuple] = ResultCache(LIST_CACHE_SIZE)
+        chunks_path = os.path.join(self._config[CONTENT_PATH_KEY], CHUNKS_DIR)
+        self.Chunks = ChunkStore(
+            chunks_path,
+            CHUNK_SIZE,
+            self._config[CHUNKING_KEY],
+            self._config[COMPRESSION_KEY],
+            CONTENT_CACHE_SIZE,
+        )
+        # Called with the hashes of the chunks of every file written, to place them
+        self.chunk_listeners: List[Callable[[List[str]], Any]] = []
 
     def _instance_service(self, service, model: Type[ModelType]):
-        return service(get_repository(model, self._config[DB_URL_KEY]))
+        db_url, profile = self._config[DB_URL_KEY], self._config[STORAGE_PROFILE_KEY]
+        return service(get_repository(model, db_url, profile))
 
     def get_user_id(self, name: str) -> int:
-        user = self.Users.get(UserInputDto(name, None, None, None))
-        if user is None or user.is_deleted:
-            user = self.Users.create(UserInputDto(name, True))
-        return user.id
+        user_id = self.Users.get_id(name)
+        if user_id is None:
+            user_id = self.Users.create(UserInputDto(name, True)).id
+        return user_id
+
+    def get_replica_user_id(self, name: str, owner: str) -> Optional[int]:
+        """Return the ID a user has on the owner node of the replica rows, if known."""
+        return self.Users.get_replica_id(name, owner)
 
     def get_tags_id(self, tags: List[str]) -> List[int]:
-        tag_ids = self.Tags.get_by_query(tags)
-        tag_ids = [tag.id for tag in tag_ids if not tag.is_deleted]
-        return tag_ids
-
-    def get_files_by_tags(self, tags: List[str]) -> List[FileOutputDto]:
-        tag_ids = self.get_tags_id(tags)
-        files = self.Files.get_by_tags(tag_ids)
-        files = [file for file in files if not file.is_deleted]
-        return list(map(FileOutputDto._to_dto, files))
-
-    def create_update_file(self, input: FileInputDto, tags: List[str]) -> FileOutputDto:
-        file = self.Files.get(input)
-        if file is None or file.is_deleted:
+        return list(self.Tags.get_ids(tags).values())
+
+    def _query_tag_ids(self, tag_query: List[str]) -> Dict[str, int]:
+        """Return the ids of the live tags a tag query refers to, from the tag cache."""
+        return self.Tags.get_ids(tag_names(tag_query))
+
+    def get_files_by_tags(self, tag_query: List[str]) -> List[FileOutputDto]:
+        return self.Files.get_listing(tag_query, self._query_tag_ids(tag_query))
+
+    def get_files_page(
+        self,
+        tag_query: List[str],
+        page_size: Optional[int],
+        cursor: Optional[str],
+        owner: str = LOCAL_OWNER,
+    ) -> Tuple[List[FileOutputDto], Optional[str]]:
+        """Return a page of the files matching a tag query and the cursor of the next one.
+
+        The files are the local ones by default, or the replica rows of an owner node.
+        """
+        page_size = min(max(page_size or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        after_id = decode_cursor(tag_query, cursor)
+        key = (owner, normalize_tag_query(tag_query), page_size, after_id)
+        files, last_id = self.Listings.get_or_compute(
+            key,
+            self._listing_version(),
+            lambda: self._files_page(tag_query, page_size, after_id, owner),
+        )
+        next_cursor = encode_cursor(tag_query, last_id) if last_id else None
+        return list(files), next_cursor
+
+    def _listing_version(self) -> tuple:
+        """Return the version of the data the listings read, it grows with every write."""
+        version = get_table_versions(self._config[DB_URL_KEY], LISTING_TABLES)
+        return version + (self.TagIndex.version,) if self.TagIndex else version
+
+    def _files_page(
+        self, tag_query: List[str], page_size: int, after_id: int, owner: str
+    ) -> Tuple[Tuple[FileOutputDto, ...], Optional[int]]:
+        """Return a page of matching files and the ID it ends at if more follow."""
+        if owner != LOCAL_OWNER:
+            # The index and the tag cache only cover the local rows
+            files = self.Files.get_listing_page(
+                tag_query, page_size + 1, after_id, owner=owner
+            )
+        elif self.TagIndex:
+            ids = self.TagIndex.query(tag_query).page(after_id, page_size + 1)
+            files = self.Files.get_listing_by_ids(ids)
+        else:
+            tag_ids = self._query_tag_ids(tag_query)
+            files = self.Files.get_listing_page(tag_query, page_size + 1, after_id, tag_ids)
+        last_id = None
+        if len(files) > page_size:
+            files = files[:page_size]
+            last_id = files[-1].id
+        return tuple(files), last_id
+
+    def invalidate_caches(self) -> None:
+        """Drop the cached ids and listings after rows changed outside the services."""
+        self.Tags.cache.clear()
+        self.Users.cache.clear()
+        self.Listings.clear()
+
+    def refresh_indexes(self) -> None:
+        """Reload the in-memory indexes after the local rows changed outside the services."""
+        self.invalidate_caches()
+        if self.TagIndex:
+            self.TagIndex.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters of the in-memory caches and indexes."""
+        return {
+            "tag_cache": self.Tags.cache.stats(),
+            "user_cache": self.Users.cache.stats(),
+            "list_cache": self.Listings.stats(),
+            "content_cache": self.Chunks.cache.stats(),
+            "tag_index": self.TagIndex.stats() if self.TagIndex else None,
+            "chunk_store": self.Chunks.stats(),
+            "wire_compression": WIRE.stats(),
+            "group_commit": self.Committer.stats() if self.Committer else None,
+        }
+
+    def create_update_file(
+        self,
+        input: FileInputDto,
+        tags: List[str],
+        content: Optional[Iterable[bytes]] = None,
+    ) -> FileOutputDto:
+        """Register a file with its tags, its content is the input one or streamed blocks."""
+        chunks = self.copy_file(input, content)
+        digests = [digest for digest, _ in chunks]
+        if self.Committer:
+            # The content is on disk before the rows that refer to it are committed
+            self.Committer.sync(self.Chunks.find(digest)[0] for digest in dict.fromkeys(digests))
+        # Name and type are unique per user, an upload of an existing one overwrites it
+        file = self.Files.get_by_name(input.name, input.file_type, input.user_id)
+        if file is None:
             dto = self.Files.create(input)
         else:
+            # The cached chunks of the content overwritten are no longer read
+            replaced = {source.chunk_hash for source in self.FileSources.get_chunks(file.id)}
             dto = self.Files.update(file.id, input)
+            self.Chunks.forget(replaced.difference(digests))
+        if dto is None:
+            raise ValueError(f"Could not register file: {input.name}.{input.file_type}")
 
-        source_input = self.copy_file(input, dto.id)
-        self.create_update_source(source_input)
+        self.FileSources.replace_chunks(dto.id, self._chunk_sources(dto.id, chunks))
         self._add_tags(dto.id, tags)
+        for listener in self.chunk_listeners:
+            listener(digests)
         return dto.to_dict()
 
     def create_update_source(self, input: FileSourceInputDto) -> FileSourceOutputDto:
         source = self.FileSources.get(input)
-        if source is None or source.is_deleted:
+        if source is None or source.deleted:
             dto = self.FileSources.create(input)
         else:
             dto = self.FileSources.update(source.id, input)
         return dto
 
-    def add_tags_to_files(self, tag_query: List[str], tags: List[str]):
-        files = self.get_files_by_tags(tag_query)
-        for file in files:
-            if not file.is_deleted:
-                self._add_tags(file.id, tags)
-
-    def delete_file_by_tags(self, tags_query: List[str]) -> None:
-        tag_ids = self.Tags.get_by_query(tags_query)
-        tag_ids = [tag.id for tag in tag_ids if not tag.is_deleted]
-        self.Files.delete_by_tags(tag_ids)
-
-    def delete_tags_from_files(self, tag_query: List[str], tags: List[str]) -> None:
-        tag_ids = self.Tags.get_by_query(tag_query)
-        tag_ids = [tag.id for tag in tag_ids if not tag.is_deleted]
-        files = self.Files.get_by_tags(tag_ids)
-        for file in files:
-            if not file.is_deleted:
-                self._delete_tags(file.id, tags)
-
-    def copy_file(self, file: FileInputDto, file_id: int) -> FileSourceInputDto:
-        file_name = f"{file.name}.{file.file_type}"
-        dest_path = os.path.join(self._config[CONTENT_PATH_KEY], file_name)
-        file_loader = file.content
-        with open(dest_path, "wb") as f:
-            f.write(file_loader)
-        return FileSourceInputDto(file_id, file.size, 1, dest_path)
+    @staticmethod
+    def _check_write_query(tag_query: List[str]) -> None:
+        """Reject empty tag queries in writes, they match every file."""
+        if parse_tag_query(tag_query) is None:
+            raise ValueError("A tag query is required to change files")
+
+    def add_tags_to_files(self, tag_query: List[str], tags: List[str]) -> int:
+        self._check_write_query(tag_query)
+        files = self.Files.get_ids_by_tag_query(tag_query, self._query_tag_ids(tag_query))
+        return self.Tags.add_tags_to_files(files, tags)
+
+    def delete_file_by_tags(self, tag_query: List[str]) -> int:
+        self._check_write_query(tag_query)
+        return self.Files.delete_by_tag_query(tag_query, self._query_tag_ids(tag_query))
+
+    def delete_tags_from_files(self, tag_query: List[str], tags: List[str]) -> int:
+        self._check_write_query(tag_query)
+        files = self.Files.get_ids_by_tag_query(tag_query, self._query_tag_ids(tag_query))
+        return self.Tags.delete_tags_from_files(files, tags)
+
+    def copy_file(
+        self, file: FileInputDto, content: Optional[Iterable[bytes]] = None
+    ) -> List[Tuple[str, int]]:
+        """Store the content of a file in the chunk store, return its chunks in order.
+
+        Streamed content is stored as it arrives and must add up to the size of the file.
+        The codec of the chunks is chosen by the type of the file and its first bytes.
+        """
+        compressor = self.Chunks.compressor
+        if content is None:
+            codec = compressor.choose(file.file_type, file.content)
+            return self.Chunks.write(file.content, codec)
+        blocks = iter(content)
+        first = next(blocks, b"")
+        codec = compressor.choose(file.file_type, first)
+        chunks = self.Chunks.write_stream(itertools.chain([first], blocks), codec)
+        received = sum(size for _, size in chunks)
+        if received != file.size:
+            raise ValueError(f"Received {received} bytes of a file of {file.size}")
+        return chunks
+
+    def _chunk_sources(
+        self, file_id: int, chunks: List[Tuple[str, int]]
+    ) -> List[FileSourceInputDto]:
+        sources = []
+        for index, (digest, size) in enumerate(chunks):
+            path, codec = self.Chunks.find(digest)
+            sources.append(
+                FileSourceInputDto(
+                    file_id, size, path, chunk_index=index, chunk_hash=digest, codec=codec
+                )
+            )
+        return sources
+
+    def get_file_chunks(self, file_id: int) -> Tuple[FileOutputDto, List[FileSource]]:
+        """Return a live local file and its chunks in order."""
+        files = self.Files.get_listing_by_ids([file_id])
+        if not files:
+            raise ValueError(f"File not found: {file_id}")
+        return files[0], self.FileSources.get_chunks(file_id)
+
+    def read_content(self, file_id: int) -> bytes:
+        """Return the content of a local file from its chunks."""
+        chunks = self.FileSources.get_chunks(file_id)
+        return self.Chunks.read_all(chunk.chunk_hash for chunk in chunks)
 
     def _add_tags(self, file_id: int, tag_list: List[str]):
-        for tag_name in tag_list:
-            tag = self.Tags.get(TagInputDto(tag_name, None, None))
-            if tag is None or tag.is_deleted:
-                tag = self.Tags.create(TagInputDto(tag_name))
-            self.Tags.add_tag(file_id, tag.id)
-
-    def _delete_tags(self, file_id: int, tag_list: List[str]):
-        tag_ids = self.get_tags_id(tag_list)
-        self.Tags.delete_tags(file_id, tag_ids)
+        self.Tags.add_tags_to_files([file_id], tag_list)
+
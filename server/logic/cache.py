@@ -0,0 +1,171 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, Optional, TypeVar
+
+import threading
+
+__all__ = ["LRUCache", "ResultCache"]
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class LRUCache(Generic[KeyType, ValueType]):
+    """Thread-safe bounded mapping that evicts the least recently used entries.
+
+    The capacity counts entries, or the total weight of the values when a weigh
+    function is given, such as len for a budget of bytes.
+    """
+
+    def __init__(
+        self, capacity: int, weigh: Optional[Callable[[ValueType], int]] = None
+    ) -> None:
+        self.capacity = capacity
+        self._weigh = weigh or (lambda value: 1)
+        self._entries: OrderedDict[KeyType, ValueType] = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def get_many(self, keys: Iterable[KeyType]) -> Dict[KeyType, ValueType]:
+        """Return the cached entries of the keys, counting a miss for each absent key."""
+        result = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def put(self, key: KeyType, value: ValueType) -> None:
+        """Keep an entry, evicting the oldest ones, values heavier than the cache are not kept."""
+        weight = self._weigh(value)
+        with self._lock:
+            if key in self._entries:
+                self.weight -= self._weigh(self._entries.pop(key))
+            if weight > self.capacity:
+                return
+            self._entries[key] = value
+            self.weight += weight
+            while self.weight > self.capacity:
+                self.weight -= self._weigh(self._entries.popitem(last=False)[1])
+                self.evictions += 1
+
+    def put_many(self, entries: Dict[KeyType, ValueType]) -> None:
+        for key, value in entries.items():
+            self.put(key, value)
+
+    def invalidate(self, key: KeyType) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.weight -= self._weigh(self._entries.pop(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and weight of the cache and its hit, miss and eviction counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "resident": self.weight,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+class _Flight:
+    """Execution of a result shared with the callers that asked for it meanwhile."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache(Generic[KeyType, ValueType]):
+    """LRU cache of computed results tagged with the version of the data they read.
+
+    Entries with an older version are misses, and concurrent misses of the same key
+    and version wait for a single computation instead of running their own.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._entries: LRUCache[KeyType, tuple] = LRUCache(capacity)
+        self._flights: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+
+    def get_or_compute(
+        self, key: KeyType, version: Hashable, compute: Callable[[], ValueType]
+    ) -> ValueType:
+        """Return the cached result of a key at a version, computing it once if absent.
+
+        The version must be read before computing, so writes during it leave it stale.
+        """
+        entry = self._entries.get(key)
+        with self._lock:
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            flight = self._flights.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, version)] = _Flight()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            self._entries.put(key, (version, flight.result))
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop((key, version), None)
+            flight.done.set()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters of the cache and the number of collapsed requests."""
+        entries = self._entries.stats()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": entries["size"],
+                "capacity": entries["capacity"],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": entries["evictions"],
+                "hit_ratio": self.hits / total if total else 0.0,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,384 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import hashlib, logging, os, random, re, tempfile, threading
+
+from data.const import CHUNK_SIZE, DEFAULT_CHUNKING
+from logic.cache import LRUCache
+from logic.compression import AUTO_CODEC, CODECS, NO_CODEC, Compressor, portable_codec
+
+__all__ = ["ChunkStore", "CHUNKING_MODES"]
+
+CHUNKING_MODES = ("fixed", "cdc")
+
+# Random byte values of the gear hash, fixed so every node cuts the same content alike
+_random = random.Random(0x6765617268617368)
+_GEAR = tuple(_random.getrandbits(64) for _ in range(256))
+_MASK_64 = (1 << 64) - 1
+# Bytes that fully determine the gear hash, hashing starts this far before a cut point
+_WINDOW = 64
+# Chunks are named by their SHA-256, hashes from requests must be nothing else
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+# Locks of the chunks by hash, writes and removals of a chunk hold the lock of its hash
+_LOCK_STRIPES = 64
+
+
+class ChunkStore:
+    """Content-addressed store of the chunks of the files, each one kept once by SHA-256.
+
+    Content is split in fixed-size chunks or in content-defined ones (gear hash cut
+    points), where an insertion only changes the chunks around it. Chunks are kept
+    compressed with the codec of their file, in a file named after the codec, unless
+    compressing does not shrink them. Chunks read are kept decompressed in a cache of
+    a budget of bytes, dropping the least recently read ones.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        chunk_size: int = CHUNK_SIZE,
+        chunking: str = DEFAULT_CHUNKING,
+        compression: str = AUTO_CODEC,
+        cache_size: int = 0,
+    ) -> None:
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking: {chunking}")
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunking = chunking
+        # Content-defined chunks average about chunk_size within [min_size, max_size]
+        self.min_size = chunk_size // 4
+        self.max_size = chunk_size * 4
+        bits = max((chunk_size - self.min_size).bit_length() - 1, 1)
+        self._cut_mask = ((1 << bits) - 1) << (64 - bits)
+        self.compressor = Compressor(compression)
+        self.cache: LRUCache[str, bytes] = LRUCache(cache_size, len)
+        self._lock = threading.Lock()
+        self._chunk_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._counters = {
+            "chunks": 0,
+            "stored": 0,
+            "bytes": 0,
+            "stored_bytes": 0,
+            "disk_bytes": 0,
+        }
+        os.makedirs(root, exist_ok=True)
+
+    def _fixed_cuts(self, size: int) -> Iterator[int]:
+        yield from range(self.chunk_size, size, self.chunk_size)
+
+    def _cdc_cut(self, data: bytes | bytearray, start: int) -> int:
+        """Return the end of the content-defined chunk that begins at start."""
+        gear, mask, size = _GEAR, self._cut_mask, len(data)
+        if size - start <= self.min_size:
+            return size
+        first, end = start + self.min_size, min(start + self.max_size, size)
+        fingerprint = 0
+        for position in range(max(first - _WINDOW, start), first):
+            fingerprint = ((fingerprint << 1) + gear[data[position]]) & _MASK_64
+        position = first
+        for byte in data[first:end]:
+            fingerprint = ((fingerprint << 1) + gear[byte]) & _MASK_64
+            position += 1
+            if not fingerprint & mask:
+                return position
+        return end
+
+    def _cdc_cuts(self, data: bytes) -> Iterator[int]:
+        start, size = 0, len(data)
+        while size - start > self.min_size:
+            cut = self._cdc_cut(data, start)
+            if cut == size:
+                return
+            yield cut
+            start = cut
+
+    def split(self, data: bytes) -> Iterator[memoryview]:
+        """Split content in chunks, empty content has no chunks."""
+        view = memoryview(data)
+        if self.chunking == "fixed":
+            cuts = self._fixed_cuts(len(data))
+        else:
+            cuts = self._cdc_cuts(data)
+        start = 0
+        for cut in cuts:
+            yield view[start:cut]
+            start = cut
+        if start < len(data):
+            yield view[start:]
+
+    def path(self, digest: str) -> str:
+        """Return the path of a chunk, chunks are spread in folders by hash prefix."""
+        if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Invalid chunk hash: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def stored_path(self, digest: str, codec: str) -> str:
+        """Return the path of a chunk kept compressed with a codec."""
+        path = self.path(digest)
+        return path if codec == NO_CODEC else f"{path}.{codec}"
+
+    def find(self, digest: str) -> Tuple[str, str]:
+        """Return the path of a stored chunk and the codec it is compressed with."""
+        for codec in CODECS:
+            path = self.stored_path(digest, codec)
+            if os.path.exists(path):
+                return path, codec
+        raise FileNotFoundError(f"Chunk not stored: {digest}")
+
+    def has(self, digest: str) -> bool:
+        """Return if a chunk is stored whole."""
+        return any(os.path.exists(self.stored_path(digest, codec)) for codec in CODECS)
+
+    def _chunk_lock(self, digest: str) -> threading.Lock:
+        return self._chunk_locks[int(digest[:2], 16) % _LOCK_STRIPES]
+
+    def _refresh(self, digest: str) -> bool:
+        """Mark a stored chunk as written now, so the collector keeps it; False if absent."""
+        for codec in CODECS:
+            try:
+                os.utime(self.stored_path(digest, codec))
+                return True
+            except FileNotFoundError:
+                continue
+        return False
+
+    @staticmethod
+    def _write_file(path: str, *parts: bytes | memoryview) -> None:
+        """Write a file whole or not at all, concurrent writers of it both write whole files."""
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=folder)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for part in parts:
+                    file.write(part)
+            os.replace(temporary, path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+
+    def put(self, chunk: bytes | memoryview, codec: str = NO_CODEC) -> Tuple[str, bool]:
+        """Store a chunk unless it is already stored, return its hash and if it was new."""
+        digest = hashlib.sha256(chunk).hexdigest()
+        packed = chunk
+        # Held until the chunk is refreshed or written, so the collector can not remove it
+        with self._chunk_lock(digest):
+            stored = not self._refresh(digest)
+            if stored:
+                if codec != NO_CODEC:
+                    packed = self.compressor.compress(codec, chunk)
+                    if len(packed) >= len(chunk):
+                        codec, packed = NO_CODEC, chunk
+                self._write_file(self.stored_path(digest, codec), packed)
+        self._count(len(chunk), len(packed) if stored else None)
+        return digest, stored
+
+    def put_stored(self, codec: str, packed: bytes) -> Tuple[str, bool]:
+        """Store a chunk received as another node keeps it, checked by decompressing it."""
+        chunk = self.compressor.decompress(codec, packed)
+        digest = hashlib.sha256(chunk).hexdigest()
+        with self._chunk_lock(digest):
+            stored = not self._refresh(digest)
+            if stored:
+                self._write_file(self.stored_path(digest, codec), packed)
+        self._count(len(chunk), len(packed) if stored else None)
+        return digest, stored
+
+    def _count(self, size: int, disk_size: Optional[int]) -> None:
+        with self._lock:
+            self._counters["chunks"] += 1
+            self._counters["bytes"] += size
+            if disk_size is not None:
+                self._counters["stored"] += 1
+                self._counters["stored_bytes"] += size
+                self._counters["disk_bytes"] += disk_size
+
+    def write(self, data: bytes, codec: str = NO_CODEC) -> List[Tuple[str, int]]:
+        """Store the chunks of some content, return the hash and size of each in order."""
+        chunks = [(self.put(chunk, codec)[0], len(chunk)) for chunk in self.split(data)]
+        logging.info(f"Content of {len(data)} bytes stored in {len(chunks)} chunks")
+        return chunks
+
+    def write_stream(
+        self, blocks: Iterable[bytes], codec: str = NO_CODEC
+    ) -> List[Tuple[str, int]]:
+        """Store the chunks of content arriving in blocks, as write does for the whole.
+
+        At most the largest chunk and a block are held, whatever the size of the content.
+        """
+        # A chunk is only decided once the data covers the longest one it can be
+        limit = self.chunk_size if self.chunking == "fixed" else self.max_size
+        buffer, chunks, total = bytearray(), [], 0
+        for block in blocks:
+            buffer += block
+            total += len(block)
+            while len(buffer) >= limit:
+                chunks.append(self._put_first(buffer, codec))
+        while buffer:
+            chunks.append(self._put_first(buffer, codec))
+        logging.info(f"Stream of {total} bytes stored in {len(chunks)} chunks")
+        return chunks
+
+    def _put_first(self, buffer: bytearray, codec: str) -> Tuple[str, int]:
+        """Store the first chunk of the buffer and drop it from the buffer."""
+        if self.chunking == "fixed":
+            cut = min(self.chunk_size, len(buffer))
+        else:
+            cut = self._cdc_cut(buffer, 0)
+        digest = self.put(bytes(buffer[:cut]), codec)[0]
+        del buffer[:cut]
+        return digest, cut
+
+    def read_stored(self, digest: str) -> Tuple[str, bytes]:
+        """Return the codec of a stored chunk and its bytes as they are kept."""
+        path, codec = self.find(digest)
+        with open(path, "rb") as file:
+            return codec, file.read()
+
+    def read_portable(self, digest: str) -> Tuple[str, bytes]:
+        """Return a stored chunk in a codec every node decodes, recompressed when it is not."""
+        codec, stored = self.read_stored(digest)
+        sent = portable_codec(codec)
+        if sent == codec:
+            return codec, stored
+        return sent, self.compressor.compress(sent, self.compressor.decompress(codec, stored))
+
+    def read(self, digest: str, cached: bool = True) -> bytes:
+        """Return the content of a stored chunk, from the cache when it was read lately.
+
+        One-off reads, such as placing new chunks on other nodes, skip the cache.
+        """
+        chunk = self.cache.get(digest) if cached else None
+        if chunk is None:
+            chunk = self.compressor.decompress(*self.read_stored(digest))
+            if cached:
+                self.cache.put(digest, chunk)
+        return chunk
+
+    def read_range(self, digest: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Return part of a stored chunk, up to its end when no length is given.
+
+        With a cache the whole chunk is read and kept, so later ranges of it are in memory.
+        """
+        path, codec = self.find(digest)
+        if codec != NO_CODEC or self.cache.capacity:
+            return self.read(digest)[offset : None if length is None else offset + length]
+        with open(path, "rb") as file:
+            file.seek(offset)
+            return file.read(-1 if length is None else length)
+
+    def locate(
+        self, digest: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[Tuple[str, int, int, bytes]]:
+        """Return the path, offset, length and SHA-256 of a range that is a whole chunk.
+
+        Only chunks kept as they are qualify, they can be sent from the file without
+        reading it; None for parts of chunks and compressed ones.
+        """
+        path, codec = self.find(digest)
+        if codec != NO_CODEC or offset:
+            return None
+        size = os.path.getsize(path)
+        if length is not None and length < size:
+            return None
+        return path, 0, size, bytes.fromhex(digest)
+
+    def forget(self, digests: Iterable[str]) -> None:
+        """Drop chunks from the cache, as the content of files overwritten."""
+        for digest in digests:
+            self.cache.invalidate(digest)
+
+    def read_all(self, digests: Iterable[str]) -> bytes:
+        """Return the content made of the given chunks in order."""
+        return b"".join(self.read(digest) for digest in digests)
+
+    def shard_path(self, digest: str, index: int) -> str:
+        """Return the path of an erasure-coded shard of a chunk, next to where the chunk goes."""
+        if type(index) is not int or index < 0:
+            raise ValueError(f"Invalid shard index: {index!r}")
+        return f"{self.path(digest)}.{index}"
+
+    def put_shard(self, digest: str, index: int, shard: bytes) -> None:
+        """Store a shard of a chunk after the SHA-256 of the shard, which reads check."""
+        with self._chunk_lock(digest):
+            checksum = hashlib.sha256(shard).digest()
+            self._write_file(self.shard_path(digest, index), checksum, shard)
+
+    def read_shard(self, digest: str, index: int) -> bytes:
+        """Return a stored shard of a chunk, raising ValueError when it is corrupted."""
+        with open(self.shard_path(digest, index), "rb") as file:
+            checksum, shard = file.read(32), file.read()
+        if hashlib.sha256(shard).digest() != checksum:
+            raise ValueError(f"Shard {index} of chunk {digest} is corrupted")
+        return shard
+
+    def shard_indexes(self, digest: str, total: int) -> List[int]:
+        """Return the indexes of the shards of a chunk stored here."""
+        return [i for i in range(total) if os.path.exists(self.shard_path(digest, i))]
+
+    def shards(self) -> Dict[str, List[int]]:
+        """Return the indexes of every stored shard by the hash of its chunk."""
+        result: Dict[str, List[int]] = {}
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                digest, _, index = name.partition(".")
+                if index.isdigit() and _DIGEST.fullmatch(digest):
+                    result.setdefault(digest, []).append(int(index))
+        return result
+
+    def stored_files(self) -> Iterator[Tuple[str, str]]:
+        """Yield the chunk hash and path of every file kept: chunks in any codec and shards."""
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                digest = name.partition(".")[0]
+                if _DIGEST.fullmatch(digest):
+                    yield digest, os.path.join(folder, name)
+
+    def whole_chunks(self) -> Iterator[Tuple[str, str]]:
+        """Yield the hash and path of every chunk kept whole, in any codec."""
+        for digest, path in self.stored_files():
+            if not os.path.basename(path).partition(".")[2].isdigit():
+                yield digest, path
+
+    def remove(
+        self, digest: str, written_before: float, shards: bool = True
+    ) -> Tuple[int, int]:
+        """Delete the files of a chunk not written since a time, return the files and bytes freed.
+
+        A chunk written again meanwhile, as new content sharing it, is kept whole. Without
+        shards only the whole chunk goes, the shards of it kept here stay.
+        """
+        with self._chunk_lock(digest):
+            folder = os.path.dirname(self.path(digest))
+            try:
+                names = [
+                    name
+                    for name in os.listdir(folder)
+                    if name.partition(".")[0] == digest
+                    and (shards or not name.partition(".")[2].isdigit())
+                ]
+                stats = {name: os.stat(os.path.join(folder, name)) for name in names}
+            except FileNotFoundError:
+                return 0, 0
+            if any(stat.st_mtime >= written_before for stat in stats.values()):
+                return 0, 0
+            removed, freed = 0, 0
+            for name, stat in stats.items():
+                try:
+                    os.remove(os.path.join(folder, name))
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+        self.cache.invalidate(digest)
+        return removed, freed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the chunks and bytes written since start, the new ones and the compression."""
+        with self._lock:
+            counters = dict(self._counters)
+        stored = counters["stored_bytes"]
+        counters["dedup_ratio"] = counters["bytes"] / stored if stored else 1.0
+        counters["saved_bytes"] = stored - counters["disk_bytes"]
+        counters["compression"] = self.compressor.stats()
+        return counters
@@ -0,0 +1,171 @@
+from typing import Any, Dict, Optional
+
+import base64, json, lzma, threading, time, zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = [
+    "Compressor",
+    "CODECS",
+    "NO_CODEC",
+    "AUTO_CODEC",
+    "PORTABLE_CODECS",
+    "WIRE_CODEC",
+    "WIRE",
+    "portable_codec",
+    "pack_payload",
+    "unpack_payload",
+]
+
+NO_CODEC = "none"
+# Setting that chooses the codec of each file by its type and a sample of its content
+AUTO_CODEC = "auto"
+CODECS = (NO_CODEC, "zlib", "lzma") + (("zstd",) if zstandard else ())
+# Codec of compressible content, zstd when installed
+FAST_CODEC = "zstd" if zstandard else "zlib"
+# Codecs of the standard library, every node decodes them whatever it has installed
+PORTABLE_CODECS = (NO_CODEC, "zlib", "lzma")
+# Codec of the data sent to other nodes
+WIRE_CODEC = "zlib"
+
+# Types already compressed by their format, and types of text
+_PACKED_TYPES = set(
+    "7z apk avi bz2 docx flac gif gz jar jpeg jpg mkv mov mp3 mp4 ogg png pptx rar tgz "
+    "webm webp xlsx xz zip zst".split()
+)
+_TEXT_TYPES = set(
+    "c cpp css csv h htm html ini java js json log md py sql svg toml ts tsv txt xml "
+    "yaml yml".split()
+)
+# Unknown types are compressed when a sample shrinks below this ratio
+_SAMPLE_SIZE = 16384
+_SAMPLE_PARTS = 4
+_COMPRESSIBLE_RATIO = 0.9
+_COUNTERS = (
+    "compressed",
+    "raw_bytes",
+    "stored_bytes",
+    "compress_seconds",
+    "decompressed",
+    "decompress_seconds",
+)
+# JSON payloads between nodes smaller than this travel as they are
+_PAYLOAD_MIN_SIZE = 1024
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "lzma":
+        return lzma.compress(data, preset=6)
+    if codec == "zstd" and zstandard:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    if codec == "zstd" and zstandard:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+class Compressor:
+    """Compress and decompress with the codecs, counting the bytes saved and the CPU time."""
+
+    def __init__(self, setting: str = AUTO_CODEC) -> None:
+        if setting not in CODECS + (AUTO_CODEC,):
+            raise ValueError(f"Unknown compression: {setting}")
+        self.setting = setting
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def _codec_counters(self, codec: str) -> Dict[str, float]:
+        """Return the counters of a codec, the lock must be held."""
+        if codec not in self._counters:
+            self._counters[codec] = dict.fromkeys(_COUNTERS, 0)
+        return self._counters[codec]
+
+    def choose(self, file_type: Optional[str], sample: bytes) -> str:
+        """Return the codec of a file: the setting, or by type and a sample of the content."""
+        if self.setting != AUTO_CODEC:
+            return self.setting
+        file_type = (file_type or "").lower().lstrip(".")
+        if file_type in _PACKED_TYPES:
+            return NO_CODEC
+        if file_type in _TEXT_TYPES:
+            return FAST_CODEC
+        if not sample:
+            return NO_CODEC
+        # Parts spread over the sample, the start alone is often a header
+        part = _SAMPLE_SIZE // _SAMPLE_PARTS
+        step = max(len(sample) // _SAMPLE_PARTS, part)
+        probe = b"".join(sample[i : i + part] for i in range(0, len(sample), step))
+        ratio = len(zlib.compress(probe, 1)) / len(probe)
+        return FAST_CODEC if ratio < _COMPRESSIBLE_RATIO else NO_CODEC
+
+    def compress(self, codec: str, data: bytes) -> bytes:
+        if codec == NO_CODEC:
+            return data
+        start = time.perf_counter()
+        packed = _compress(codec, data)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            counters = self._codec_counters(codec)
+            counters["compressed"] += 1
+            counters["raw_bytes"] += len(data)
+            counters["stored_bytes"] += len(packed)
+            counters["compress_seconds"] += elapsed
+        return packed
+
+    def decompress(self, codec: str, data: bytes) -> bytes:
+        if codec == NO_CODEC:
+            return data
+        start = time.perf_counter()
+        raw = _decompress(codec, data)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            counters = self._codec_counters(codec)
+            counters["decompressed"] += 1
+            counters["decompress_seconds"] += elapsed
+        return raw
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per codec the bytes before and after compression, saved, and seconds spent."""
+        with self._lock:
+            result = {codec: dict(counters) for codec, counters in self._counters.items()}
+        for counters in result.values():
+            counters["saved_bytes"] = counters["raw_bytes"] - counters["stored_bytes"]
+        return result
+
+
+def portable_codec(codec: str) -> str:
+    """Return the codec data in a codec travels with, the wire codec when peers may lack it."""
+    return codec if codec in PORTABLE_CODECS else WIRE_CODEC
+
+
+# Compression of the JSON payloads between nodes
+WIRE = Compressor(WIRE_CODEC)
+
+
+def pack_payload(value: Any) -> Any:
+    """Return a JSON value compressed for the wire, or as it is when it is small."""
+    raw = json.dumps(value).encode("utf-8")
+    if len(raw) < _PAYLOAD_MIN_SIZE:
+        return value
+    packed = WIRE.compress(WIRE.setting, raw)
+    return {"codec": WIRE.setting, "payload": base64.b64encode(packed).decode("ascii")}
+
+
+def unpack_payload(value: Any) -> Any:
+    """Return the JSON value of a payload packed by pack_payload, others as they are."""
+    if not isinstance(value, dict) or value.keys() != {"codec", "payload"}:
+        return value
+    packed = base64.b64decode(value["payload"])
+    return json.loads(WIRE.decompress(value["codec"], packed))
@@ -29,6 +29,22 @@ class Configurable:
             DB_BASE_URL_KEY: os.getenv(DB_BASE_URL_ENV_KEY, DEFAULT_DB_BASE_URL),
             DB_NAME_KEY: os.getenv(DB_NAME_ENV_KEY, DEFAULT_DB_NAME),
             CONTENT_PATH_KEY: os.getenv(CONTENT_PATH_ENV_KEY, DEFAULT_CONTENT_PATH),
+            REPLICATION_FACTOR_KEY: int(
+                os.getenv(REPLICATION_FACTOR_ENV_KEY, DEFAULT_REPLICATION_FACTOR)
+            ),
+            WRITE_QUORUM_KEY: int(os.getenv(WRITE_QUORUM_ENV_KEY, DEFAULT_WRITE_QUORUM)),
+            TAG_QUORUM_KEY: int(os.getenv(TAG_QUORUM_ENV_KEY, DEFAULT_TAG_QUORUM)),
+            LIST_QUORUM_KEY: int(os.getenv(LIST_QUORUM_ENV_KEY, DEFAULT_LIST_QUORUM)),
+            HINTS_DB_NAME_KEY: os.getenv(HINTS_DB_NAME_ENV_KEY, DEFAULT_HINTS_DB_NAME),
+            BOOTSTRAP_MODE_KEY: os.getenv(BOOTSTRAP_MODE_ENV_KEY, DEFAULT_BOOTSTRAP_MODE),
+            STORAGE_PROFILE_KEY: os.getenv(
+                STORAGE_PROFILE_ENV_KEY, DEFAULT_STORAGE_PROFILE
+            ),
+            QUERY_ENGINE_KEY: os.getenv(QUERY_ENGINE_ENV_KEY, DEFAULT_QUERY_ENGINE),
+            CHUNKING_KEY: os.getenv(CHUNKING_ENV_KEY, DEFAULT_CHUNKING),
+            ERASURE_CODING_KEY: os.getenv(ERASURE_CODING_ENV_KEY, DEFAULT_ERASURE_CODING),
+            COMPRESSION_KEY: os.getenv(COMPRESSION_ENV_KEY, DEFAULT_COMPRESSION),
+            GC_RETENTION_KEY: int(os.getenv(GC_RETENTION_ENV_KEY, DEFAULT_GC_RETENTION)),
         }
         default[DB_URL_KEY] = default[DB_BASE_URL_KEY] + default[DB_NAME_KEY]
 
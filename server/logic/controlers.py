@@ -1,7 +1,10 @@
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional
 
 import logging
 
+from data import LOCAL_OWNER
+from servers.server import FrameStream
+
 from .business_data import *
 from .dtos import FileInputDto
 from .business_services import ServerService
@@ -21,6 +24,17 @@ def add(file: FileInputDto, tags: List[str]) -> str:
         return str(e)
 
 
+@Upload({"file": FileInputDto, "tags": list})
+def upload(file: FileInputDto, tags: List[str], stream: Iterable[bytes]) -> str:
+    try:
+        logging.info(f"Uploading file with tags: {tags}")
+        result = _server_service.create_update_file(file, tags, stream)
+        return str(result)
+    except Exception as e:
+        logging.error(f"Error uploading file: {e}")
+        return str(e)
+
+
 @Delete({"tag_query": list})
 def delete(tag_query: List[str]) -> str:
     try:
@@ -32,17 +46,39 @@ def delete(tag_query: List[str]) -> str:
         return str(e)
 
 
-@GetAll({"tag_query": list})
-def list_files(tag_query: List[str]) -> list[str]:
+@GetAll(
+    {
+        "tag_query": list,
+        "page_size": Optional[int],
+        "cursor": Optional[str],
+        "session_token": Optional[str],
+    }
+)
+def list_files(
+    tag_query: List[str],
+    page_size: Optional[int] = None,
+    cursor: Optional[str] = None,
+    session_token: Optional[str] = None,
+) -> Dict[str, Any]:
     try:
-        logging.info(f"Listing files with tags: {tag_query}")
-        files = _server_service.get_files_by_tags(tag_query)
-        return [str(file) for file in files]
+        logging.info(f"Listing files with tags: {tag_query} after cursor: {cursor}")
+        return list_page(tag_query, page_size, cursor)
     except Exception as e:
         logging.error(f"Error listing files: {e}")
         return str(e)
 
 
+def list_page(
+    tag_query: List[str],
+    page_size: Optional[int],
+    cursor: Optional[str],
+    owner: str = LOCAL_OWNER,
+) -> Dict[str, Any]:
+    """Return a page of the files of an owner in the shape of the list responses."""
+    files, cursor = _server_service.get_files_page(tag_query, page_size, cursor, owner)
+    return {"files": [str(file) for file in files], "cursor": cursor}
+
+
 @Create({"tag_query": list, "tags": list})
 def add_tags(tag_query: List[str], tags: List[str]) -> str:
     try:
@@ -65,8 +101,8 @@ def delete_tags(tag_query: List[str], tags: List[str]) -> str:
         return str(e)
 
 
-@Get({"user_name": str})
-def get_user_id(user_name: str) -> int:
+@Get({"user_name": str, "session_token": Optional[str]})
+def get_user_id(user_name: str, session_token: Optional[str] = None) -> int:
     try:
         logging.info(f"Getting user ID for user: {user_name}")
         result = _server_service.get_user_id(user_name)
@@ -76,6 +112,52 @@ def get_user_id(user_name: str) -> int:
         return str(e)
 
 
+@Get({"file_id": int})
+def get_file(file_id: int) -> Dict[str, Any]:
+    try:
+        logging.info(f"Getting file with ID: {file_id}")
+        file, chunks = _server_service.get_file_chunks(file_id)
+        return {
+            "file": file.to_dict(),
+            "chunks": [[chunk.chunk_hash, chunk.chunk_size] for chunk in chunks],
+        }
+    except Exception as e:
+        logging.error(f"Error getting file: {e}")
+        return str(e)
+
+
+@Fetch({"chunks": list})
+def fetch(chunks: List[List[Any]], stream: FrameStream) -> str:
+    """Send ranges of local chunks, each one [hash, offset, length], as frames in order.
+
+    Whole raw chunks go from their files to the socket with sendfile, never read in
+    Python, parts of chunks and compressed chunks are read and decompressed, their
+    checksum has to be computed from the bytes anyway.
+    """
+    try:
+        logging.info(f"Fetching {len(chunks)} chunk ranges")
+        for digest, offset, length in chunks:
+            located = _server_service.Chunks.locate(digest, offset, length)
+            if located:
+                stream.send_file(*located)
+                continue
+            stream.send(_server_service.Chunks.read_range(digest, offset, length))
+        return f"{len(chunks)} chunks sent"
+    except Exception as e:
+        logging.error(f"Error fetching chunks: {e}")
+        return str(e)
+
+
+@Get({})
+def stats() -> Dict[str, Any]:
+    try:
+        logging.info("Getting cache and index stats")
+        return _server_service.stats()
+    except Exception as e:
+        logging.error(f"Error getting stats: {e}")
+        return str(e)
+
+
 def set_server_service(server_service: ServerService) -> None:
     """Set the configuration for the server."""
     global _server_service
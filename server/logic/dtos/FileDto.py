@@ -1,4 +1,5 @@
 from __future__ import annotations
+from sqlalchemy import Row
 from datetime import datetime
 
 from data import File
@@ -61,10 +62,10 @@ class FileInputDto(FileBaseDto):
         user_id (int): ID of the user who uploaded the file.
         creation_date (datetime): Creation date of the file.
         update_date (datetime): Update date of the file.
-        content (str): Content of the file.
+        content (str): Content of the file, empty when it is streamed after the metadata.
     """
 
-    def __init__(self, content: str, **kwargs) -> None:
+    def __init__(self, content: str = "", **kwargs) -> None:
         FileBaseDto.__init__(self, **kwargs)
         self.content = content.encode("utf-8")
 
@@ -89,18 +90,20 @@ class FileOutputDto(FileBaseDto):
         update_date (datetime): Update date of the file.
     """
 
-    def __init__(self, id: str, **kwargs) -> None:
+    def __init__(self, id: str, tags: list[str] | None = None, **kwargs) -> None:
         FileBaseDto.__init__(self, **kwargs)
         self.id = id
+        self.tags = tags or []
 
     def to_dict(self) -> dict[str, str]:
         return {
             "id": self.id,
             **FileBaseDto.to_dict(self),
+            "tags": self.tags,
         }
 
     def __repr__(self) -> str:
-        return f"FileInputDto(id={self.id}, name={self.name!r}, file_type={self.file_type!r}, size={self.size!r})"
+        return f"FileOutputDto(id={self.id}, name={self.name!r}, file_type={self.file_type!r}, size={self.size!r}, tags={self.tags!r})"
 
     @staticmethod
     def _to_dto(file: File) -> FileOutputDto:
@@ -113,3 +116,17 @@ class FileOutputDto(FileBaseDto):
             creation_date=file.creation_date,
             update_date=file.update_date,
         )
+
+    @staticmethod
+    def _from_row(row: Row, tags: list[str]) -> FileOutputDto:
+        """Build the DTO from a row of the listing columns, without an ORM object."""
+        return FileOutputDto(
+            id=row.id,
+            name=row.name,
+            file_type=row.file_type,
+            size=row.size,
+            user_id=row.user_id,
+            creation_date=row.creation_date,
+            update_date=row.update_date,
+            tags=tags,
+        )
@@ -14,6 +14,9 @@ class FileSourceInputDto:
         url: str,
         creation_date: datetime | str = datetime.now(),
         update_date: datetime | str = datetime.now(),
+        chunk_index: int = 0,
+        chunk_hash: str | None = None,
+        codec: str = "none",
     ) -> None:
         if isinstance(creation_date, str):
             creation_date = datetime.strptime(creation_date, "%Y-%m-%d %H:%M:%S")
@@ -23,6 +26,9 @@ class FileSourceInputDto:
         self.file_id = file_id
         self.chunk_size = chunk_size
         self.url = url
+        self.chunk_index = chunk_index
+        self.chunk_hash = chunk_hash
+        self.codec = codec
         self.creation_date = creation_date
         self.update_date = update_date
 
@@ -31,6 +37,9 @@ class FileSourceInputDto:
             "file_id": self.file_id,
             "chunk_size": self.chunk_size,
             "url": self.url,
+            "chunk_index": self.chunk_index,
+            "chunk_hash": self.chunk_hash,
+            "codec": self.codec,
             "creation_date": (
                 self.creation_date.strftime("%Y-%m-%d %H:%M:%S")
                 if self.creation_date
@@ -44,7 +53,7 @@ class FileSourceInputDto:
         }
 
     def __repr__(self) -> str:
-        return f"FileSourceInputDto(file_id={self.file_id!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
+        return f"FileSourceInputDto(file_id={self.file_id!r}, chunk_index={self.chunk_index!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
 
 
 class FileSourceOutputDto(FileSourceInputDto):
@@ -56,7 +65,7 @@ class FileSourceOutputDto(FileSourceInputDto):
         return {**FileSourceInputDto.to_dict(self), "id": self.id}
 
     def __repr__(self) -> str:
-        return f"FileSourceOutputDto(id={self.id!r}, file_id={self.file_id!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
+        return f"FileSourceOutputDto(id={self.id!r}, file_id={self.file_id!r}, chunk_index={self.chunk_index!r}, chunk_size={self.chunk_size!r}, url={self.url!r})"
 
     @staticmethod
     def _to_dto(source: FileSource) -> FileSourceOutputDto:
@@ -67,4 +76,7 @@ class FileSourceOutputDto(FileSourceInputDto):
             url=source.url,
             creation_date=source.creation_date,
             update_date=source.update_date,
+            chunk_index=source.chunk_index,
+            chunk_hash=source.chunk_hash,
+            codec=source.codec,
         )
@@ -63,7 +63,7 @@ class UserOutputDto(UserInputDto):
         return UserOutputDto(
             user.id,
             name=user.name,
-            is_connected=user.is_connected,
+            is_connected=None,
             creation_date=user.creation_date,
             update_date=user.update_date,
         )
@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional
+
+__all__ = ["ReedSolomon", "ERASURE_OFF"]
+
+# Value of the erasure coding setting that keeps full copies of the chunks
+ERASURE_OFF = "off"
+
+# Arithmetic of GF(2^8) with the polynomial x^8 + x^4 + x^3 + x^2 + 1
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    _EXP[_power] = _value
+    _LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _power in range(255, 512):
+    _EXP[_power] = _EXP[_power - 255]
+
+
+def _mul(a: int, b: int) -> int:
+    if not a or not b:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _inverse(a: int) -> int:
+    if not a:
+        raise ZeroDivisionError("Zero has no inverse in GF(256)")
+    return _EXP[255 - _LOG[a]]
+
+
+# Products of each field value by every byte, so bytes.translate multiplies whole shards
+_PRODUCTS = [bytes(_mul(c, byte) for byte in range(256)) for c in range(256)]
+
+
+def _scaled_sum(coefficients: List[int], shards: List[bytes], size: int) -> bytes:
+    """Return the sum in GF(256) of the shards multiplied by their coefficients."""
+    total = 0
+    for coefficient, shard in zip(coefficients, shards):
+        if coefficient:
+            total ^= int.from_bytes(shard.translate(_PRODUCTS[coefficient]), "little")
+    return total.to_bytes(size, "little")
+
+
+def _invert(matrix: List[List[int]]) -> List[List[int]]:
+    """Invert a square matrix over GF(256) by Gauss-Jordan elimination."""
+    size = len(matrix)
+    rows = [row[:] + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for column in range(size):
+        pivot = next((r for r in range(column, size) if rows[r][column]), None)
+        if pivot is None:
+            raise ValueError("Singular matrix, the shards do not determine the data")
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        factor = _inverse(rows[column][column])
+        rows[column] = [_mul(factor, value) for value in rows[column]]
+        for r in range(size):
+            if r != column and rows[r][column]:
+                scale = rows[r][column]
+                rows[r] = [a ^ _mul(scale, b) for a, b in zip(rows[r], rows[column])]
+    return [row[size:] for row in rows]
+
+
+class ReedSolomon:
+    """Systematic Reed-Solomon code over GF(256): k data shards and m parity shards.
+
+    The data shards are the content split in k equal parts, the parity rows form a
+    Cauchy matrix, so any k of the k + m shards rebuild the content.
+    """
+
+    def __init__(self, data_shards: int, parity_shards: int) -> None:
+        if data_shards < 1 or parity_shards < 0 or data_shards + parity_shards > 256:
+            raise ValueError(f"Invalid erasure code: {data_shards}+{parity_shards}")
+        self.k = data_shards
+        self.m = parity_shards
+        self._parity = [
+            [_inverse((self.k + j) ^ i) for i in range(self.k)] for j in range(self.m)
+        ]
+
+    @classmethod
+    def from_spec(cls, spec: str) -> Optional["ReedSolomon"]:
+        """Build the code of a setting such as "4+2", None when it is off."""
+        if spec == ERASURE_OFF:
+            return None
+        try:
+            data, parity = (int(part) for part in spec.split("+"))
+        except ValueError as e:
+            raise ValueError(f"Invalid erasure coding: {spec}") from e
+        return cls(data, parity)
+
+    @property
+    def total(self) -> int:
+        return self.k + self.m
+
+    @property
+    def overhead(self) -> float:
+        """Bytes stored per byte of content."""
+        return self.total / self.k
+
+    def shard_size(self, size: int) -> int:
+        return max(-(-size // self.k), 1)
+
+    def encode(self, data: bytes) -> List[bytes]:
+        """Split content in k data shards, padded with zeros, and append m parity ones."""
+        size = self.shard_size(len(data))
+        data = bytes(data).ljust(size * self.k, b"\0")
+        shards = [data[i * size : (i + 1) * size] for i in range(self.k)]
+        return shards + [_scaled_sum(row, shards, size) for row in self._parity]
+
+    def _row(self, index: int) -> List[int]:
+        if index < self.k:
+            return [int(i == index) for i in range(self.k)]
+        return self._parity[index - self.k]
+
+    def data_shards(self, shards: Dict[int, bytes]) -> List[bytes]:
+        """Return the k data shards rebuilt from any k of the shards, by index."""
+        if len(shards) < self.k:
+            raise ValueError(f"{len(shards)} shards of {self.total}, {self.k} are needed")
+        if all(i in shards for i in range(self.k)):
+            return [shards[i] for i in range(self.k)]
+        # Data shards first, they need no arithmetic
+        indexes = sorted(shards)[: self.k]
+        size = len(shards[indexes[0]])
+        inverse = _invert([self._row(index) for index in indexes])
+        chosen = [shards[index] for index in indexes]
+        return [
+            shards[i] if i in shards else _scaled_sum(inverse[i], chosen, size)
+            for i in range(self.k)
+        ]
+
+    def decode(self, shards: Dict[int, bytes], size: int) -> bytes:
+        """Return the content of the given size from any k of its shards."""
+        return b"".join(self.data_shards(shards))[:size]
+
+    def repair(self, shards: Dict[int, bytes], missing: List[int]) -> Dict[int, bytes]:
+        """Return the missing shards rebuilt from any k others, padding included."""
+        full = self.encode(b"".join(self.data_shards(shards)))
+        return {index: full[index] for index in missing}
@@ -1,4 +1,4 @@
-from typing import Callable, Any, Dict, List, Optional, Tuple
+from typing import Callable, Any, Dict, List, Optional, Tuple, get_args
 
 import json, logging
 
@@ -13,6 +13,9 @@ __all__ = [
     "Delete",
     "Get",
     "GetAll",
+    "Upload",
+    "Fetch",
+    "Store",
     "Chord",
     "Election",
     "ChordCreate",
@@ -20,6 +23,8 @@ __all__ = [
     "ChordDelete",
     "ChordGet",
     "ChordGetAll",
+    "ChordUpload",
+    "ChordFetch",
 ]
 
 handlers: Dict[
@@ -59,12 +64,17 @@ def _load_data(
     validated_errors = []
     for key, value_type in dataset.items():
         value = data.get(key)
-        is_optional = value_type._name is "Optional"
+        is_optional = getattr(value_type, "_name", None) == "Optional"
         if value is None and not is_optional:
             raise ValueError(f"Missing required key: {key}")
-        elif is_optional:
+        elif value is None:
             result[key] = None
             continue
+        elif is_optional:
+            value_type = get_args(value_type)[0]
+        if value_type is Any:
+            result[key] = value
+            continue
         try:
             if isinstance(value, dict):
                 result[key] = value_type(**value)
@@ -79,8 +89,15 @@ def _load_data(
     return result
 
 
-def handle_request(header: Tuple[str, str, List[str]], data: Dict[str, Any]) -> str:
-    """Handle incoming requests and route them to the appropriate handler."""
+def handle_request(
+    header: Tuple[str, str, List[str]],
+    data: Dict[str, Any],
+    stream: Optional[Any] = None,
+) -> str:
+    """Handle incoming requests and route them to the appropriate handler.
+
+    The frames of a streamed request reach the handler as its stream argument.
+    """
     try:
         command_name, func_name, data_header = header
         if command_name is None or func_name is None:
@@ -95,7 +112,10 @@ def handle_request(header: Tuple[str, str, List[str]], data: Dict[str, Any]) ->
 
         handler_func, dataset = handler
         logging.info(f"Handling request: {handler_key}")
-        return handler_func(_load_data(data, dataset))
+        arguments = _load_data(data, dataset)
+        if stream is not None:
+            arguments["stream"] = stream
+        return handler_func(arguments)
     except Exception as e:
         logging.error(f"Error handling request: {e}")
         return json.dumps({"error": str(e)})
@@ -116,7 +136,7 @@ def create_handler(
 
         handlers[index] = (wrapper, dataset)
 
-        return wrapper
+        return func
 
     return handler
 
@@ -155,6 +175,24 @@ def GetAll(
     return create_handler("GetAll", dataset)
 
 
+def Upload(
+    dataset: Dict[str, Optional[Callable[[Any], bool]]],
+) -> Callable[[Callable[..., Any]], Callable[..., str]]:
+    return create_handler("Upload", dataset)
+
+
+def Fetch(
+    dataset: Dict[str, Optional[Callable[[Any], bool]]],
+) -> Callable[[Callable[..., Any]], Callable[..., str]]:
+    return create_handler("Fetch", dataset)
+
+
+def Store(
+    dataset: Dict[str, Optional[Callable[[Any], bool]]],
+) -> Callable[[Callable[..., Any]], Callable[..., str]]:
+    return create_handler("Store", dataset)
+
+
 def Chord(
     dataset: Dict[str, Optional[Callable[[Any], bool]]],
 ) -> Callable[[Callable[..., Any]], Callable[..., str]]:
@@ -195,3 +233,15 @@ def ChordGetAll(
     dataset: Dict[str, Optional[Callable[[Any], bool]]],
 ) -> Callable[[Callable[..., Any]], Callable[..., str]]:
     return create_handler("ChordGetAll", dataset)
+
+
+def ChordUpload(
+    dataset: Dict[str, Optional[Callable[[Any], bool]]],
+) -> Callable[[Callable[..., Any]], Callable[..., str]]:
+    return create_handler("ChordUpload", dataset)
+
+
+def ChordFetch(
+    dataset: Dict[str, Optional[Callable[[Any], bool]]],
+) -> Callable[[Callable[..., Any]], Callable[..., str]]:
+    return create_handler("ChordFetch", dataset)
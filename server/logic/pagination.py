@@ -0,0 +1,32 @@
+from typing import List, Optional
+
+import base64, hashlib, json
+
+__all__ = ["query_fingerprint", "encode_cursor", "decode_cursor"]
+
+
+def query_fingerprint(tag_query: List[str]) -> str:
+    """Return a short digest of a tag query to tie cursors to the query they page."""
+    text = " ".join(" ".join(tag_query).split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(tag_query: List[str], last_id: int) -> str:
+    """Return the token that resumes a listing after the file with the given ID."""
+    payload = json.dumps({"after": last_id, "query": query_fingerprint(tag_query)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(tag_query: List[str], cursor: Optional[str]) -> int:
+    """Return the file ID a cursor resumes after, 0 for the first page."""
+    if not cursor:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        last_id = int(payload["after"])
+        query = payload["query"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if query != query_fingerprint(tag_query):
+        raise ValueError("Cursor belongs to a different tag query")
+    return last_id
@@ -0,0 +1,178 @@
+from sqlalchemy import Select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+
+import logging
+
+from logic.dtos import FileInputDto, FileOutputDto
+from logic.tag_index import TagIndex
+from logic.tag_query import compile_tag_query
+from data import File, AsyncRepository, LOCAL_OWNER
+from .FileService import (
+    _delete_query,
+    _ids_by_tag_query,
+    _live_files,
+    _page_query,
+    _tag_names_query,
+)
+
+__all__ = ["AsyncFileService"]
+
+
+class AsyncFileService:
+    """FileService over an async repository, for use from an asyncio loop."""
+
+    def __init__(
+        self, repository: AsyncRepository[File], index: Optional[TagIndex] = None
+    ):
+        self.repository = repository
+        self.index = index
+
+    async def get(self, input: FileInputDto) -> File | None:
+        """Retrieve a file based on the provided input DTO."""
+        logging.info(f"Getting file with input: {input}")
+        params = {
+            key: value for key, value in input.to_dict().items() if value is not None
+        }
+        query = self.repository.get_query().filter_by(**params)
+        try:
+            result = await self.repository.first(query)
+            logging.info(f"File retrieved: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving file: {e}")
+            return None
+
+    async def _listing(self, query: Select) -> List[FileOutputDto]:
+        """Build the DTOs of the files selected by a query with their tags in two queries."""
+        try:
+            async with self.repository.get_session() as session:
+                rows = await self.repository.rows(query, session)
+                tags = await self._tag_names([row.row_id for row in rows], session)
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving listing of files: {e}")
+            return []
+        return [FileOutputDto._from_row(row, tags.get(row.row_id, [])) for row in rows]
+
+    async def _tag_names(
+        self, file_ids: List[int], session: AsyncSession
+    ) -> Dict[int, List[str]]:
+        """Return the names of the live tags of each file by its row ID."""
+        result: Dict[int, List[str]] = {}
+        if not file_ids:
+            return result
+        query = _tag_names_query(file_ids)
+        for file_id, name in await self.repository.rows(query, session):
+            result.setdefault(file_id, []).append(name)
+        return result
+
+    async def get_listing(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> List[FileOutputDto]:
+        """Retrieve the live files matching a tag query with their tags, in ID order."""
+        query, _ = _live_files()
+        return await self._listing(query.where(compile_tag_query(tag_query, tag_ids)))
+
+    async def get_listing_page(
+        self,
+        tag_query: List[str],
+        limit: int,
+        after_id: int = 0,
+        tag_ids: Optional[Dict[str, int]] = None,
+        owner: str = LOCAL_OWNER,
+    ) -> List[FileOutputDto]:
+        """Retrieve the next live files of an owner matching a tag query after a file ID."""
+        query = _page_query(tag_query, limit, after_id, tag_ids, owner)
+        return await self._listing(query)
+
+    async def get_listing_by_ids(self, ids: List[int]) -> List[FileOutputDto]:
+        """Retrieve the live files with the given IDs with their tags, in ID order."""
+        query, _ = _live_files()
+        return await self._listing(query.where(File.id.in_(ids)))
+
+    def get_ids_by_tag_query(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> Select:
+        """Return a query of the ids of the live local files matching a tag query."""
+        return _ids_by_tag_query(tag_query, tag_ids)
+
+    async def delete_by_tag_query(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> int:
+        """Mark the live files matching a tag query as deleted with one statement."""
+        logging.info(f"Deleting files with tag query: {tag_query}")
+        files = _ids_by_tag_query(tag_query, tag_ids)
+        query = _delete_query(files)
+        deleted, removed = 0, []
+
+        async def operations(session: AsyncSession) -> None:
+            nonlocal deleted
+            if self.index:
+                removed.extend((await session.execute(files)).scalars())
+            deleted = (await session.execute(query)).rowcount
+
+        try:
+            await self.repository.transaction(operations)
+            if self.index:
+                self.index.remove_files(removed)
+            logging.info(f"Files deleted: {deleted}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting files by tag query: {e}")
+        return deleted
+
+    async def create(self, input: FileInputDto) -> FileOutputDto | None:
+        """Create a new file with the given input DTO."""
+        logging.info(f"Creating file with input: {input}")
+        file = File(
+            name=input.name,
+            file_type=input.file_type,
+            size=input.size,
+            user_id=input.user_id,
+            creation_date=input.creation_date,
+            update_date=input.update_date,
+        )
+        try:
+            result = await self.repository.create(file, FileOutputDto._to_dto)
+            if self.index:
+                self.index.add_files([result.id])
+            logging.info(f"File created: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error creating file: {e}")
+            return None
+
+    async def update(self, id: int, input: FileInputDto) -> FileOutputDto | None:
+        """Update an existing file by its ID."""
+        logging.info(f"Updating file with ID: {id} and input: {input}")
+        file = await self.repository.get(id)
+        if file is None:
+            return None
+
+        file.name = input.name
+        file.file_type = input.file_type
+        file.size = input.size
+        file.user_id = input.user_id
+        file.creation_date = input.creation_date
+        file.update_date = input.update_date
+        try:
+            await self.repository.update(file)
+            result = FileOutputDto._to_dto(file)
+            logging.info(f"File updated: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error updating file: {e}")
+            return None
+
+    async def delete(self, id: int) -> None:
+        """Delete a file by its ID."""
+        logging.info(f"Deleting file with ID: {id}")
+        file = await self.repository.get(id)
+        if file:
+            try:
+                await self.repository.delete(file)
+                if self.index:
+                    self.index.remove_files([id])
+                logging.info(f"File deleted: {id}")
+            except SQLAlchemyError as e:
+                logging.error(f"Error deleting file: {e}")
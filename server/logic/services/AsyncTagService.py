@@ -0,0 +1,250 @@
+from sqlalchemy import Select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+
+import logging
+
+from logic.dtos import TagInputDto, TagOutputDto
+from logic.tag_index import TagIndex
+from logic.cache import LRUCache
+from data import Tag, AsyncRepository, file_tags, TAG_CACHE_SIZE
+from .TagService import (
+    _file_batches,
+    _ids_query,
+    _link_query,
+    _resolve_queries,
+    _touch_queries,
+    _touch_query,
+    _unlink_queries,
+)
+
+__all__ = ["AsyncTagService"]
+
+
+class AsyncTagService:
+    """TagService over an async repository, for use from an asyncio loop."""
+
+    def __init__(
+        self, repository: AsyncRepository[Tag], index: Optional[TagIndex] = None
+    ):
+        self.repository = repository
+        self.index = index
+        self.cache: LRUCache[str, int] = LRUCache(TAG_CACHE_SIZE)
+
+    async def get(self, input: TagInputDto) -> Tag | None:
+        """Retrieve a tag based on the provided input DTO."""
+        logging.info(f"Getting tag with input: {input}")
+        params = {
+            key: value for key, value in input.to_dict().items() if value is not None
+        }
+        query = self.repository.get_query().filter_by(**params)
+        try:
+            result = await self.repository.first(query)
+            logging.info(f"Tag retrieved: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving tag: {e}")
+            return None
+
+    async def get_by_query(self, query: List[str]) -> List[Tag]:
+        """Retrieve tags that match the given names."""
+        query = self.repository.get_query().where(Tag.name.in_(query))
+        try:
+            return await self.repository.all(query)
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving tags by query: {e}")
+            return []
+
+    async def create(self, input: TagInputDto) -> TagOutputDto | None:
+        """Create a new tag."""
+        logging.info(f"Creating tag with input: {input}")
+        tag = Tag(
+            name=input.name,
+            creation_date=input.creation_date,
+            update_date=input.update_date,
+        )
+        try:
+            result = await self.repository.create(tag, TagOutputDto._to_dto)
+            self.cache.put(result.name, result.id)
+            if self.index:
+                self.index.add_tags({result.name: result.id})
+            logging.info(f"Tag created: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error creating tag: {e}")
+            return None
+
+    async def update(self, id: int, input: TagInputDto) -> TagOutputDto | None:
+        """Update a tag by its ID."""
+        logging.info(f"Updating tag with ID: {id} and input: {input}")
+        tag = await self.repository.get(id)
+        if tag is None:
+            return None
+
+        tag.name = input.name
+        tag.creation_date = input.creation_date
+        tag.update_date = input.update_date
+        try:
+            await self.repository.update(tag)
+            self.cache.clear()
+            if self.index:
+                self.index.invalidate()
+            result = TagOutputDto._to_dto(tag)
+            logging.info(f"Tag updated: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error updating tag: {e}")
+            return None
+
+    async def delete(self, id: int) -> None:
+        """Delete a tag by its ID."""
+        logging.info(f"Deleting tag with ID: {id}")
+        tag = await self.repository.get(id)
+        if tag:
+            try:
+                await self.repository.delete(tag)
+                self.cache.invalidate(tag.name)
+                if self.index:
+                    self.index.remove_tags([id])
+                logging.info(f"Tag deleted: {id}")
+            except SQLAlchemyError as e:
+                logging.error(f"Error deleting tag: {e}")
+
+    async def delete_tags(self, file_id: int, tag_ids: List[int]) -> None:
+        """Remove a tag from a specific file."""
+        logging.info(f"Deleting tags from file ID: {file_id} with tag IDs: {tag_ids}")
+        query = file_tags.delete().where(
+            file_tags.c.file_id == file_id,
+            file_tags.c.tag_id.in_(tag_ids),
+        )
+
+        async def operations(session: AsyncSession) -> None:
+            if (await session.execute(query)).rowcount:
+                await session.execute(_touch_query([file_id]))
+
+        try:
+            await self.repository.transaction(operations)
+            if self.index:
+                self.index.unlink([file_id], tag_ids)
+            logging.info(f"Tags deleted from file ID: {file_id}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting tags from file: {e}")
+
+    async def add_tag(self, file_id: int, tag_id: int) -> None:
+        """Add a tag to a file if it doesn't already have it."""
+        logging.info(f"Adding tag ID: {tag_id} to file ID: {file_id}")
+        query = self.repository.insert(file_tags).values(file_id=file_id, tag_id=tag_id)
+
+        async def operations(session: AsyncSession) -> None:
+            if (await session.execute(query.on_conflict_do_nothing())).rowcount:
+                await session.execute(_touch_query([file_id]))
+
+        try:
+            await self.repository.transaction(operations)
+            if self.index:
+                self.index.link([file_id], [tag_id])
+            logging.info(f"Tag ID: {tag_id} added to file ID: {file_id}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding tag to file: {e}")
+
+    async def get_ids(self, names: List[str]) -> Dict[str, int]:
+        """Return the ids of the live local tags with the given names, cached by name."""
+        names = list(dict.fromkeys(names))
+        result = self.cache.get_many(names)
+        missing = [name for name in names if name not in result]
+        if not missing:
+            return result
+
+        try:
+            async with self.repository.get_session() as session:
+                found = dict((await session.execute(_ids_query(missing))).all())
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving tag ids: {e}")
+            return result
+        self.cache.put_many(found)
+        return {**result, **found}
+
+    async def resolve(self, names: List[str], session: AsyncSession) -> Dict[str, int]:
+        """Return the ids of the local tags with the given names, creating the missing ones.
+
+        Names already cached are live tags, so a fully cached call runs no statement.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        cached = self.cache.get_many(names)
+        if len(cached) == len(names):
+            return cached
+
+        insert, revive, query = _resolve_queries(self.repository.insert(), names)
+        await session.execute(insert)
+        await session.execute(revive)
+        return dict((await session.execute(query)).all())
+
+    async def add_tags_to_files(
+        self, files: Select | List[int], names: List[str]
+    ) -> int:
+        """Attach tags to files with one statement per batch, creating the missing tags.
+
+        The files are a query of file ids or a list of ids, attached in batches.
+        """
+        logging.info(f"Adding tags: {names} to files")
+        batches = _file_batches(files)
+        added, tags, linked = 0, {}, []
+
+        async def operations(session: AsyncSession) -> None:
+            nonlocal added, tags
+            tags = await self.resolve(names, session)
+            tag_ids = list(tags.values())
+            if not tag_ids:
+                return
+            for batch in batches:
+                # Read before linking, a query with NOT no longer matches the files after
+                ids = list((await session.execute(batch)).scalars())
+                linked.extend(ids)
+                query = _link_query(self.repository.insert(file_tags), batch, tag_ids)
+                rowcount = (await session.execute(query)).rowcount
+                if rowcount:
+                    for touch in _touch_queries(ids):
+                        await session.execute(touch)
+                added += rowcount
+
+        try:
+            await self.repository.transaction(operations)
+            self.cache.put_many(tags)
+            if self.index:
+                self.index.add_tags(tags)
+                self.index.link(linked, tags.values())
+            logging.info(f"Tags attached to files: {added}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding tags to files: {e}")
+        return added
+
+    async def delete_tags_from_files(
+        self, files: Select | List[int], names: List[str]
+    ) -> int:
+        """Detach tags from files with one statement."""
+        logging.info(f"Deleting tags: {names} from files")
+        files, tag_ids, query = _unlink_queries(files, names)
+        deleted, unlinked, unlinked_tags = 0, [], []
+
+        async def operations(session: AsyncSession) -> None:
+            nonlocal deleted
+            # The ids are read before the links go, the query of the files depends on them
+            unlinked.extend((await session.execute(files)).scalars())
+            if self.index:
+                unlinked_tags.extend((await session.execute(tag_ids)).scalars())
+            deleted = (await session.execute(query)).rowcount
+            if deleted:
+                for touch in _touch_queries(unlinked):
+                    await session.execute(touch)
+
+        try:
+            await self.repository.transaction(operations)
+            if self.index:
+                self.index.unlink(unlinked, unlinked_tags)
+            logging.info(f"Tags detached from files: {deleted}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting tags from files: {e}")
+        return deleted
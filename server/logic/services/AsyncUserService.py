@@ -0,0 +1,107 @@
+from sqlalchemy.exc import SQLAlchemyError
+
+import logging
+
+from logic.cache import LRUCache
+from logic.dtos import UserInputDto, UserOutputDto
+from data import User, AsyncRepository, USER_CACHE_SIZE
+from .UserService import _id_query, _replica_id_query
+
+__all__ = ["AsyncUserService"]
+
+
+class AsyncUserService:
+    """UserService over an async repository, for use from an asyncio loop."""
+
+    def __init__(self, repository: AsyncRepository[User]):
+        self.repository = repository
+        self.cache: LRUCache[str, int] = LRUCache(USER_CACHE_SIZE)
+
+    async def get(self, input: UserInputDto) -> User | None:
+        """Retrieve a user based on the provided input DTO."""
+        logging.info(f"Getting user with input: {input}")
+        params = {
+            key: value for key, value in input.to_dict().items() if value is not None
+        }
+        query = self.repository.get_query().filter_by(**params)
+        try:
+            result = await self.repository.first(query)
+            logging.info(f"User retrieved: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving user: {e}")
+            return None
+
+    async def get_id(self, name: str) -> int | None:
+        """Retrieve the ID of a live local user by name, cached by name."""
+        id = self.cache.get(name)
+        if id is not None:
+            return id
+
+        try:
+            async with self.repository.get_session() as session:
+                id = (await session.execute(_id_query(name))).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving user ID: {e}")
+            return None
+        if id is not None:
+            self.cache.put(name, id)
+        return id
+
+    async def get_replica_id(self, name: str, owner: str) -> int | None:
+        """Retrieve the ID a live user has on its owner node from the replica rows."""
+        try:
+            async with self.repository.get_session() as session:
+                return (await session.execute(_replica_id_query(name, owner))).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving replica user ID: {e}")
+            return None
+
+    async def create(self, input: UserInputDto) -> UserOutputDto | None:
+        """Create a new user."""
+        logging.info(f"Creating user with input: {input}")
+        user = User(
+            name=input.name,
+            creation_date=input.creation_date,
+            update_date=input.update_date,
+        )
+        try:
+            result = await self.repository.create(user, UserOutputDto._to_dto)
+            self.cache.put(result.name, result.id)
+            logging.info(f"User created: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error creating user: {e}")
+            return None
+
+    async def update(self, id: int, input: UserInputDto) -> UserOutputDto | None:
+        """Update a user by its ID."""
+        logging.info(f"Updating user with ID: {id} and input: {input}")
+        user = await self.repository.get(id)
+        if user is None:
+            return None
+
+        user.name = input.name
+        user.creation_date = input.creation_date
+        user.update_date = input.update_date
+        try:
+            await self.repository.update(user)
+            self.cache.clear()
+            result = UserOutputDto._to_dto(user)
+            logging.info(f"User updated: {result}")
+            return result
+        except SQLAlchemyError as e:
+            logging.error(f"Error updating user: {e}")
+            return None
+
+    async def delete(self, id: int) -> None:
+        """Delete a user by its ID."""
+        logging.info(f"Deleting user with ID: {id}")
+        user = await self.repository.get(id)
+        if user:
+            try:
+                await self.repository.delete(user)
+                self.cache.invalidate(user.name)
+                logging.info(f"User deleted: {id}")
+            except SQLAlchemyError as e:
+                logging.error(f"Error deleting user: {e}")
@@ -1,17 +1,92 @@
+from sqlalchemy import Select, Update, delete, false, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
 
 import logging
 
 from logic.dtos import FileInputDto, FileOutputDto
-from data import File, file_tags, Repository
+from logic.tag_index import TagIndex
+from logic.tag_query import compile_tag_query
+from data import File, Tag, User, file_tags, Repository, LOCAL_OWNER
 
 __all__ = ["FileService"]
 
 
+def _live_files(owner: str = LOCAL_OWNER) -> Tuple[Select, Any]:
+    """Select the listing columns of the live files of an owner and the column they page by.
+
+    Replica rows show the ids they have on their owner node, so pages and cursors match.
+    """
+    replica = owner != LOCAL_OWNER
+    key = File.origin_id if replica else File.id
+    user_id = User.origin_id if replica else File.user_id
+    query = select(
+        File.id.label("row_id"),
+        key.label("id"),
+        File.name,
+        File.file_type,
+        File.size,
+        user_id.label("user_id"),
+        File.creation_date,
+        File.update_date,
+    ).select_from(File)
+    if replica:
+        query = query.join(User, User.id == File.user_id)
+    query = query.where(File.owner == owner, File.deleted == false()).order_by(key)
+    return query, key
+
+
+def _tag_names_query(file_ids: List[int]) -> Select:
+    """Select the names of the live tags of the files with the given row IDs."""
+    # Links share the owner of their file, filtering by file keeps the primary key lookup
+    return (
+        select(file_tags.c.file_id, Tag.name)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(file_tags.c.file_id.in_(file_ids), Tag.deleted == false())
+        .order_by(file_tags.c.file_id, Tag.name)
+    )
+
+
+def _ids_by_tag_query(
+    tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+) -> Select:
+    """Select the ids of the live local files matching a tag query."""
+    return select(File.id).where(
+        File.owner == LOCAL_OWNER,
+        File.deleted == false(),
+        compile_tag_query(tag_query, tag_ids),
+    )
+
+
+def _delete_query(files: Select) -> Update:
+    """Mark the files selected by a query of ids as deleted."""
+    return (
+        update(File)
+        .where(File.id.in_(files))
+        .values(deleted=True, update_date=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _page_query(
+    tag_query: List[str],
+    limit: int,
+    after_id: int,
+    tag_ids: Optional[Dict[str, int]],
+    owner: str,
+) -> Select:
+    """Select the next live files of an owner matching a tag query after a file ID."""
+    query, key = _live_files(owner)
+    query = query.where(key > after_id, compile_tag_query(tag_query, tag_ids, owner))
+    return query.limit(limit)
+
+
 class FileService:
-    def __init__(self, repository: Repository[File]):
+    def __init__(self, repository: Repository[File], index: Optional[TagIndex] = None):
         self.repository = repository
+        self.index = index
 
     def get(self, input: FileInputDto) -> File | None:
         """Retrieve a file based on the provided input DTO."""
@@ -28,6 +103,18 @@ class FileService:
             logging.error(f"Error retrieving file: {e}")
             return None
 
+    def get_by_name(self, name: str, file_type: str, user_id: int) -> File | None:
+        """Retrieve the local file of a user with a name and type, deleted or not."""
+        logging.info(f"Getting file {name}.{file_type} of user ID: {user_id}")
+        query = self.repository.get_query().filter_by(
+            name=name, file_type=file_type, user_id=user_id
+        )
+        try:
+            return self.repository.first(query)
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving file: {e}")
+            return None
+
     def get_by_tags(self, ids: List[int]) -> List[File]:
         """Retrieve files associated with the given tag IDs."""
         query = self.repository.get_query().select_from(File).join(file_tags)
@@ -39,6 +126,80 @@ class FileService:
             print(f"Error retrieving files by tags: {e}")
             return []
 
+    def _listing(self, query: Select) -> List[FileOutputDto]:
+        """Build the DTOs of the files selected by a query with their tags in two queries."""
+        try:
+            with self.repository.get_session() as session:
+                rows = self.repository.rows(query, session)
+                tags = self._tag_names([row.row_id for row in rows], session)
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving listing of files: {e}")
+            return []
+        return [FileOutputDto._from_row(row, tags.get(row.row_id, [])) for row in rows]
+
+    def _tag_names(self, file_ids: List[int], session: Session) -> Dict[int, List[str]]:
+        """Return the names of the live tags of each file by its row ID."""
+        result: Dict[int, List[str]] = {}
+        if not file_ids:
+            return result
+        for file_id, name in self.repository.rows(_tag_names_query(file_ids), session):
+            result.setdefault(file_id, []).append(name)
+        return result
+
+    def get_listing(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> List[FileOutputDto]:
+        """Retrieve the live files matching a tag query with their tags, in ID order."""
+        query, _ = _live_files()
+        return self._listing(query.where(compile_tag_query(tag_query, tag_ids)))
+
+    def get_listing_page(
+        self,
+        tag_query: List[str],
+        limit: int,
+        after_id: int = 0,
+        tag_ids: Optional[Dict[str, int]] = None,
+        owner: str = LOCAL_OWNER,
+    ) -> List[FileOutputDto]:
+        """Retrieve the next live files of an owner matching a tag query after a file ID."""
+        query = _page_query(tag_query, limit, after_id, tag_ids, owner)
+        return self._listing(query)
+
+    def get_listing_by_ids(self, ids: List[int]) -> List[FileOutputDto]:
+        """Retrieve the live files with the given IDs with their tags, in ID order."""
+        query, _ = _live_files()
+        return self._listing(query.where(File.id.in_(ids)))
+
+    def get_ids_by_tag_query(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> Select:
+        """Return a query of the ids of the live local files matching a tag query."""
+        return _ids_by_tag_query(tag_query, tag_ids)
+
+    def delete_by_tag_query(
+        self, tag_query: List[str], tag_ids: Optional[Dict[str, int]] = None
+    ) -> int:
+        """Mark the live files matching a tag query as deleted with one statement."""
+        logging.info(f"Deleting files with tag query: {tag_query}")
+        files = _ids_by_tag_query(tag_query, tag_ids)
+        query = _delete_query(files)
+        deleted, removed = 0, []
+
+        def operations(session: Session) -> None:
+            nonlocal deleted
+            if self.index:
+                removed.extend(session.execute(files).scalars())
+            deleted = session.execute(query).rowcount
+
+        try:
+            self.repository.transaction(operations)
+            if self.index:
+                self.index.remove_files(removed)
+            logging.info(f"Files deleted: {deleted}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting files by tag query: {e}")
+        return deleted
+
     def create(self, input: FileInputDto) -> FileOutputDto | None:
         """Create a new file with the given input DTO."""
         logging.info(f"Creating file with input: {input}")
@@ -52,6 +213,8 @@ class FileService:
         )
         try:
             result = self.repository.create(file, FileOutputDto._to_dto)
+            if self.index:
+                self.index.add_files([result.id])
             logging.info(f"File created: {result}")
             return result
         except SQLAlchemyError as e:
@@ -59,20 +222,31 @@ class FileService:
             return None
 
     def update(self, id: int, input: FileInputDto) -> FileOutputDto | None:
-        """Update an existing file by its ID."""
+        """Update an existing file by its ID, a deleted one comes back without its tags."""
         logging.info(f"Updating file with ID: {id} and input: {input}")
         file = self.repository.get(id)
         if file is None:
             return None
 
+        revived = file.deleted
         file.name = input.name
         file.file_type = input.file_type
         file.size = input.size
         file.user_id = input.user_id
         file.creation_date = input.creation_date
         file.update_date = input.update_date
+        file.deleted = False
+        unlink = delete(file_tags).where(file_tags.c.file_id == id)
+
+        def operations(session: Session) -> None:
+            session.merge(file)
+            if revived:
+                session.execute(unlink)
+
         try:
-            self.repository.update(file)
+            self.repository.transaction(operations)
+            if revived and self.index:
+                self.index.add_files([id])
             result = FileOutputDto._to_dto(file)
             logging.info(f"File updated: {result}")
             return result
@@ -87,6 +261,8 @@ class FileService:
         if file:
             try:
                 self.repository.delete(file)
+                if self.index:
+                    self.index.remove_files([id])
                 logging.info(f"File deleted: {id}")
             except SQLAlchemyError as e:
                 logging.error(f"Error deleting file: {e}")
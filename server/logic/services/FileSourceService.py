@@ -1,10 +1,13 @@
+from sqlalchemy import false, update
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime
 
 import logging
 
 from logic.dtos import FileSourceInputDto, FileSourceOutputDto
-from data import FileSource, file_tags, Repository
+from data import FileSource, file_tags, Repository, LOCAL_OWNER, QUERY_BATCH_SIZE
 
 __all__ = ["FileSourceService"]
 
@@ -54,6 +57,64 @@ class FileSourceService:
             print(f"Error retrieving file sources by tag ID: {e}")
             return []
 
+    def get_chunks(self, file_id: int) -> List[FileSource]:
+        """Retrieve the live local chunks of a file in order."""
+        query = (
+            self.repository.get_query()
+            .filter(FileSource.file_id == file_id, FileSource.deleted == false())
+            .order_by(FileSource.chunk_index)
+        )
+        try:
+            return self.repository.all(query)
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving chunks of file: {e}")
+            return []
+
+    def replace_chunks(self, file_id: int, inputs: List[FileSourceInputDto]) -> int:
+        """Replace the chunks of a file in one transaction, marking the old ones deleted."""
+        logging.info(f"Replacing chunks of file ID: {file_id} with {len(inputs)} chunks")
+        now = datetime.now()
+        query = (
+            update(FileSource)
+            .where(
+                FileSource.owner == LOCAL_OWNER,
+                FileSource.file_id == file_id,
+                FileSource.deleted == false(),
+            )
+            .values(deleted=True, update_date=now)
+            .execution_options(synchronize_session=False)
+        )
+
+        def rows(inputs: List[FileSourceInputDto]) -> List[dict]:
+            return [
+                {
+                    "file_id": file_id,
+                    "chunk_index": input.chunk_index,
+                    "chunk_hash": input.chunk_hash,
+                    "codec": input.codec,
+                    "chunk_size": input.chunk_size,
+                    "url": input.url,
+                    "owner": LOCAL_OWNER,
+                    "creation_date": now,
+                    "update_date": now,
+                }
+                for input in inputs
+            ]
+
+        def operations(session: Session) -> None:
+            session.execute(query)
+            # Large files have thousands of chunks, their rows are built a batch at a time
+            for i in range(0, len(inputs), QUERY_BATCH_SIZE):
+                batch = inputs[i : i + QUERY_BATCH_SIZE]
+                session.execute(self.repository.insert(), rows(batch))
+
+        try:
+            self.repository.transaction(operations)
+            return len(inputs)
+        except SQLAlchemyError as e:
+            logging.error(f"Error replacing chunks of file: {e}")
+            raise e
+
     def create(self, input: FileSourceInputDto) -> FileSourceOutputDto | None:
         """Create a new file source with the given input DTO."""
         logging.info(f"Creating file source with input: {input}")
@@ -61,6 +122,9 @@ class FileSourceService:
             file_id=input.file_id,
             chunk_size=input.chunk_size,
             url=input.url,
+            chunk_index=input.chunk_index,
+            chunk_hash=input.chunk_hash,
+            codec=input.codec,
             creation_date=input.creation_date,
             update_date=input.update_date,
         )
@@ -82,6 +146,9 @@ class FileSourceService:
         source.file_id = input.file_id
         source.chunk_size = input.chunk_size
         source.url = input.url
+        source.chunk_index = input.chunk_index
+        source.chunk_hash = input.chunk_hash
+        source.codec = input.codec
         source.creation_date = input.creation_date
         source.update_date = input.update_date
         try:
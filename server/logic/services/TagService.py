@@ -1,17 +1,104 @@
+from sqlalchemy import Delete, Executable, Insert, Select, String, Update
+from sqlalchemy import delete, false, literal, select, true, update
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
 
 import logging
 
 from logic.dtos import TagInputDto, TagOutputDto
-from data import Tag, Repository, file_tags
+from logic.tag_index import TagIndex
+from logic.cache import LRUCache
+from data import File, Tag, Repository, file_tags, LOCAL_OWNER, QUERY_BATCH_SIZE
+from data import TAG_CACHE_SIZE
 
 __all__ = ["TagService"]
 
 
+def _ids_query(names: List[str]) -> Select:
+    """Select the names and ids of the live local tags with the given names."""
+    return select(Tag.name, Tag.id).where(
+        Tag.owner == LOCAL_OWNER, Tag.deleted == false(), Tag.name.in_(names)
+    )
+
+
+def _resolve_queries(insert: Insert, names: List[str]) -> Tuple[Executable, ...]:
+    """Return the statements that create or revive the local tags and select their ids."""
+    now = datetime.now()
+    values = [
+        {"name": name, "owner": LOCAL_OWNER, "creation_date": now, "update_date": now}
+        for name in names
+    ]
+    revive = (
+        update(Tag)
+        .where(Tag.owner == LOCAL_OWNER, Tag.name.in_(names), Tag.deleted == true())
+        .values(deleted=False, update_date=now)
+    )
+    query = select(Tag.name, Tag.id).where(Tag.owner == LOCAL_OWNER, Tag.name.in_(names))
+    return insert.values(values).on_conflict_do_nothing(), revive, query
+
+
+def _file_batches(files: Select | List[int]) -> List[Select]:
+    """Return the queries of file ids to attach tags to, a list of ids goes in batches."""
+    if not isinstance(files, list):
+        return [files]
+    return [
+        select(File.id).where(File.id.in_(files[i : i + QUERY_BATCH_SIZE]))
+        for i in range(0, len(files), QUERY_BATCH_SIZE)
+    ]
+
+
+def _link_query(insert: Insert, batch: Select, tag_ids: List[int]) -> Insert:
+    """Link every file of a query of ids to every tag, skipping the existing links."""
+    file_ids = batch.subquery()
+    source = (
+        select(file_ids.c[0], Tag.id, literal(LOCAL_OWNER, String))
+        .select_from(file_ids)
+        .join(Tag, true())
+        .where(Tag.id.in_(tag_ids))
+    )
+    return insert.from_select(["file_id", "tag_id", "owner"], source).on_conflict_do_nothing()
+
+
+def _unlink_queries(
+    files: Select | List[int], names: List[str]
+) -> Tuple[Select, Select, Delete]:
+    """Return the queries of the files and tags to unlink and the delete of their links."""
+    if isinstance(files, list):
+        files = select(File.id).where(File.id.in_(files))
+    tag_ids = select(Tag.id).where(Tag.owner == LOCAL_OWNER, Tag.name.in_(names))
+    query = delete(file_tags).where(
+        file_tags.c.owner == LOCAL_OWNER,
+        file_tags.c.file_id.in_(files),
+        file_tags.c.tag_id.in_(tag_ids),
+    )
+    return files, tag_ids, query
+
+
+def _touch_query(files: List[int]) -> Update:
+    """Update the files whose links changed, their links replicate with them."""
+    return (
+        update(File)
+        .where(File.id.in_(files))
+        .values(update_date=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _touch_queries(files: List[int]) -> List[Update]:
+    """Return the updates of a list of files whose links changed, in batches."""
+    return [
+        _touch_query(files[i : i + QUERY_BATCH_SIZE])
+        for i in range(0, len(files), QUERY_BATCH_SIZE)
+    ]
+
+
 class TagService:
-    def __init__(self, repository: Repository[Tag]):
+    def __init__(self, repository: Repository[Tag], index: Optional[TagIndex] = None):
         self.repository = repository
+        self.index = index
+        self.cache: LRUCache[str, int] = LRUCache(TAG_CACHE_SIZE)
 
     def get(self, input: TagInputDto) -> Tag | None:
         """Retrieve a tag based on the provided input DTO."""
@@ -47,6 +134,9 @@ class TagService:
         )
         try:
             result = self.repository.create(tag, TagOutputDto._to_dto)
+            self.cache.put(result.name, result.id)
+            if self.index:
+                self.index.add_tags({result.name: result.id})
             logging.info(f"Tag created: {result}")
             return result
         except SQLAlchemyError as e:
@@ -65,6 +155,9 @@ class TagService:
         tag.update_date = input.update_date
         try:
             self.repository.update(tag)
+            self.cache.clear()
+            if self.index:
+                self.index.invalidate()
             result = TagOutputDto._to_dto(tag)
             logging.info(f"Tag updated: {result}")
             return result
@@ -79,6 +172,9 @@ class TagService:
         if tag:
             try:
                 self.repository.delete(tag)
+                self.cache.invalidate(tag.name)
+                if self.index:
+                    self.index.remove_tags([id])
                 logging.info(f"Tag deleted: {id}")
             except SQLAlchemyError as e:
                 logging.error(f"Error deleting tag: {e}")
@@ -86,32 +182,134 @@ class TagService:
     def delete_tags(self, file_id: int, tag_ids: List[int]) -> None:
         """Remove a tag from a specific file."""
         logging.info(f"Deleting tags from file ID: {file_id} with tag IDs: {tag_ids}")
-        with self.repository.get_session() as session:
-            try:
-                query = file_tags.delete().where(
-                    file_tags.c.file_id == file_id,
-                    file_tags.c.tag_id.in_(tag_ids),
-                )
-                session.execute(query)
-                session.commit()
-                logging.info(f"Tags deleted from file ID: {file_id}")
-            except SQLAlchemyError as e:
-                session.rollback()
-                logging.error(f"Error deleting tags from file: {e}")
+        query = file_tags.delete().where(
+            file_tags.c.file_id == file_id,
+            file_tags.c.tag_id.in_(tag_ids),
+        )
+        def operations(session: Session) -> None:
+            if session.execute(query).rowcount:
+                session.execute(_touch_query([file_id]))
+
+        try:
+            self.repository.transaction(operations)
+            if self.index:
+                self.index.unlink([file_id], tag_ids)
+            logging.info(f"Tags deleted from file ID: {file_id}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting tags from file: {e}")
 
     def add_tag(self, file_id: int, tag_id: int) -> None:
         """Add a tag to a file if it doesn't already have it."""
         logging.info(f"Adding tag ID: {tag_id} to file ID: {file_id}")
         params = {"file_id": file_id, "tag_id": tag_id}
-        with self.repository.get_session() as session:
-            try:
-                query = file_tags.select().filter_by(**params)
-                result = session.execute(query)
-                if result.one_or_none() is None:
-                    query = file_tags.insert().values(**params)
-                    session.execute(query)
-                session.commit()
-                logging.info(f"Tag ID: {tag_id} added to file ID: {file_id}")
-            except SQLAlchemyError as e:
-                session.rollback()
-                logging.error(f"Error adding tag to file: {e}")
+
+        def operations(session) -> None:
+            result = session.execute(file_tags.select().filter_by(**params))
+            if result.one_or_none() is None:
+                session.execute(file_tags.insert().values(**params))
+                session.execute(_touch_query([file_id]))
+
+        try:
+            self.repository.transaction(operations)
+            if self.index:
+                self.index.link([file_id], [tag_id])
+            logging.info(f"Tag ID: {tag_id} added to file ID: {file_id}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding tag to file: {e}")
+
+    def get_ids(self, names: List[str]) -> Dict[str, int]:
+        """Return the ids of the live local tags with the given names, cached by name."""
+        names = list(dict.fromkeys(names))
+        result = self.cache.get_many(names)
+        missing = [name for name in names if name not in result]
+        if not missing:
+            return result
+
+        try:
+            with self.repository.get_session() as session:
+                found = dict(session.execute(_ids_query(missing)).all())
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving tag ids: {e}")
+            return result
+        self.cache.put_many(found)
+        return {**result, **found}
+
+    def resolve(self, names: List[str], session: Session) -> Dict[str, int]:
+        """Return the ids of the local tags with the given names, creating the missing ones.
+
+        Names already cached are live tags, so a fully cached call runs no statement.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        cached = self.cache.get_many(names)
+        if len(cached) == len(names):
+            return cached
+
+        insert, revive, query = _resolve_queries(self.repository.insert(), names)
+        session.execute(insert)
+        session.execute(revive)
+        return dict(session.execute(query).all())
+
+    def add_tags_to_files(self, files: Select | List[int], names: List[str]) -> int:
+        """Attach tags to files with one statement per batch, creating the missing tags.
+
+        The files are a query of file ids or a list of ids, attached in batches.
+        """
+        logging.info(f"Adding tags: {names} to files")
+        batches = _file_batches(files)
+        added, tags, linked = 0, {}, []
+
+        def operations(session: Session) -> None:
+            nonlocal added, tags
+            tags = self.resolve(names, session)
+            tag_ids = list(tags.values())
+            if not tag_ids:
+                return
+            for batch in batches:
+                # Read before linking, a query with NOT no longer matches the files after
+                ids = list(session.execute(batch).scalars())
+                linked.extend(ids)
+                query = _link_query(self.repository.insert(file_tags), batch, tag_ids)
+                rowcount = session.execute(query).rowcount
+                if rowcount:
+                    for touch in _touch_queries(ids):
+                        session.execute(touch)
+                added += rowcount
+
+        try:
+            self.repository.transaction(operations)
+            self.cache.put_many(tags)
+            if self.index:
+                self.index.add_tags(tags)
+                self.index.link(linked, tags.values())
+            logging.info(f"Tags attached to files: {added}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding tags to files: {e}")
+        return added
+
+    def delete_tags_from_files(self, files: Select | List[int], names: List[str]) -> int:
+        """Detach tags from files with one statement."""
+        logging.info(f"Deleting tags: {names} from files")
+        files, tag_ids, query = _unlink_queries(files, names)
+        deleted, unlinked, unlinked_tags = 0, [], []
+
+        def operations(session: Session) -> None:
+            nonlocal deleted
+            # The ids are read before the links go, the query of the files depends on them
+            unlinked.extend(session.execute(files).scalars())
+            if self.index:
+                unlinked_tags.extend(session.execute(tag_ids).scalars())
+            deleted = session.execute(query).rowcount
+            if deleted:
+                for touch in _touch_queries(unlinked):
+                    session.execute(touch)
+
+        try:
+            self.repository.transaction(operations)
+            if self.index:
+                self.index.unlink(unlinked, unlinked_tags)
+            logging.info(f"Tags detached from files: {deleted}")
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting tags from files: {e}")
+        return deleted
@@ -1,16 +1,33 @@
+from sqlalchemy import Select, false, select
 from sqlalchemy.exc import SQLAlchemyError
 
 import logging
 
+from logic.cache import LRUCache
 from logic.dtos import UserInputDto, UserOutputDto
-from data import User, Repository
+from data import User, Repository, LOCAL_OWNER, USER_CACHE_SIZE
 
 __all__ = ["UserService"]
 
 
+def _id_query(name: str) -> Select:
+    """Select the ID of the live local user with a name."""
+    return select(User.id).where(
+        User.owner == LOCAL_OWNER, User.deleted == false(), User.name == name
+    )
+
+
+def _replica_id_query(name: str, owner: str) -> Select:
+    """Select the ID a live user has on its owner node from the replica rows."""
+    return select(User.origin_id).where(
+        User.owner == owner, User.deleted == false(), User.name == name
+    )
+
+
 class UserService:
     def __init__(self, repository: Repository[User]):
         self.repository = repository
+        self.cache: LRUCache[str, int] = LRUCache(USER_CACHE_SIZE)
 
     def get(self, input: UserInputDto) -> User | None:
         """Retrieve a user based on the provided input DTO."""
@@ -27,6 +44,31 @@ class UserService:
             logging.error(f"Error retrieving user: {e}")
             return None
 
+    def get_id(self, name: str) -> int | None:
+        """Retrieve the ID of a live local user by name, cached by name."""
+        id = self.cache.get(name)
+        if id is not None:
+            return id
+
+        try:
+            with self.repository.get_session() as session:
+                id = session.execute(_id_query(name)).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving user ID: {e}")
+            return None
+        if id is not None:
+            self.cache.put(name, id)
+        return id
+
+    def get_replica_id(self, name: str, owner: str) -> int | None:
+        """Retrieve the ID a live user has on its owner node from the replica rows."""
+        try:
+            with self.repository.get_session() as session:
+                return session.execute(_replica_id_query(name, owner)).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"Error retrieving replica user ID: {e}")
+            return None
+
     def create(self, input: UserInputDto) -> UserOutputDto | None:
         """Create a new user."""
         logging.info(f"Creating user with input: {input}")
@@ -37,6 +79,7 @@ class UserService:
         )
         try:
             result = self.repository.create(user, UserOutputDto._to_dto)
+            self.cache.put(result.name, result.id)
             logging.info(f"User created: {result}")
             return result
         except SQLAlchemyError as e:
@@ -55,6 +98,7 @@ class UserService:
         user.update_date = input.update_date
         try:
             self.repository.update(user)
+            self.cache.clear()
             result = UserOutputDto._to_dto(user)
             logging.info(f"User updated: {result}")
             return result
@@ -69,6 +113,7 @@ class UserService:
         if user:
             try:
                 self.repository.delete(user)
+                self.cache.invalidate(user.name)
                 logging.info(f"User deleted: {id}")
             except SQLAlchemyError as e:
                 logging.error(f"Error deleting user: {e}")
@@ -2,3 +2,7 @@ from .FileSourceService import *
 from .FileService import *
 from .UserService import *
 from .TagService import *
+from .AsyncFileSourceService import *
+from .AsyncFileService import *
+from .AsyncUserService import *
+from .AsyncTagService import *
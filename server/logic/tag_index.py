@@ -0,0 +1,154 @@
+from sqlalchemy import false, select
+from typing import Dict, Iterable, List
+
+import logging, threading
+
+from data import File, Tag, file_tags, get_engine, LOCAL_OWNER
+from .bitmap import RoaringBitmap
+from .tag_query import TagAnd, TagExpression, TagNot, TagTerm, parse_tag_query
+
+__all__ = ["TagIndex"]
+
+
+class TagIndex:
+    """In-memory bitmaps of the live local files of every live local tag.
+
+    It loads lazily on the first query and the services keep it in sync after each commit.
+    Its version grows with every change, so results read from it can be told stale.
+    """
+
+    def __init__(self, db_url: str) -> None:
+        self.db_url = db_url
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._tags: Dict[str, int] = {}
+        self._bitmaps: Dict[int, RoaringBitmap] = {}
+        self._files = RoaringBitmap()
+        self.version = 0
+
+    def load(self) -> None:
+        """Build the bitmaps from the local store."""
+        tags = select(Tag.name, Tag.id).where(
+            Tag.owner == LOCAL_OWNER, Tag.deleted == false()
+        )
+        files = select(File.id).where(File.owner == LOCAL_OWNER, File.deleted == false())
+        links = (
+            select(file_tags.c.tag_id, file_tags.c.file_id)
+            .join(File, File.id == file_tags.c.file_id)
+            .where(
+                file_tags.c.owner == LOCAL_OWNER,
+                File.owner == LOCAL_OWNER,
+                File.deleted == false(),
+            )
+            .order_by(file_tags.c.tag_id)
+        )
+        with self._lock:
+            with get_engine(self.db_url).connect() as conn:
+                self._tags = dict(conn.execute(tags).all())
+                self._files = RoaringBitmap(conn.execute(files).scalars())
+                groups: Dict[int, List[int]] = {}
+                for tag_id, file_id in conn.execute(links):
+                    groups.setdefault(tag_id, []).append(file_id)
+            # Bitmaps only hold live files, so only NOT needs the set of all files
+            self._bitmaps = {
+                tag_id: RoaringBitmap(file_ids) for tag_id, file_ids in groups.items()
+            }
+            self._loaded = True
+        logging.info(f"Tag index loaded with {len(self._tags)} tags")
+
+    def invalidate(self) -> None:
+        """Drop the bitmaps so the next query reloads them from the store."""
+        with self._lock:
+            self._loaded = False
+            self._tags, self._bitmaps = {}, {}
+            self._files = RoaringBitmap()
+            self.version += 1
+
+    # region Sync
+    def add_tags(self, tags: Dict[str, int]) -> None:
+        with self._lock:
+            self.version += 1
+            if self._loaded:
+                self._tags.update(tags)
+
+    def remove_tags(self, tag_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.version += 1
+            if not self._loaded:
+                return
+            tag_ids = set(tag_ids)
+            self._tags = {n: id for n, id in self._tags.items() if id not in tag_ids}
+            for tag_id in tag_ids:
+                self._bitmaps.pop(tag_id, None)
+
+    def add_files(self, file_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.version += 1
+            if self._loaded:
+                self._files.update(file_ids)
+
+    def remove_files(self, file_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.version += 1
+            if not self._loaded:
+                return
+            removed = RoaringBitmap(file_ids)
+            self._files.difference_update(removed)
+            for bitmap in self._bitmaps.values():
+                bitmap.difference_update(removed)
+
+    def link(self, file_ids: Iterable[int], tag_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.version += 1
+            if not self._loaded:
+                return
+            file_ids = list(file_ids)
+            for tag_id in tag_ids:
+                self._bitmaps.setdefault(tag_id, RoaringBitmap()).update(file_ids)
+
+    def unlink(self, file_ids: Iterable[int], tag_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.version += 1
+            if not self._loaded:
+                return
+            deleted = RoaringBitmap(file_ids)
+            for tag_id in tag_ids:
+                bitmap = self._bitmaps.get(tag_id)
+                if bitmap is not None:
+                    bitmap.difference_update(deleted)
+
+    # endregion
+
+    def _evaluate(self, expression: TagExpression) -> RoaringBitmap:
+        if isinstance(expression, TagTerm):
+            tag_id = self._tags.get(expression.name)
+            return self._bitmaps.get(tag_id, RoaringBitmap())
+        if isinstance(expression, TagNot):
+            return self._files - self._evaluate(expression.operand)
+
+        operands = [self._evaluate(operand) for operand in expression.operands]
+        result = operands[0]
+        for operand in operands[1:]:
+            result = result & operand if isinstance(expression, TagAnd) else result | operand
+        return result
+
+    def query(self, tag_query: List[str]) -> RoaringBitmap:
+        """Return the live local files matching a tag query."""
+        expression = parse_tag_query(tag_query)
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            if expression is None:
+                return self._files.copy()
+            return self._evaluate(expression).copy()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the size of the index and the approximate bytes it uses."""
+        with self._lock:
+            return {
+                "tags": len(self._tags),
+                "files": len(self._files),
+                "links": sum(len(bitmap) for bitmap in self._bitmaps.values()),
+                "memory": self._files.memory_usage()
+                + sum(bitmap.memory_usage() for bitmap in self._bitmaps.values()),
+            }
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+from sqlalchemy import ColumnElement, and_, exists, false, func, not_, or_, select, true
+from typing import Dict, List, Optional, Union
+
+import re
+
+from data import File, Tag, file_tags, LOCAL_OWNER
+
+__all__ = [
+    "TagTerm",
+    "TagNot",
+    "TagAnd",
+    "TagOr",
+    "TagExpression",
+    "parse_tag_query",
+    "quote_tag",
+    "tag_names",
+    "normalize_tag_query",
+    "compile_tag_query",
+]
+
+AND, OR, NOT = "AND", "OR", "NOT"
+# Tags named as an operator, or with spaces, parentheses or quotes, go in double quotes
+_QUOTE = '"'
+_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+_BARE = re.compile(r'[^\s()"]+')
+
+
+class TagTerm:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"TagTerm({self.name!r})"
+
+
+class TagNot:
+    def __init__(self, operand: TagExpression) -> None:
+        self.operand = operand
+
+    def __repr__(self) -> str:
+        return f"TagNot({self.operand!r})"
+
+
+class TagAnd:
+    def __init__(self, operands: List[TagExpression]) -> None:
+        self.operands = operands
+
+    def __repr__(self) -> str:
+        return f"TagAnd({self.operands!r})"
+
+
+class TagOr:
+    def __init__(self, operands: List[TagExpression]) -> None:
+        self.operands = operands
+
+    def __repr__(self) -> str:
+        return f"TagOr({self.operands!r})"
+
+
+TagExpression = Union[TagTerm, TagNot, TagAnd, TagOr]
+
+
+class _Parser:
+    """Recursive descent parser of tag queries, NOT binds tighter than AND, AND than OR.
+
+    Tags written one after the other without operator are joined with OR. AND, OR and
+    NOT are reserved words, a tag with one of those names is written in double quotes.
+    """
+
+    def __init__(self, tokens: List[str]) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise ValueError("Unexpected end of tag query")
+        self.position += 1
+        return token
+
+    def parse(self) -> TagExpression:
+        expression = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected token in tag query: {self._peek()}")
+        return expression
+
+    def _or(self) -> TagExpression:
+        operands = [self._and()]
+        while self._peek() not in (None, ")"):
+            if self._peek() == OR:
+                self._next()
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else TagOr(operands)
+
+    def _and(self) -> TagExpression:
+        operands = [self._not()]
+        while self._peek() == AND:
+            self._next()
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else TagAnd(operands)
+
+    def _not(self) -> TagExpression:
+        if self._peek() == NOT:
+            self._next()
+            return TagNot(self._not())
+        return self._atom()
+
+    def _atom(self) -> TagExpression:
+        token = self._next()
+        if token == "(":
+            expression = self._or()
+            if self._next() != ")":
+                raise ValueError("Missing closing parenthesis in tag query")
+            return expression
+        if token in (AND, OR, ")"):
+            raise ValueError(f"Unexpected token in tag query: {token}")
+        if token.startswith(_QUOTE):
+            token = token[1:-1]
+            if not token:
+                raise ValueError("Empty quoted tag in tag query")
+        return TagTerm(token)
+
+
+def parse_tag_query(query: List[str] | str) -> TagExpression | None:
+    """Parse a tag query, given as one string or as its words, None if it is empty."""
+    text = query if isinstance(query, str) else " ".join(query)
+    if text.count(_QUOTE) % 2:
+        raise ValueError("Missing closing quote in tag query")
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    return _Parser(tokens).parse()
+
+
+def tag_names(query: List[str] | str) -> List[str]:
+    """Return the tag names a tag query refers to."""
+    expression = parse_tag_query(query)
+    names: List[str] = []
+    pending = [expression] if expression is not None else []
+    while pending:
+        expression = pending.pop()
+        if isinstance(expression, TagTerm):
+            names.append(expression.name)
+        elif isinstance(expression, TagNot):
+            pending.append(expression.operand)
+        else:
+            pending.extend(expression.operands)
+    return list(dict.fromkeys(names))
+
+
+def quote_tag(name: str) -> str:
+    """Return a tag name as it is written in a tag query, quoted when it has to be."""
+    if name in (AND, OR, NOT) or not _BARE.fullmatch(name):
+        return f"{_QUOTE}{name}{_QUOTE}"
+    return name
+
+
+def _normalize(expression: TagExpression) -> str:
+    if isinstance(expression, TagTerm):
+        return quote_tag(expression.name)
+    if isinstance(expression, TagNot):
+        operand = _normalize(expression.operand)
+        if isinstance(expression.operand, TagTerm):
+            return f"{NOT} {operand}"
+        return f"{NOT} ({operand})"
+    operands = set()
+    for term in expression.operands:
+        operand = _normalize(term)
+        operands.add(operand if isinstance(term, (TagTerm, TagNot)) else f"({operand})")
+    operator = f" {AND} " if isinstance(expression, TagAnd) else f" {OR} "
+    return operator.join(sorted(operands))
+
+
+def normalize_tag_query(query: List[str] | str) -> str:
+    """Return the canonical text of a tag query, the same for reordered operands."""
+    expression = parse_tag_query(query)
+    return "" if expression is None else _normalize(expression)
+
+
+def _tagged(
+    names: List[str], tag_ids: Optional[Dict[str, int]] = None, owner: str = LOCAL_OWNER
+):
+    """Return a query of the file ids linked to any of the live tags of an owner.
+
+    With the ids of the tags already known the tags table is left out of the query.
+    """
+    if tag_ids is not None:
+        ids = [tag_ids[name] for name in names if name in tag_ids]
+        return select(file_tags.c.file_id).where(
+            file_tags.c.owner == owner, file_tags.c.tag_id.in_(ids)
+        )
+    return (
+        select(file_tags.c.file_id)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(
+            file_tags.c.owner == owner,
+            Tag.owner == owner,
+            Tag.deleted == false(),
+            Tag.name.in_(names),
+        )
+    )
+
+
+def _compile(
+    expression: TagExpression, tag_ids: Optional[Dict[str, int]], owner: str
+) -> ColumnElement[bool]:
+    if isinstance(expression, TagTerm):
+        return File.id.in_(_tagged([expression.name], tag_ids, owner))
+
+    if isinstance(expression, TagNot):
+        if isinstance(expression.operand, TagTerm):
+            # Anti-join against the links of the tag
+            linked = _tagged([expression.operand.name], tag_ids, owner).where(
+                file_tags.c.file_id == File.id
+            )
+            return ~exists(linked)
+        return not_(_compile(expression.operand, tag_ids, owner))
+
+    names = [term.name for term in expression.operands if isinstance(term, TagTerm)]
+    others = [
+        _compile(term, tag_ids, owner)
+        for term in expression.operands
+        if not isinstance(term, TagTerm)
+    ]
+    if isinstance(expression, TagAnd):
+        if names:
+            names = list(dict.fromkeys(names))
+            having = (
+                _tagged(names, tag_ids, owner)
+                .group_by(file_tags.c.file_id)
+                .having(func.count() == len(names))
+            )
+            others.insert(0, File.id.in_(having))
+        return and_(*others)
+
+    if names:
+        others.insert(0, File.id.in_(_tagged(names, tag_ids, owner)))
+    return or_(*others)
+
+
+def compile_tag_query(
+    query: List[str] | str,
+    tag_ids: Optional[Dict[str, int]] = None,
+    owner: str = LOCAL_OWNER,
+) -> ColumnElement[bool]:
+    """Compile a tag query into a predicate over the files, every file if it is empty.
+
+    The ids of the live tags by name may be given, names missing from them match nothing.
+    The links and tags are those of the owner, the local ones by default.
+    """
+    expression = parse_tag_query(query)
+    if expression is None:
+        return true()
+    return _compile(expression, tag_ids, owner)
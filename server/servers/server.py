@@ -1,19 +1,160 @@
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 
-import time, json, logging, socket, selectors
+import json, hashlib, logging, socket, selectors, struct, threading
 
 from data.const import *
 from logic.handlers import *
 from logic.configurable import Configurable
 
 
-__all__ = ["Server"]
+__all__ = [
+    "Server",
+    "FrameStream",
+    "receive_message",
+    "receive_ready",
+    "send_frame",
+    "receive_frame",
+    "FRAME_HEADER",
+    "END_FRAME",
+    "STREAM_READY",
+]
+
+# Frames of a stream: payload length and SHA-256, a zero length ends the stream
+FRAME_HEADER = struct.Struct("!I32s")
+END_FRAME = FRAME_HEADER.pack(0, bytes(32))
+# Sent once a streamed request is accepted, no frame goes either way before it
+STREAM_READY = {"message": "Ready"}
+_READY_MESSAGE = json.dumps(STREAM_READY).encode("utf-8")
+
+
+def _is_whole_message(received: bytes | bytearray) -> bool:
+    """Return if the bytes received make a whole JSON message."""
+    if not received.rstrip().endswith(b"}"):
+        return False
+    try:
+        json.loads(received)
+        return True
+    except ValueError:
+        return False
+
+
+def receive_message(sock: socket.socket, buffer_size: int = BUFFER_SIZE) -> bytes:
+    """Read from the socket until a whole JSON message or the end of the stream."""
+    received = bytearray()
+    while True:
+        chunk = sock.recv(buffer_size)
+        if not chunk:
+            break
+        received += chunk
+        if _is_whole_message(received):
+            break
+    return bytes(received)
+
+
+def receive_ready(sock: socket.socket) -> Any:
+    """Return the answer to a streamed request, STREAM_READY or the error it failed with.
+
+    Frames may follow the acceptance at once, so no byte past it is read.
+    """
+    received = b""
+    while len(received) < len(_READY_MESSAGE):
+        chunk = sock.recv(len(_READY_MESSAGE) - len(received))
+        if not chunk:
+            break
+        received += chunk
+    if received == _READY_MESSAGE:
+        return STREAM_READY
+    return json.loads(received + receive_message(sock))
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view, received = memoryview(buffer), 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Stream closed before its last frame")
+        received += count
+    return bytes(buffer)
+
+
+def send_frame(sock: socket.socket, payload: bytes | memoryview) -> None:
+    """Send a payload as one frame with its checksum, gathered without joining them."""
+    header = FRAME_HEADER.pack(len(payload), hashlib.sha256(payload).digest())
+    sent = sock.sendmsg([header, payload])
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sent = len(header)
+    sock.sendall(memoryview(payload)[sent - len(header) :])
+
+
+def receive_frame(sock: socket.socket) -> Optional[bytes]:
+    """Return the payload of the next frame checked against its checksum, None at the end."""
+    size, digest = FRAME_HEADER.unpack(_receive_exactly(sock, FRAME_HEADER.size))
+    if not size:
+        return None
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes is too large")
+    payload = _receive_exactly(sock, size)
+    if hashlib.sha256(payload).digest() != digest:
+        raise ValueError("Frame failed its checksum")
+    return payload
+
+
+class FrameStream:
+    """Frames of a streamed request, read from or written to its connection.
+
+    The request is accepted on first use, so a handler failing before it answers
+    with a plain error. Iterating yields the frames the sender streams after it.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.accepted = False
+        self.sent = 0
+
+    def _accept(self) -> None:
+        if not self.accepted:
+            self.sock.sendall(_READY_MESSAGE)
+            self.accepted = True
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._accept()
+        while (payload := receive_frame(self.sock)) is not None:
+            yield payload
+
+    def send(self, payload: bytes | memoryview) -> None:
+        """Send a payload to the requester as one frame."""
+        if not len(payload):
+            raise ValueError("Empty payloads can not be sent, they end the stream")
+        self._accept()
+        send_frame(self.sock, payload)
+        self.sent += 1
+
+    def send_file(self, path: str, offset: int, length: int, checksum: bytes) -> None:
+        """Send a range of a file as one frame, copied by the kernel to the socket."""
+        if not length:
+            raise ValueError("Empty payloads can not be sent, they end the stream")
+        self._accept()
+        self.sock.sendall(FRAME_HEADER.pack(length, checksum))
+        with open(path, "rb") as file:
+            sent = self.sock.sendfile(file, offset, length)
+        if sent != length:
+            raise ConnectionError(f"Sent {sent} of the {length} bytes of {path}")
+        self.sent += 1
+
+    def close(self) -> None:
+        """End the frames sent, the result of the request follows them."""
+        if self.sent:
+            self.sock.sendall(END_FRAME)
 
 
 class Server:
     def __init__(self, config: Optional[Configurable] = None):
         self._config = config or Configurable()
         self.selector = selectors.DefaultSelector()
+        # Bytes of the requests still arriving, by connection
+        self._received: Dict[socket.socket, bytearray] = {}
         self._subscribe_read_port(self._config[PORT_KEY])
 
     def _parse_message(self, message: bytes) -> Tuple[Dict[str, Any], Dict[str, Any]]:
@@ -27,50 +168,109 @@ class Server:
             logging.error(f"Error parsing message: {e}")
             raise
 
-    def _process_mesage(self, message: bytes, addr: Tuple[str, int]) -> str:
-        header_dict, data = self._parse_message(message)
+    def _process_mesage(
+        self,
+        header_dict: Dict[str, Any],
+        data: Dict[str, Any],
+        addr: Tuple[str, int],
+        stream: Optional[FrameStream] = None,
+    ) -> str:
         header = parse_header(header_dict)
         logging.info(f"Processing message from {addr}: {header}")
 
-        return self._solver_request(header, data, addr)
+        return self._solver_request(header, data, addr, stream)
 
     def _solver_request(
         self,
         header: Tuple[str, str, List[str]],
         data: Dict[str, Any],
         addr: Optional[Tuple[str, int]] = None,
+        stream: Optional[FrameStream] = None,
     ) -> str:
         """Solve the request and return the result."""
-        return handle_request(header, data)
+        return handle_request(header, data, stream)
+
+    def _receive_available(self, conn: socket.socket) -> Optional[bytes]:
+        """Read the bytes that arrived on a connection, return its request once whole.
+
+        None while the request is partial, the selector calls again when more arrive,
+        so a slow sender does not hold back the other connections.
+        """
+        received = self._received.setdefault(conn, bytearray())
+        while True:
+            try:
+                chunk = conn.recv(BUFFER_SIZE)
+            except BlockingIOError:
+                return None
+            if not chunk:
+                return bytes(self._received.pop(conn))
+            received += chunk
+            if _is_whole_message(received):
+                return bytes(self._received.pop(conn))
+
+    def _close(self, conn: socket.socket) -> None:
+        self._received.pop(conn, None)
+        self.selector.unregister(conn)
+        conn.close()
 
     def _process_request(self, conn: socket.socket, mask: int, ori_port: int) -> None:
-        """Process incoming requests and send responses."""
+        """Read the bytes that arrived on a connection, hand its request over once whole.
+
+        Whole requests are answered off the selector, which keeps reading the others.
+        """
         addr = conn.getpeername()
-        ori_addr = (addr[0], ori_port)
         try:
-            message = conn.recv(1024)
-            if message:
-                logging.info(f"Received message from {addr}")
-                result = self._process_mesage(message, ori_addr)
-                logging.info(f"Processed result: {result}")
-
-                conn.sendall(result.encode("utf-8"))
-                logging.info(f"Response sent to {addr}")
-
-                self.selector.unregister(conn)
-                conn.close()
-                logging.info(f"Connection closed with {addr}")
-        except BlockingIOError as e:
-            logging.warning(f"Resource temporarily unavailable: {addr} - {e}")
+            message = self._receive_available(conn)
+        except Exception as e:
+            logging.error(f"Error receiving from {addr}: {e}")
+            self._close(conn)
+            return
+        if message is None:
+            return
+        self.selector.unregister(conn)
+        if not message:
+            conn.close()
+            return
+        args = (conn, message, addr, (addr[0], ori_port))
+        threading.Thread(target=self._serve, args=args).start()
+
+    def _serve(
+        self,
+        conn: socket.socket,
+        message: bytes,
+        addr: Tuple[str, int],
+        ori_addr: Tuple[str, int],
+    ) -> None:
+        """Answer a whole request and close its connection, streamed ones with their frames."""
+        stream: Optional[FrameStream] = None
+        try:
+            logging.info(f"Received message from {addr}")
+            header, data = self._parse_message(message)
+            if header.get("command_name") in STREAM_COMMANDS:
+                conn.settimeout(STREAM_TIMEOUT)
+                stream = FrameStream(conn)
+            else:
+                # Plain requests are answered blocking, up to the usual wait
+                conn.settimeout(WAIT_CHECK)
+            result = self._process_mesage(header, data, ori_addr, stream)
+            logging.info(f"Processed result: {result}")
+            if stream:
+                stream.close()
+            conn.sendall(result.encode("utf-8"))
+            logging.info(f"Response sent to {addr}")
         except ValueError as e:
             logging.error(f"Error processing message from {addr}: {e}")
-
-            conn.sendall(json.dumps({"error": str(e)}).encode("utf-8"))
-            logging.info(f"Error response sent to {addr}")
+            # Once frames flow an error message would be read as one, closing answers it
+            if stream is None or not stream.accepted:
+                conn.sendall(json.dumps({"error": str(e)}).encode("utf-8"))
+                logging.info(f"Error response sent to {addr}")
+        except OSError as e:
+            logging.error(f"Error answering request from {addr}: {e}")
         except Exception as e:
             logging.error(f"Unexpected error: {e}")
-            self.selector.unregister(conn)
+        finally:
             conn.close()
+            logging.info(f"Connection closed with {addr}")
 
     def _accept(self, sock: socket.socket, mask: int, ori_port: int) -> None:
         """Accept incoming connections and process them."""
@@ -79,7 +279,6 @@ class Server:
         conn.setblocking(False)
         data = (self._process_request, ori_port)
         self.selector.register(conn, mask, data)
-        time.sleep(START_MOD)
         self._process_request(conn, mask, ori_port)
 
     def _subscribe_read_port(self, port: int, listen: int = 10) -> socket.socket:
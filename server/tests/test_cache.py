@@ -0,0 +1,195 @@
+from datetime import datetime
+from sqlalchemy import event, insert
+
+import pytest, threading, time
+
+from data import *
+from logic.business_services import ServerService
+from logic.cache import LRUCache, ResultCache
+from logic.configurable import Configurable
+from logic.dtos import FileInputDto, TagInputDto, UserInputDto
+from logic.services import TagService, UserService
+
+TIMEOUT = 10
+DATES = {"creation_date": datetime.now(), "update_date": datetime.now()}
+
+
+def test_lru_evicts_the_least_recently_used() -> None:
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "c"]) == {"a": 1, "c": 3}
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_lru_weighs_values() -> None:
+    cache: LRUCache[str, bytes] = LRUCache(10, len)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.put("a", b"12")
+    assert cache.weight == 6
+    cache.put("c", b"12345")
+    assert cache.get("b") is None and cache.weight == 7
+    # A value heavier than the whole cache is not kept and evicts nothing
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None and cache.weight == 7
+    cache.invalidate("a")
+    assert cache.weight == 5
+    cache.clear()
+    assert cache.weight == 0 and cache.stats()["size"] == 0
+
+
+class StatementCounter:
+    def __init__(self, db_url: str) -> None:
+        self.count = 0
+        event.listen(get_engine(db_url), "before_cursor_execute", self._count)
+
+    def _count(self, *_) -> None:
+        self.count += 1
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    db_url = f"sqlite:///{tmp_path}/cache.db"
+    migrate(db_url)
+    return db_url
+
+
+def test_tag_ids_are_cached_until_the_tag_changes(db_url: str) -> None:
+    tags = TagService(get_repository(Tag, db_url))
+    tag = tags.create(TagInputDto("a"))
+    tags.cache.clear()
+    counter = StatementCounter(db_url)
+    assert tags.get_ids(["a", "b"]) == {"a": tag.id}
+    before = counter.count
+    assert tags.get_ids(["a"]) == {"a": tag.id}
+    assert counter.count == before
+
+    tags.delete(tag.id)
+    assert tags.get_ids(["a"]) == {}
+    renamed = tags.create(TagInputDto("b"))
+    assert tags.get_ids(["b"]) == {"b": renamed.id}
+    tags.update(renamed.id, TagInputDto("c"))
+    assert tags.get_ids(["b", "c"]) == {"c": renamed.id}
+
+
+def test_user_ids_are_cached_until_the_user_changes(db_url: str) -> None:
+    users = UserService(get_repository(User, db_url))
+    user = users.create(UserInputDto("a", True))
+    assert users.cache.get("a") == user.id
+    users.delete(user.id)
+    assert users.get_id("a") is None
+    other = users.create(UserInputDto("b", True))
+    users.update(other.id, UserInputDto("c", True))
+    assert users.get_id("b") is None and users.get_id("c") == other.id
+
+
+def test_result_cache_misses_on_a_new_version() -> None:
+    cache: ResultCache[str, int] = ResultCache(4)
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_compute("k", 1, compute) == 1
+    assert cache.get_or_compute("k", 1, compute) == 1
+    assert cache.get_or_compute("k", 2, compute) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_result_cache_computes_once_for_concurrent_misses() -> None:
+    cache: ResultCache[str, int] = ResultCache(4)
+    release, calls, results = threading.Event(), [], []
+
+    def compute() -> int:
+        calls.append(1)
+        release.wait(TIMEOUT)
+        return 42
+
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", 1, compute)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["collapsed"] < len(threads) - 1:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert results == [42] * len(threads) and len(calls) == 1
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_result_cache_shares_and_forgets_errors() -> None:
+    cache: ResultCache[str, int] = ResultCache(4)
+    release, errors = threading.Event(), []
+
+    def fail() -> int:
+        release.wait(TIMEOUT)
+        raise ValueError("failed")
+
+    def call() -> None:
+        try:
+            cache.get_or_compute("k", 1, fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["collapsed"] < 1:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert len(errors) == 2
+    assert cache.get_or_compute("k", 1, lambda: 1) == 1
+
+
+def test_versions_move_after_the_commit(db_url: str) -> None:
+    tables = (Tag.__tablename__,)
+    before = get_table_versions(db_url, tables)
+    with get_engine(db_url).connect() as conn:
+        conn.execute(insert(Tag).values(name="a", **DATES))
+        conn.rollback()
+    assert get_table_versions(db_url, tables) == before
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(Tag).values(name="a", **DATES))
+        assert get_table_versions(db_url, tables) == before
+    assert get_table_versions(db_url, tables) > before
+
+
+@pytest.mark.parametrize("engine", ["bitmap", "sql"])
+def test_listing_is_invalidated_by_writes(tmp_path, engine: str) -> None:
+    config = Configurable(
+        {
+            DB_URL_KEY: f"sqlite:///{tmp_path}/listing.db",
+            CONTENT_PATH_KEY: str(tmp_path),
+            QUERY_ENGINE_KEY: engine,
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    server = ServerService(config)
+
+    def upload(name: str) -> None:
+        user_id = server.get_user_id("test")
+        file = FileInputDto(name=name, file_type="txt", size=3, user_id=user_id, **DATES)
+        server.create_update_file(file, ["a"], iter([b"abc"]))
+
+    def listed(query: list) -> list:
+        return [file.name for file in server.get_files_page(query, 10, None)[0]]
+
+    upload("first")
+    assert listed(["a"]) == listed(["a"]) == ["first"]
+    assert server.Listings.stats()["hits"] == 1
+    upload("second")
+    assert listed(["a"]) == ["first", "second"]
+    server.add_tags_to_files(["a"], ["b"])
+    assert listed(["b"]) == ["first", "second"]
+    server.delete_tags_from_files(["b"], ["a"])
+    assert listed(["a"]) == []
+    server.delete_file_by_tags(["b"])
+    assert listed(["b"]) == []
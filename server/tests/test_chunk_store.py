@@ -0,0 +1,72 @@
+import random, pytest
+
+from logic.chunk_store import ChunkStore, CHUNKING_MODES
+from logic.compression import NO_CODEC
+
+CHUNK = 4096
+
+
+def content(size: int, seed: int = 1) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def blocks(data: bytes, seed: int):
+    """Yield the content in blocks of random sizes, some empty and some longer than chunks."""
+    rng, start = random.Random(seed), 0
+    while start < len(data):
+        end = start + rng.choice([0, 1, 100, CHUNK - 1, CHUNK, 5 * CHUNK])
+        yield data[start:end]
+        start = end
+
+
+@pytest.fixture(params=CHUNKING_MODES)
+def store(tmp_path, request) -> ChunkStore:
+    return ChunkStore(str(tmp_path / "chunks"), CHUNK, request.param)
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK, 3 * CHUNK + 7, 20 * CHUNK])
+@pytest.mark.parametrize("codec", [NO_CODEC, "zlib"])
+def test_stream_matches_write(store: ChunkStore, size: int, codec: str) -> None:
+    data = content(size)
+    chunks = store.write(data, codec)
+    for seed in range(3):
+        assert store.write_stream(blocks(data, seed), codec) == chunks
+    assert sum(size for _, size in chunks) == size
+    assert store.read_all(digest for digest, _ in chunks) == data
+    if store.chunking == "cdc":
+        assert all(size <= store.max_size for _, size in chunks)
+
+
+def test_cdc_insertion_keeps_the_other_chunks(tmp_path) -> None:
+    store = ChunkStore(str(tmp_path), CHUNK, "cdc")
+    data = content(40 * CHUNK)
+    before = {digest for digest, _ in store.write(data)}
+    middle = len(data) // 2
+    after = {digest for digest, _ in store.write(data[:middle] + b"inserted" + data[middle:])}
+    assert len(before - after) <= 2
+
+
+def test_dedup_counters(store: ChunkStore) -> None:
+    data = content(4 * CHUNK)
+    chunks = store.write(data)
+    store.write(data)
+    store.write_stream(blocks(data, 0))
+    stats = store.stats()
+    assert stats["chunks"] == 3 * len(chunks)
+    assert stats["stored"] == len({digest for digest, _ in chunks})
+    assert stats["bytes"] == 3 * len(data) and stats["stored_bytes"] == len(data)
+    assert stats["dedup_ratio"] == 3.0
+
+
+def test_compression_is_skipped_when_it_does_not_shrink(store: ChunkStore) -> None:
+    packed, _ = store.put(b"a" * CHUNK, "zlib")
+    random_chunk, _ = store.put(content(CHUNK), "zlib")
+    assert store.find(packed)[1] == "zlib"
+    assert store.find(random_chunk)[1] == NO_CODEC
+    assert store.read(packed) == b"a" * CHUNK
+
+
+@pytest.mark.parametrize("digest", ["../../etc/passwd", "A" * 64, "0" * 63, None])
+def test_invalid_hashes_are_rejected(store: ChunkStore, digest) -> None:
+    with pytest.raises(ValueError):
+        store.path(digest)
@@ -0,0 +1,65 @@
+from itertools import combinations
+
+import os, random, pytest
+
+from logic.chunk_store import ChunkStore
+from logic.erasure import ReedSolomon, ERASURE_OFF
+
+
+@pytest.mark.parametrize("size", [0, 1, 5, 4096, 4099])
+def test_any_k_shards_decode(size: int) -> None:
+    code = ReedSolomon.from_spec("4+2")
+    data = random.Random(size).randbytes(size)
+    shards = code.encode(data)
+    assert len(shards) == code.total == 6
+    assert len({len(shard) for shard in shards}) == 1
+    for indexes in combinations(range(code.total), code.k):
+        assert code.decode({i: shards[i] for i in indexes}, size) == data, indexes
+
+
+def test_missing_shards_are_repaired() -> None:
+    code = ReedSolomon(4, 2)
+    shards = code.encode(b"content of a chunk")
+    for missing in combinations(range(code.total), code.m):
+        kept = {i: shard for i, shard in enumerate(shards) if i not in missing}
+        assert code.repair(kept, list(missing)) == {i: shards[i] for i in missing}
+
+
+def test_fewer_than_k_shards_fail() -> None:
+    code = ReedSolomon(4, 2)
+    shards = code.encode(b"content")
+    with pytest.raises(ValueError):
+        code.decode({i: shards[i] for i in range(3)}, 7)
+
+
+@pytest.mark.parametrize("spec", ["4", "a+b", "0+2", "200+100"])
+def test_invalid_specs(spec: str) -> None:
+    with pytest.raises(ValueError):
+        ReedSolomon.from_spec(spec)
+
+
+def test_spec() -> None:
+    assert ReedSolomon.from_spec(ERASURE_OFF) is None
+    code = ReedSolomon.from_spec("4+2")
+    assert (code.k, code.m, code.overhead) == (4, 2, 1.5)
+
+
+def test_corrupted_shards_are_rejected(tmp_path) -> None:
+    store = ChunkStore(str(tmp_path))
+    code = ReedSolomon(4, 2)
+    data = b"content of a chunk"
+    digest = store.write(data)[0][0]
+    for index, shard in enumerate(code.encode(data)):
+        store.put_shard(digest, index, shard)
+    assert store.shard_indexes(digest, code.total) == list(range(code.total))
+    assert sorted(store.shards()[digest]) == list(range(code.total))
+
+    with open(store.shard_path(digest, 0), "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b"x")
+    with pytest.raises(ValueError):
+        store.read_shard(digest, 0)
+    kept = {i: store.read_shard(digest, i) for i in range(1, code.total)}
+    assert code.decode(kept, len(data)) == data
+    with pytest.raises(ValueError):
+        store.shard_path(digest, -1)
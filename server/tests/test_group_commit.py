@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+import pytest, threading
+
+from data import *
+from data.group_commit import GroupCommitter
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def committer(tmp_path) -> GroupCommitter:
+    db_url = f"sqlite:///{tmp_path}/group.db"
+    get_engine(db_url, "durable")
+    migrate(db_url)
+    return GroupCommitter(get_engine(db_url), window=0.2)
+
+
+def add_tag(name: str):
+    now = datetime.now()
+    values = {"name": name, "creation_date": now, "update_date": now, "deleted": False}
+    return lambda session: session.execute(insert(Tag).values(**values)).inserted_primary_key[0]
+
+
+def tag_names(committer: GroupCommitter) -> set:
+    with committer.engine.connect() as conn:
+        return set(conn.execute(select(Tag.name)).scalars())
+
+
+def run(target) -> None:
+    """Run in a thread, failing instead of hanging when the writer waits for itself."""
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive()
+
+
+def test_failed_write_leaves_its_group(committer: GroupCommitter) -> None:
+    committer.commit(add_tag("taken"))
+    names = ["a", "b", "taken", "c", "d"]
+    results, errors = {}, {}
+    start = threading.Barrier(len(names))
+
+    def write(name: str) -> None:
+        start.wait()
+        try:
+            results[name] = committer.commit(add_tag(name))
+        except Exception as e:
+            errors[name] = e
+
+    threads = [threading.Thread(target=write, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert list(errors) == ["taken"] and isinstance(errors["taken"], IntegrityError)
+    assert set(results) == {"a", "b", "c", "d"}
+    assert tag_names(committer) == {"taken", "a", "b", "c", "d"}
+    stats = committer.stats()
+    assert stats["largest"] > 1 and stats["failed"] == 1
+
+
+def test_write_issued_by_a_write_runs_inline(committer: GroupCommitter) -> None:
+    def outer(session) -> int:
+        add_tag("outer")(session)
+        return committer.commit(add_tag("inner"))
+
+    run(lambda: committer.commit(outer))
+    assert tag_names(committer) == {"outer", "inner"}
+
+
+def test_failed_inner_write_rolls_back_alone(committer: GroupCommitter) -> None:
+    committer.commit(add_tag("taken"))
+
+    def outer(session) -> None:
+        add_tag("outer")(session)
+        with pytest.raises(IntegrityError):
+            committer.commit(add_tag("taken"))
+
+    run(lambda: committer.commit(outer))
+    assert tag_names(committer) == {"taken", "outer"}
+
+
+def test_sync_from_a_write_runs_inline(committer: GroupCommitter, tmp_path) -> None:
+    path = tmp_path / "content"
+    path.write_bytes(b"content")
+    run(lambda: committer.commit(lambda session: committer.sync([str(path)])))
@@ -0,0 +1,68 @@
+from datetime import datetime
+from sqlalchemy import event, insert
+
+import pytest
+
+from data import *
+from logic.services import FileService
+
+FILES = 300
+TAGS = 5
+
+
+class StatementCounter:
+    def __init__(self, db_url: str) -> None:
+        self.count = 0
+        event.listen(get_engine(db_url), "before_cursor_execute", self._count)
+
+    def _count(self, *_) -> None:
+        self.count += 1
+
+
+@pytest.fixture
+def files(tmp_path) -> FileService:
+    db_url = f"sqlite:///{tmp_path}/listing.db"
+    migrate(db_url)
+    dates = {"creation_date": datetime.now(), "update_date": datetime.now()}
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "test", **dates}])
+        conn.execute(insert(Tag), [{"id": i + 1, "name": f"tag{i}", **dates} for i in range(TAGS)])
+        conn.execute(
+            insert(File),
+            [
+                {"id": i, "name": f"f{i}", "file_type": "txt", "size": i, "user_id": 1, **dates}
+                for i in range(1, FILES + 1)
+            ],
+        )
+        conn.execute(
+            insert(file_tags),
+            [
+                {"file_id": i, "tag_id": tag + 1}
+                for i in range(1, FILES + 1)
+                for tag in range(TAGS)
+                if i % (tag + 2) == 0
+            ],
+        )
+    return FileService(get_repository(File, db_url))
+
+
+@pytest.mark.parametrize("query", [["tag0"], ["tag1 OR tag3"], ["tag0 AND NOT tag2"], []])
+@pytest.mark.parametrize("limit", [1, 10, 100])
+def test_list_page_takes_two_queries(files: FileService, query: list, limit: int) -> None:
+    counter = StatementCounter(str(files.repository.session.get_bind().url))
+    page = files.get_listing_page(query, limit)
+    assert counter.count == 2
+    assert 0 < len(page) <= limit
+    assert all(isinstance(tag, str) for file in page for tag in file.tags)
+
+    # The next page too, an empty one does not look for tags
+    before = counter.count
+    following = files.get_listing_page(query, limit, page[-1].id)
+    assert counter.count - before == (2 if following else 1)
+
+
+def test_list_page_tags_match_the_links(files: FileService) -> None:
+    page = files.get_listing_page(["tag0"], 10)
+    for file in page:
+        expected = sorted(f"tag{tag}" for tag in range(TAGS) if file.id % (tag + 2) == 0)
+        assert sorted(file.tags) == expected
@@ -0,0 +1,71 @@
+from datetime import datetime
+from sqlalchemy import inspect, insert, select
+from sqlalchemy.exc import IntegrityError
+
+import pytest
+
+from data import *
+from data.migrations import MIGRATIONS, baseline_metadata, get_schema_version
+
+MODELS = (User, File, FileSource, Tag)
+
+
+@pytest.fixture
+def baseline(tmp_path) -> str:
+    """A store of the first schema with a row in every table."""
+    db_url = f"sqlite:///{tmp_path}/baseline.db"
+    assert migrate(db_url, 1) == 1
+    now = datetime.now()
+    dates = {"creation_date": now, "update_date": now, "deleted": False}
+    tables = baseline_metadata.tables
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(tables["users"]).values(id=1, name="user", **dates))
+        conn.execute(insert(tables["tags"]).values(id=1, name="tag", **dates))
+        file = {"id": 1, "name": "file", "file_type": "txt", "size": 3, "user_id": 1}
+        conn.execute(insert(tables["files"]).values(**file, **dates))
+        source = {"file_id": 1, "chunk_size": 3, "url": "file.txt"}
+        conn.execute(insert(tables["file_sources"]).values(**source, **dates))
+        conn.execute(insert(tables["file_tags"]).values(file_id=1, tag_id=1))
+    return db_url
+
+
+def test_baseline_has_no_later_columns(baseline: str) -> None:
+    with get_engine(baseline).connect() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("tags")}
+    assert "owner" not in columns
+
+
+def test_upgrade_from_baseline(baseline: str) -> None:
+    assert migrate(baseline) == MIGRATIONS[-1][0]
+    engine = get_engine(baseline)
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        schema = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in schema.get_columns(table.name)}
+            assert set(table.c.keys()) <= columns, table.name
+        indexes = {index["name"] for index in schema.get_indexes("files")}
+        assert {"ix_files_live", "uq_files_origin", "ix_files_owner"} <= indexes
+        # Rows of the first schema become local rows and keep their links
+        for model in MODELS:
+            owners = conn.execute(select(model.owner, model.origin_id)).all()
+            assert owners == [(LOCAL_OWNER, None)]
+        assert conn.execute(select(file_tags)).all() == [(1, 1, LOCAL_OWNER)]
+
+
+def test_upgraded_tag_names_are_unique_per_owner(baseline: str) -> None:
+    migrate(baseline)
+    now = datetime.now()
+    tag = {"name": "tag", "creation_date": now, "update_date": now, "deleted": False}
+    with get_engine(baseline).begin() as conn:
+        conn.execute(insert(Tag).values(owner="replica", origin_id=1, **tag))
+    with pytest.raises(IntegrityError), get_engine(baseline).begin() as conn:
+        conn.execute(insert(Tag).values(**tag))
+    with pytest.raises(IntegrityError), get_engine(baseline).begin() as conn:
+        conn.execute(insert(Tag).values(owner="replica", origin_id=1, **{**tag, "name": "new"}))
+
+
+def test_migrate_is_idempotent(tmp_path) -> None:
+    db_url = f"sqlite:///{tmp_path}/new.db"
+    version = migrate(db_url)
+    assert migrate(db_url) == version == MIGRATIONS[-1][0]
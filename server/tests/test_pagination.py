@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+from data import *
+from logic.business_services import ServerService
+from logic.configurable import Configurable
+from logic.dtos import FileInputDto
+from logic.pagination import decode_cursor, encode_cursor
+
+FILES = 12
+PAGE = 5
+
+
+def upload(server: ServerService, name: str, tags: list) -> int:
+    now = datetime.now()
+    file = FileInputDto(
+        name=name,
+        file_type="txt",
+        size=3,
+        user_id=server.get_user_id("test"),
+        creation_date=now,
+        update_date=now,
+    )
+    return server.create_update_file(file, tags, iter([b"abc"]))["id"]
+
+
+@pytest.fixture(params=["bitmap", "sql"])
+def server(tmp_path, request) -> ServerService:
+    config = Configurable(
+        {
+            DB_URL_KEY: f"sqlite:///{tmp_path}/pages.db",
+            CONTENT_PATH_KEY: str(tmp_path),
+            QUERY_ENGINE_KEY: request.param,
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    server = ServerService(config)
+    for i in range(FILES):
+        upload(server, f"f{i}", ["even" if i % 2 == 0 else "odd", "all"])
+    return server
+
+
+def pages(server: ServerService, query: list, cursor=None):
+    """Yield the ids of every page of a listing, from the given cursor on."""
+    while True:
+        files, cursor = server.get_files_page(query, PAGE, cursor)
+        yield [file.id for file in files]
+        if cursor is None:
+            return
+
+
+def test_pages_cover_the_listing_once(server: ServerService) -> None:
+    listed = [id for page in pages(server, ["all"]) for id in page]
+    assert listed == sorted(listed) and len(listed) == FILES
+    even = [id for page in pages(server, ["even"]) for id in page]
+    assert len(even) == len(set(even)) == FILES // 2
+
+
+def test_inserts_keep_the_page_boundaries(server: ServerService) -> None:
+    first, cursor = server.get_files_page(["all"], PAGE, None)
+    seen = [file.id for file in first]
+
+    # New files sort after the cursor, the files already listed do not shift into the next page
+    added = [upload(server, f"new{i}", ["all"]) for i in range(3)]
+    rest = [id for page in pages(server, ["all"], cursor) for id in page]
+    assert rest[0] > seen[-1]
+    assert not set(seen) & set(rest)
+    assert set(seen + rest) == {file.id for file in server.get_files_by_tags(["all"])}
+    assert rest[-len(added) :] == added
+
+
+def test_deletes_keep_the_page_boundaries(server: ServerService) -> None:
+    first, cursor = server.get_files_page(["all"], PAGE, None)
+    second, _ = server.get_files_page(["all"], PAGE, cursor)
+
+    # Deleting a listed file does not pull the next page back over it
+    assert server.delete_file_by_tags(["even"]) > 0
+    again, _ = server.get_files_page(["all"], PAGE, cursor)
+    expected = [file.id for file in second if "even" not in file.tags]
+    assert [file.id for file in again][: len(expected)] == expected
+    assert all(file.id > first[-1].id for file in again)
+
+
+def test_cursor_is_tied_to_its_query() -> None:
+    cursor = encode_cursor(["a AND b"], 42)
+    assert decode_cursor(["a  AND b"], cursor) == 42
+    assert decode_cursor(["a"], None) == 0
+    with pytest.raises(ValueError):
+        decode_cursor(["a OR b"], cursor)
+    with pytest.raises(ValueError):
+        decode_cursor(["a AND b"], "not a cursor")
@@ -0,0 +1,67 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from data.const import *
+from dist import chord_controlers
+from dist.chord_service import ChordService, QuorumError
+from logic.configurable import Configurable
+
+
+class Replica:
+    def __init__(self, id: int, alive: bool) -> None:
+        self.id = id
+        self.ip = f"replica-{id}"
+        self.alive = alive
+
+    def set_replication(self, key: str, data: dict, lsn: int) -> bool:
+        return self.alive
+
+
+def service(tmp_path, alive: list, quorum: int) -> ChordService:
+    tmp_path = tmp_path / f"node-{len(list(tmp_path.iterdir()))}"
+    tmp_path.mkdir()
+    replicas = [Replica(i, up) for i, up in enumerate(alive)]
+    node = SimpleNamespace(
+        id=1,
+        ip="primary",
+        get_replication=lambda key, since: {"files": [{"id": 1}]},
+        get_replications=lambda factor: [(r, f"replica_{r.id}.db") for r in replicas],
+    )
+    config = Configurable(
+        {
+            DB_URL_KEY: f"sqlite:///{tmp_path}/primary.db",
+            DB_BASE_URL_KEY: f"sqlite:///{tmp_path}/",
+            REPLICATION_FACTOR_KEY: len(alive) + 1,
+            WRITE_QUORUM_KEY: quorum,
+            TAG_QUORUM_KEY: quorum,
+        }
+    )
+    return ChordService(node, config)
+
+
+def test_quorum_reached_returns_the_lsn(tmp_path) -> None:
+    chord = service(tmp_path, [True, False], 2)
+    assert chord.replication(datetime.now(), QUORUM.METADATA) > 0
+
+
+def test_quorum_not_reached_raises(tmp_path) -> None:
+    chord = service(tmp_path, [False, False], 2)
+    with pytest.raises(QuorumError) as error:
+        chord.replication(datetime.now(), QUORUM.METADATA)
+    assert (error.value.acks, error.value.quorum) == (1, 2)
+    assert error.value.lsn > 0
+
+
+def test_write_without_quorum_is_an_error(tmp_path, monkeypatch) -> None:
+    chord = service(tmp_path, [False, False], 3)
+    monkeypatch.setattr(chord_controlers, "_chord_service", chord)
+    response = chord_controlers._replicated_write("Tags added", datetime.now(), QUORUM.TAG)
+    assert "error" in response and response["durable"] is False
+    assert response["session_token"]
+
+    chord = service(tmp_path, [True, True], 3)
+    monkeypatch.setattr(chord_controlers, "_chord_service", chord)
+    response = chord_controlers._replicated_write("Tags added", datetime.now(), QUORUM.TAG)
+    assert "error" not in response
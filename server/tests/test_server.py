@@ -0,0 +1,71 @@
+import json, socket, threading, pytest
+
+from data.const import *
+from logic.configurable import Configurable
+from servers.server import Server, receive_message
+
+TIMEOUT = 10
+# Wait for answers that must not depend on other requests
+ANSWER_TIMEOUT = 2
+
+
+class SlowServer(Server):
+    """Server answering "Slow" requests once released, and the others at once."""
+
+    def __init__(self, config: Configurable) -> None:
+        super().__init__(config)
+        self.release = threading.Event()
+
+    def _solver_request(self, header, data, addr=None, stream=None) -> str:
+        if header[0] == "Slow":
+            self.release.wait(TIMEOUT)
+        return json.dumps({"message": header[0]})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server() -> SlowServer:
+    server = SlowServer(Configurable({HOST_KEY: "127.0.0.1", PORT_KEY: free_port()}))
+    threading.Thread(target=server._start_listening, args=(0.1,), daemon=True).start()
+    yield server
+    server.release.set()
+
+
+def connect(server: Server) -> socket.socket:
+    return socket.create_connection(("127.0.0.1", server._config[PORT_KEY]), TIMEOUT)
+
+
+def request(server: Server, message: bytes) -> socket.socket:
+    sock = connect(server)
+    sock.sendall(message)
+    return sock
+
+
+def command(name: str) -> bytes:
+    return json.dumps({"header": {"command_name": name}, "data": {}}).encode("utf-8")
+
+
+def test_slow_requests_do_not_hold_the_others(server: SlowServer) -> None:
+    slow = request(server, command("Slow"))
+    fast = request(server, command("Fast"))
+    fast.settimeout(ANSWER_TIMEOUT)
+    assert json.loads(receive_message(fast)) == {"message": "Fast"}
+    assert not server.release.is_set()
+    server.release.set()
+    assert json.loads(receive_message(slow)) == {"message": "Slow"}
+
+
+@pytest.mark.parametrize("message", [b'{"data": {}}', b'{"header": '])
+def test_malformed_requests_are_answered_and_closed(server: SlowServer, message: bytes) -> None:
+    sock = request(server, message)
+    if not message.endswith(b"}"):
+        sock.shutdown(socket.SHUT_WR)
+    sock.settimeout(ANSWER_TIMEOUT)
+    assert "error" in json.loads(receive_message(sock))
+    assert sock.recv(1) == b""
+    assert len(server.selector.get_map()) == 1 and not server._received
@@ -0,0 +1,126 @@
+from datetime import datetime
+from sqlalchemy import false, select
+
+import random, pytest
+
+from data import *
+from logic.bitmap import RoaringBitmap
+from logic.business_services import ServerService
+from logic.configurable import Configurable
+from logic.dtos import FileInputDto
+from logic.tag_index import TagIndex
+from logic.tag_query import compile_tag_query
+
+TAGS = ["a", "b", "c", "d"]
+FILES = 40
+QUERIES = [
+    [],
+    ["a"],
+    ["a b"],
+    ["a AND b"],
+    ["a OR b AND c"],
+    ["NOT a"],
+    ["NOT (a OR d)"],
+    ["(a OR b) AND NOT c"],
+    ["a AND NOT b AND NOT d"],
+    ["new"],
+    ["missing"],
+    ["NOT missing"],
+]
+
+
+def upload(server: ServerService, name: str, tags: list) -> None:
+    now = datetime.now()
+    file = FileInputDto(
+        name=name,
+        file_type="txt",
+        size=3,
+        user_id=server.get_user_id("test"),
+        creation_date=now,
+        update_date=now,
+    )
+    server.create_update_file(file, tags, iter([b"abc"]))
+
+
+@pytest.fixture
+def server(tmp_path) -> ServerService:
+    config = Configurable(
+        {
+            DB_URL_KEY: f"sqlite:///{tmp_path}/index.db",
+            CONTENT_PATH_KEY: str(tmp_path),
+            QUERY_ENGINE_KEY: "bitmap",
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    server = ServerService(config)
+    rng = random.Random(7)
+    for i in range(FILES):
+        upload(server, f"f{i}", [tag for tag in TAGS if rng.random() < 0.4])
+    return server
+
+
+def sql_result(server: ServerService, query: list) -> set:
+    """Return the live local files the SQL engine matches for a tag query."""
+    statement = select(File.id).where(
+        File.owner == LOCAL_OWNER, File.deleted == false(), compile_tag_query(query)
+    )
+    with get_engine(server._config[DB_URL_KEY]).connect() as conn:
+        return set(conn.execute(statement).scalars())
+
+
+def assert_matches_sql(server: ServerService) -> None:
+    for query in QUERIES:
+        assert set(server.TagIndex.query(query)) == sql_result(server, query), query
+
+
+def test_index_matches_sql(server: ServerService) -> None:
+    assert_matches_sql(server)
+
+
+def test_index_follows_the_writes(server: ServerService) -> None:
+    server.TagIndex.query([])
+    assert server.add_tags_to_files(["a AND NOT b"], ["new", "c"]) > 0
+    assert_matches_sql(server)
+    assert server.delete_tags_from_files(["c"], ["a", "new"]) > 0
+    assert_matches_sql(server)
+    assert server.delete_file_by_tags(["d AND NOT a"]) > 0
+    assert_matches_sql(server)
+    upload(server, "late", ["a", "new"])
+    upload(server, "f0", ["b"])
+    assert_matches_sql(server)
+
+    # The synced bitmaps are the ones a fresh load builds
+    fresh = TagIndex(server._config[DB_URL_KEY])
+    for query in QUERIES:
+        assert set(fresh.query(query)) == set(server.TagIndex.query(query)), query
+
+
+def test_invalidated_index_reloads(server: ServerService) -> None:
+    server.TagIndex.query([])
+    version = server.TagIndex.version
+    server.refresh_indexes()
+    assert server.TagIndex.version > version
+    assert_matches_sql(server)
+
+
+def test_results_are_copies(server: ServerService) -> None:
+    result = server.TagIndex.query(["a"])
+    result.update([10**6])
+    assert 10**6 not in server.TagIndex.query(["a"])
+
+
+@pytest.mark.parametrize("size", [10, 5000, 70000])
+def test_bitmap_matches_sets(size: int) -> None:
+    rng = random.Random(size)
+    # Values spread over several containers, sparse ones as arrays and dense ones as bitsets
+    left = {rng.randrange(3 * size) for _ in range(size)} | {2**20 + 1}
+    right = {rng.randrange(3 * size) for _ in range(size)}
+    a, b = RoaringBitmap(left), RoaringBitmap(right)
+    assert list(a) == sorted(left) and len(a) == len(left)
+    assert set(a & b) == left & right
+    assert set(a | b) == left | right
+    assert set(a - b) == left - right
+    after = sorted(left)[len(left) // 2]
+    assert a.page(after, 100) == sorted(v for v in left if v > after)[:100]
+    a.difference_update(right)
+    assert set(a) == left - right
@@ -0,0 +1,140 @@
+from datetime import datetime
+from sqlalchemy import insert, select
+
+import pytest
+
+from data import *
+from logic.tag_query import *
+
+# Tags of each file, "AND" is a tag named as an operator
+LINKS = {
+    1: {"a"},
+    2: {"b"},
+    3: {"a", "b"},
+    4: {"a", "c"},
+    5: {"b", "c"},
+    6: {"a", "b", "c"},
+    7: set(),
+    8: {"AND", "a"},
+    9: {"two words"},
+}
+TAGS = sorted({tag for tags in LINKS.values() for tag in tags})
+
+
+def evaluate(expression: TagExpression, tags: set) -> bool:
+    if isinstance(expression, TagTerm):
+        return expression.name in tags
+    if isinstance(expression, TagNot):
+        return not evaluate(expression.operand, tags)
+    results = [evaluate(operand, tags) for operand in expression.operands]
+    return all(results) if isinstance(expression, TagAnd) else any(results)
+
+
+def matches(query: str) -> set:
+    expression = parse_tag_query(query)
+    return {file for file, tags in LINKS.items() if evaluate(expression, tags)}
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("a", "a"),
+        ("a OR b AND c", "a OR (b AND c)"),
+        ("a AND b OR c", "(a AND b) OR c"),
+        ("(a OR b) AND c", "(a OR b) AND c"),
+        ("NOT a AND b", "(NOT a) AND b"),
+        ("NOT (a OR b)", "NOT (a OR b)"),
+        ("NOT NOT a", "NOT (NOT a)"),
+        ("a b c", "a OR b OR c"),
+        ("a b AND c", "a OR (b AND c)"),
+        ('"AND" OR "NOT"', '"AND" OR "NOT"'),
+        ('"two words" AND a', '"two words" AND a'),
+    ],
+)
+def test_precedence(query: str, expected: str) -> None:
+    assert normalize_tag_query(query) == normalize_tag_query(expected)
+    assert matches(query) == matches(expected)
+
+
+def test_words_and_text_parse_alike() -> None:
+    assert normalize_tag_query(["a", "AND", "(b", "OR", "c)"]) == normalize_tag_query(
+        "a AND (b OR c)"
+    )
+    assert normalize_tag_query("b OR a") == normalize_tag_query("a OR b") == "a OR b"
+
+
+def test_empty_query() -> None:
+    assert parse_tag_query([]) is None
+    assert parse_tag_query("  ") is None
+    assert normalize_tag_query("") == ""
+    assert tag_names([]) == []
+
+
+@pytest.mark.parametrize(
+    "query", ["AND", "a AND", "OR a", "a NOT", "(a", "a)", "()", "NOT", '"a', '""']
+)
+def test_invalid_queries(query: str) -> None:
+    with pytest.raises(ValueError):
+        parse_tag_query(query)
+
+
+def test_reserved_words_are_quoted() -> None:
+    assert sorted(tag_names('"AND" OR a')) == ["AND", "a"]
+    assert quote_tag("AND") == '"AND"'
+    assert quote_tag("two words") == '"two words"'
+    assert quote_tag("plain") == "plain"
+    assert normalize_tag_query('"OR"') == '"OR"'
+    assert matches('"AND"') == {8}
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    db_url = f"sqlite:///{tmp_path}/tags.db"
+    migrate(db_url)
+    dates = {"creation_date": datetime.now(), "update_date": datetime.now()}
+    file = {"file_type": "txt", "size": 1, "user_id": 1}
+    with get_engine(db_url).begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "test", **dates}])
+        conn.execute(
+            insert(Tag), [{"id": i, "name": name, **dates} for i, name in enumerate(TAGS, 1)]
+        )
+        conn.execute(insert(File), [{"id": i, "name": f"f{i}", **file, **dates} for i in LINKS])
+        conn.execute(
+            insert(file_tags),
+            [
+                {"file_id": file, "tag_id": TAGS.index(tag) + 1}
+                for file, tags in LINKS.items()
+                for tag in tags
+            ],
+        )
+    return db_url
+
+
+QUERIES = [
+    "a",
+    "a b",
+    "a AND b",
+    "a AND b AND c",
+    "a OR b AND c",
+    "NOT a",
+    "NOT (a OR b)",
+    "a AND NOT b",
+    "(a OR b) AND NOT c",
+    "NOT a AND NOT b AND NOT c",
+    '"AND" AND a',
+    '"two words" OR c',
+    "missing",
+    "a AND missing",
+    "NOT missing",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES + [""])
+@pytest.mark.parametrize("with_ids", [False, True])
+def test_compiled_query_matches_the_evaluation(db_url: str, query: str, with_ids: bool) -> None:
+    tag_ids = {name: i for i, name in enumerate(TAGS, 1)} if with_ids else None
+    statement = select(File.id).where(compile_tag_query(query, tag_ids))
+    with get_engine(db_url).connect() as conn:
+        found = set(conn.execute(statement).scalars())
+    expected = set(LINKS) if not query else matches(query)
+    assert found == expected
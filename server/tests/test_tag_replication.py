@@ -0,0 +1,93 @@
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import select, update
+
+import pytest
+
+from data import *
+from dist.chord_service import ChordService
+from logic.business_services import ServerService
+from logic.configurable import Configurable
+from logic.dtos import FileInputDto
+
+OWNER = "owner-a"
+OLD = datetime(2000, 1, 1)
+
+
+def node(path) -> tuple:
+    path.mkdir()
+    config = Configurable(
+        {
+            DB_URL_KEY: f"sqlite:///{path}/node.db",
+            DB_BASE_URL_KEY: f"sqlite:///{path}/",
+            CONTENT_PATH_KEY: str(path),
+        }
+    )
+    migrate(config[DB_URL_KEY])
+    server = ServerService(config)
+    chord = ChordService(SimpleNamespace(id=path.name, ip=path.name), config)
+    chord.chunks = server.Chunks
+    return server, chord
+
+
+@pytest.fixture
+def nodes(tmp_path) -> tuple:
+    primary, replica = node(tmp_path / "primary"), node(tmp_path / "replica")
+    server = primary[0]
+    user_id = server.get_user_id("test")
+    for name in ("a", "b", "c"):
+        now = datetime.now()
+        file = FileInputDto(
+            name=name, file_type="txt", size=3, user_id=user_id, creation_date=now, update_date=now
+        )
+        server.create_update_file(file, ["x", "y"] if name != "c" else ["y"], iter([b"abc"]))
+    with get_engine(server._config[DB_URL_KEY]).begin() as conn:
+        conn.execute(update(File).values(update_date=OLD))
+    chord = primary[1]
+    records = chord.get_all_records(chord.get_db_url())
+    replica[1].set_all_records(replica[1].get_db_url(), OWNER, records)
+    return primary, replica
+
+
+def links(chord: ChordService, owner: str) -> set:
+    query = (
+        select(File.name, Tag.name)
+        .select_from(file_tags)
+        .join(File, File.id == file_tags.c.file_id)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(file_tags.c.owner == owner)
+    )
+    with get_engine(chord.get_db_url()).connect() as conn:
+        return set(conn.execute(query).all())
+
+
+def changed_files(chord: ChordService, since: datetime) -> set:
+    query = select(File.name).where(File.update_date >= since)
+    with get_engine(chord.get_db_url()).connect() as conn:
+        return set(conn.execute(query).scalars())
+
+
+@pytest.mark.parametrize("query", [["x"], ["y AND NOT x"]])
+def test_tag_removal_replicates(nodes: tuple, query: list) -> None:
+    (server, primary), (_, replica) = nodes
+    since = datetime.now()
+    removed = server.delete_tags_from_files(query, query[0].split()[:1])
+    assert removed > 0
+    expected = {"a", "b"} if query == ["x"] else {"c"}
+    assert changed_files(primary, since) == expected
+
+    delta = primary.get_all_records(primary.get_db_url(), last_timestamp=since)
+    assert len(delta[File.__tablename__]) == len(expected)
+    replica.set_all_records(replica.get_db_url(), OWNER, delta)
+    assert links(replica, OWNER) == links(primary, LOCAL_OWNER)
+
+
+def test_tag_addition_with_not_replicates(nodes: tuple) -> None:
+    (server, primary), (_, replica) = nodes
+    since = datetime.now()
+    assert server.add_tags_to_files(["y AND NOT x"], ["x"]) == 1
+    assert changed_files(primary, since) == {"c"}
+
+    delta = primary.get_all_records(primary.get_db_url(), last_timestamp=since)
+    replica.set_all_records(replica.get_db_url(), OWNER, delta)
+    assert links(replica, OWNER) == links(primary, LOCAL_OWNER)